@@ -1,4 +1,9 @@
 from .utils import *
 from .lrudict import LRUDict
 from .orderedset import OrderedSet
-from .fifoqueuethread import CallableQueueThread, ArgsMode
+from .fifoqueuethread import CallableQueueThread, CallableQueuePool, ArgsMode
+from .concurrentlrudict import ConcurrentLRUDict, EvictionMode
+from .policies import TwoQueueDict, ARCDict, TinyLFUDict, ReplayResult, replay_trace, compare_policies
+from .tieredlrudict import TieredLRUDict
+from .sharedlrudict import SharedLRUDict
+from .bloomfilter import BloomFilter, RotatingBloomFilter
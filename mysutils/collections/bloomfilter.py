@@ -0,0 +1,290 @@
+import pickle
+from hashlib import blake2b
+from math import ceil, log
+from os import PathLike
+from time import time
+from typing import Any, Hashable, Iterable, List, Tuple, Union
+
+from mysutils.file import save_pickle, load_pickle
+
+
+def _hashes(item: Hashable) -> Tuple[int, int]:
+    """ Two independent hashes of an item which are the same in any process, unlike hash().
+
+    :param item: The item. The strings and the bytes are hashed directly, the other items are pickled.
+    :return: The two hashes, the second one is odd.
+    """
+    if isinstance(item, str):
+        data = b's' + item.encode('utf-8', 'surrogatepass')
+    elif isinstance(item, bytes):
+        data = b'b' + item
+    else:
+        data = pickle.dumps(item)
+    digest = int.from_bytes(blake2b(data, digest_size=16).digest(), 'little')
+    return digest & 0xFFFFFFFFFFFFFFFF, digest >> 64 | 1
+
+
+def _optimal_size(capacity: int, error_rate: float) -> Tuple[int, int]:
+    """ Calculate the optimal size of a Bloom filter.
+
+    :param capacity: The expected number of items.
+    :param error_rate: The false positive rate with that number of items.
+    :return: The number of bits and the number of hashes for each item.
+    """
+    bits = max(8, ceil(-capacity * log(error_rate) / log(2) ** 2))
+    # Rounded up to whole bytes
+    bits = (bits + 7) & ~7
+    return bits, max(1, round(bits / capacity * log(2)))
+
+
+class BloomFilter(object):
+    def __init__(self, capacity: int, error_rate: float = 0.01) -> None:
+        """
+        A probabilistic set which only uses a few bits by item, for example, to discard duplicated identifiers when
+        there are too many to keep them in a set. It can say that an item was added when it was not (a false positive),
+        but never the opposite. The items cannot be removed.
+        The bits are stored in a bytearray, therefore, the filter can be saved with save() and loaded in other process
+        with BloomFilter.load(). The items have to be strings, bytes or picklable objects.
+
+        :param capacity: The expected number of items. With more items, the false positive rate increases.
+        :param error_rate: The false positive rate when the filter has capacity items, between 0 and 1.
+        """
+        if capacity <= 0:
+            raise ValueError(f'The capacity of the filter should be over 0. Defined value: {capacity}')
+        if not 0 < error_rate < 1:
+            raise ValueError(f'The error rate of the filter should be between 0 and 1. Defined value: {error_rate}')
+        self.__capacity = capacity
+        self.__error_rate = error_rate
+        self.__size, self.__hashes = _optimal_size(capacity, error_rate)
+        self.__bits = bytearray(self.__size >> 3)
+        self.__count = 0
+
+    @property
+    def capacity(self) -> int:
+        """
+        :return: The expected number of items.
+        """
+        return self.__capacity
+
+    @property
+    def error_rate(self) -> float:
+        """
+        :return: The false positive rate when the filter has capacity items.
+        """
+        return self.__error_rate
+
+    @property
+    def nbytes(self) -> int:
+        """
+        :return: The size in bytes of the filter bits.
+        """
+        return len(self.__bits)
+
+    def add(self, item: Hashable) -> bool:
+        """ Add an item to the filter.
+
+        :param item: The item to add.
+        :return: True if the item was not in the filter, False if it was already or it is a false positive.
+        """
+        h1, h2 = _hashes(item)
+        bits, size, new = self.__bits, self.__size, False
+        for i in range(self.__hashes):
+            position = (h1 + i * h2) % size
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                new = True
+        self.__count += new
+        return new
+
+    def update(self, items: Iterable[Hashable]) -> List[bool]:
+        """ Add several items to the filter.
+
+        :param items: The items to add.
+        :return: For each item, if it was not in the filter.
+        """
+        add = self.add
+        return [add(item) for item in items]
+
+    def __contains__(self, item: Hashable) -> bool:
+        h1, h2 = _hashes(item)
+        bits, size = self.__bits, self.__size
+        for i in range(self.__hashes):
+            position = (h1 + i * h2) % size
+            if not bits[position >> 3] & 1 << (position & 7):
+                return False
+        return True
+
+    def contains_many(self, items: Iterable[Hashable]) -> List[bool]:
+        """ Check several items at once.
+
+        :param items: The items to check.
+        :return: For each item, if it is in the filter.
+        """
+        contains = self.__contains__
+        return [contains(item) for item in items]
+
+    def __len__(self) -> int:
+        """
+        :return: The approximate number of added items. The false positives are not counted.
+        """
+        return self.__count
+
+    def clear(self) -> None:
+        """ Remove all the items. """
+        self.__bits[:] = bytes(len(self.__bits))
+        self.__count = 0
+
+    def save(self, filename: Union[PathLike, str, bytes]) -> None:
+        """ Save the filter into a pickle file, which can be compressed.
+
+        :param filename: The path to the file.
+        """
+        save_pickle(self, filename)
+
+    @staticmethod
+    def load(filename: Union[PathLike, str, bytes]) -> Any:
+        """ Load a filter saved with save().
+
+        :param filename: The path to the file.
+        :return: The filter.
+        """
+        return load_pickle(filename)
+
+
+class RotatingBloomFilter(object):
+    def __init__(self, capacity: int, ttl: float, error_rate: float = 0.01, generations: int = 2) -> None:
+        """
+        A Bloom filter whose items expire, to discard the duplicated identifiers received in a time window.
+        The items are added to the newest of several Bloom filters (the generations) and searched in all of them.
+        Every ttl / (generations - 1) seconds, the oldest generation is cleared and it becomes the newest one.
+        Therefore, an item is found at least ttl seconds, and at most ttl * generations / (generations - 1) seconds.
+        With more generations, the expiration is more accurate, but the filter is bigger.
+
+        :param capacity: The expected number of items added in ttl seconds.
+        :param ttl: The seconds that an item is remembered.
+        :param error_rate: The false positive rate when the filter has capacity items, between 0 and 1.
+        :param generations: The number of Bloom filters, 2 or more.
+        """
+        if ttl <= 0:
+            raise ValueError(f'The ttl of the filter should be over 0. Defined value: {ttl}')
+        if generations < 2:
+            raise ValueError(f'The number of generations should be 2 or over. Defined value: {generations}')
+        self.__ttl = ttl
+        self.__period = ttl / (generations - 1)
+        # Each generation receives the items of one period, and an item is searched in all of them
+        self.__filters = [BloomFilter(ceil(capacity / (generations - 1)), error_rate / generations)
+                          for _ in range(generations)]
+        self.__capacity = capacity
+        self.__error_rate = error_rate
+        self.__rotation = time()
+
+    @property
+    def capacity(self) -> int:
+        """
+        :return: The expected number of items added in ttl seconds.
+        """
+        return self.__capacity
+
+    @property
+    def error_rate(self) -> float:
+        """
+        :return: The false positive rate when the filter has capacity items.
+        """
+        return self.__error_rate
+
+    @property
+    def ttl(self) -> float:
+        """
+        :return: The seconds that an item is remembered.
+        """
+        return self.__ttl
+
+    @property
+    def nbytes(self) -> int:
+        """
+        :return: The size in bytes of the bits of all the generations.
+        """
+        return sum(f.nbytes for f in self.__filters)
+
+    def rotate(self) -> None:
+        """ Clear the oldest generation if its period has passed. It is called by the other methods. """
+        now = time()
+        periods = int((now - self.__rotation) // self.__period)
+        if periods <= 0:
+            return
+        filters = self.__filters
+        for _ in range(min(periods, len(filters))):
+            oldest = filters.pop()
+            oldest.clear()
+            filters.insert(0, oldest)
+        self.__rotation += periods * self.__period
+
+    def add(self, item: Hashable) -> bool:
+        """ Add an item to the filter.
+
+        :param item: The item to add.
+        :return: True if the item was not in the filter, False if it was already or it is a false positive.
+        """
+        self.rotate()
+        return self.__add(item)
+
+    def __add(self, item: Hashable) -> bool:
+        """ Add an item without rotating the generations.
+
+        :param item: The item to add.
+        :return: True if the item was not in the filter.
+        """
+        filters = self.__filters
+        for f in filters[1:]:
+            if item in f:
+                # Refreshed to remember it during ttl seconds from now
+                filters[0].add(item)
+                return False
+        return filters[0].add(item)
+
+    def update(self, items: Iterable[Hashable]) -> List[bool]:
+        """ Add several items to the filter.
+
+        :param items: The items to add.
+        :return: For each item, if it was not in the filter.
+        """
+        self.rotate()
+        add = self.__add
+        return [add(item) for item in items]
+
+    def __contains__(self, item: Hashable) -> bool:
+        self.rotate()
+        return any(item in f for f in self.__filters)
+
+    def contains_many(self, items: Iterable[Hashable]) -> List[bool]:
+        """ Check several items at once.
+
+        :param items: The items to check.
+        :return: For each item, if it is in the filter.
+        """
+        self.rotate()
+        filters = self.__filters
+        return [any(item in f for f in filters) for item in items]
+
+    def clear(self) -> None:
+        """ Remove all the items. """
+        for f in self.__filters:
+            f.clear()
+        self.__rotation = time()
+
+    def save(self, filename: Union[PathLike, str, bytes]) -> None:
+        """ Save the filter into a pickle file, which can be compressed. The items keep expiring while it is saved.
+
+        :param filename: The path to the file.
+        """
+        save_pickle(self, filename)
+
+    @staticmethod
+    def load(filename: Union[PathLike, str, bytes]) -> Any:
+        """ Load a filter saved with save().
+
+        :param filename: The path to the file.
+        :return: The filter.
+        """
+        return load_pickle(filename)
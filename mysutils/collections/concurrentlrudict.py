@@ -0,0 +1,315 @@
+import threading
+from collections.abc import MutableMapping
+from enum import Enum
+from typing import Any, Hashable, Iterator, List, Optional
+
+from .lrudict import LRUDict
+
+
+class EvictionMode(Enum):
+    LRU = 0
+    CLOCK = 1
+
+
+class _Missing(object):
+    pass
+
+
+_MISSING = _Missing()
+
+
+class _LRUShard(object):
+    """ A shard with exact LRU order. Each access moves the item, therefore the reads also take the lock. """
+
+    def __init__(self, max_size: int) -> None:
+        """ Constructor.
+
+        :param max_size: The maximum number of items of the shard. If it is 0, then, no limit.
+        """
+        self.lock = threading.Lock()
+        self.data = LRUDict(max_size)
+
+    def get(self, key: Hashable, default: Any) -> Any:
+        with self.lock:
+            try:
+                self.data.move_to_end(key)
+            except KeyError:
+                return default
+            # OrderedDict.get() does not move the item again
+            return self.data.get(key)
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self.lock:
+            self.data[key] = value
+
+    def delete(self, key: Hashable) -> None:
+        with self.lock:
+            del self.data[key]
+
+    def pop(self, key: Hashable, default: Any) -> Any:
+        with self.lock:
+            return self.data.pop(key, default)
+
+    def setdefault(self, key: Hashable, default: Any) -> Any:
+        with self.lock:
+            if key in self.data:
+                self.data.move_to_end(key)
+                return self.data.get(key)
+            self.data[key] = default
+            return default
+
+    def popitem(self) -> tuple:
+        with self.lock:
+            return self.data.popitem(last=False)
+
+    def keys(self) -> List[Hashable]:
+        with self.lock:
+            return list(self.data)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.data.clear()
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.data
+
+
+class _ClockShard(object):
+    """ A shard with approximate LRU order using the CLOCK algorithm.
+      The reads only mark the item as referenced, without lock and without moving it.
+      When the shard is full, a hand goes round the items clearing their marks until it finds an unmarked one to evict.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        """ Constructor.
+
+        :param max_size: The maximum number of items of the shard. If it is 0, then, no limit.
+        """
+        self.lock = threading.Lock()
+        # Each entry is a list with the value, the referenced mark and its slot in the ring
+        self.data = {}
+        self.__max_size = max_size
+        self.__ring = []
+        self.__free = []
+        self.__hand = 0
+
+    def get(self, key: Hashable, default: Any) -> Any:
+        entry = self.data.get(key)
+        if entry is None:
+            return default
+        entry[1] = True
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is not None:
+                entry[0], entry[1] = value, True
+            else:
+                self.__add(key, value)
+
+    def setdefault(self, key: Hashable, default: Any) -> Any:
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is not None:
+                entry[1] = True
+                return entry[0]
+            self.__add(key, default)
+            return default
+
+    def __add(self, key: Hashable, value: Any) -> None:
+        """ Add a new item to a free slot, evicting other item if the shard is full. The lock must be taken.
+
+        :param key: The key of the item.
+        :param value: The value of the item.
+        """
+        if self.__free:
+            slot = self.__free.pop()
+        elif self.__max_size == 0 or len(self.__ring) < self.__max_size:
+            slot = len(self.__ring)
+            self.__ring.append(None)
+        else:
+            slot = self.__evict()
+        self.__ring[slot] = key
+        self.data[key] = [value, False, slot]
+
+    def __evict(self) -> int:
+        """ Remove the first item not referenced since the last round of the hand.
+
+        :return: The released slot.
+        """
+        while True:
+            slot = self.__hand
+            self.__hand = (self.__hand + 1) % len(self.__ring)
+            entry = self.data[self.__ring[slot]]
+            if entry[1]:
+                entry[1] = False
+            else:
+                del self.data[self.__ring[slot]]
+                return slot
+
+    def delete(self, key: Hashable) -> None:
+        if self.pop(key, _MISSING) is _MISSING:
+            raise KeyError(key)
+
+    def pop(self, key: Hashable, default: Any) -> Any:
+        with self.lock:
+            entry = self.data.pop(key, None)
+            if entry is None:
+                return default
+            self.__ring[entry[2]] = None
+            self.__free.append(entry[2])
+            return entry[0]
+
+    def popitem(self) -> tuple:
+        with self.lock:
+            if not self.data:
+                raise KeyError('popitem(): shard is empty')
+            key = next(iter(self.data))
+            entry = self.data.pop(key)
+            self.__ring[entry[2]] = None
+            self.__free.append(entry[2])
+            return key, entry[0]
+
+    def keys(self) -> List[Hashable]:
+        with self.lock:
+            return list(self.data)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.data.clear()
+            self.__ring.clear()
+            self.__free.clear()
+            self.__hand = 0
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.data
+
+
+class ConcurrentLRUDict(MutableMapping):
+    def __init__(self, max_size: int = 0, shards: int = 16, mode: EvictionMode = EvictionMode.LRU) -> None:
+        """
+        A thread-safe dictionary with a maximum capacity.
+        The items are distributed in shards by the hash of their keys and each shard has its own lock,
+        therefore the threads that use different shards do not block each other.
+        Each shard holds up to max_size / shards items and, when it is full, removes its least recently used item.
+        The shard sizes add up to max_size, therefore, if max_size is lower than shards, only max_size shards are used.
+        With EvictionMode.LRU, the items are removed in exact LRU order, but each read takes the shard lock.
+        With EvictionMode.CLOCK, the reads do not take any lock and the removed item is one not used recently.
+        If max_size is 0, then, no limit.
+
+        :param max_size: The maximum number of items the dictionary can hold.
+        :param shards: The number of shards.
+        :param mode: The eviction mode, EvictionMode.LRU or EvictionMode.CLOCK.
+        """
+        if max_size < 0:
+            raise ValueError(f'The maximum size of the dict should be 0 and over. Defined value: {max_size}')
+        if shards < 1:
+            raise ValueError(f'The number of shards should be 1 and over. Defined value: {shards}')
+        self.max_size = max_size
+        self.mode = mode
+        if max_size:
+            shards = min(shards, max_size)
+        shard_class = _ClockShard if mode == EvictionMode.CLOCK else _LRUShard
+        # The remainder is spread among the first shards
+        self.__shards = [shard_class(max_size // shards + (i < max_size % shards)) for i in range(shards)]
+        self.__num_shards = shards
+
+    def __shard(self, key: Hashable) -> Any:
+        return self.__shards[hash(key) % self.__num_shards]
+
+    def __getitem__(self, key: Hashable) -> Any:
+        """
+        Get the value associated with the key and mark it as the most recently used.
+
+        :param key: The key of the item to retrieve.
+        :return: The value associated with the key.
+        """
+        value = self.__shard(key).get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """
+        Get the value associated with the key and mark it as the most recently used.
+
+        :param key: The key of the item to retrieve.
+        :param default: The value to return if the key does not exist.
+        :return: The value associated with the key or default.
+        """
+        return self.__shard(key).get(key, default)
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        """
+        Add an item to the dictionary. If its shard exceeds the maximum size, remove one of its least used items.
+
+        :param key: The key of the item.
+        :param value: The value of the item.
+        """
+        self.__shard(key).set(key, value)
+
+    def __delitem__(self, key: Hashable) -> None:
+        self.__shard(key).delete(key)
+
+    def pop(self, key: Hashable, default: Any = _MISSING) -> Any:
+        """
+        Remove an item in a single step under the lock of its shard.
+
+        :param key: The key of the item.
+        :param default: The value to return if the key does not exist. If it is not given, then raise KeyError.
+        :return: The value of the removed item or default.
+        """
+        value = self.__shard(key).pop(key, _MISSING)
+        if value is _MISSING:
+            if default is _MISSING:
+                raise KeyError(key)
+            return default
+        return value
+
+    def setdefault(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get the value associated with the key or add it with default, in a single step under the lock of its shard.
+
+        :param key: The key of the item.
+        :param default: The value to add if the key does not exist.
+        :return: The existing value or default.
+        """
+        return self.__shard(key).setdefault(key, default)
+
+    def popitem(self) -> tuple:
+        """
+        Remove an item of the first shard that is not empty, the least recently used one with EvictionMode.LRU
+        and the oldest added one with EvictionMode.CLOCK.
+
+        :return: The key and the value of the removed item.
+        """
+        for shard in self.__shards:
+            try:
+                return shard.popitem()
+            except KeyError:
+                pass
+        raise KeyError('popitem(): dictionary is empty')
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.__shard(key)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        """
+        :return: An iterator over a snapshot of the keys of each shard. The keys are not in global LRU order.
+        """
+        for shard in self.__shards:
+            yield from shard.keys()
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.__shards)
+
+    def clear(self) -> None:
+        for shard in self.__shards:
+            shard.clear()
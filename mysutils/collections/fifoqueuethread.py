@@ -1,7 +1,11 @@
 import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
 from enum import Enum
-from queue import Queue
-from typing import Callable, Any
+from math import ceil
+from queue import Empty, Queue
+from time import monotonic
+from typing import Callable, Any, Dict, List, Optional, Tuple
 
 
 class ArgsMode(Enum):
@@ -14,8 +18,33 @@ class _Finished(object):
     pass
 
 
+def _call(func: Callable, args_mode: ArgsMode, item: Any) -> Any:
+    """ Call a function with a queue item. It is a module function to be able to send it to other processes.
+
+    :param func: The function to call.
+    :param args_mode: How the item is passed to the function.
+    :param item: The queue item.
+    :return: The function result.
+    """
+    if args_mode == ArgsMode.ITEM:
+        return func(item)
+    if args_mode == ArgsMode.ARGS:
+        return func(*item)
+    return func(**item)
+
+
+def _latency_bucket(seconds: float) -> int:
+    """ The bucket of a latency histogram.
+
+    :param seconds: The latency in seconds.
+    :return: The lowest power of 2 of milliseconds which is greater than or equal to the latency.
+    """
+    return 1 << max(0, ceil(seconds * 1000) - 1).bit_length()
+
+
 class CallableQueueThread(threading.Thread):
-    def __init__(self, func: Callable, args_mode: ArgsMode = ArgsMode.ITEM, **kwargs) -> None:
+    def __init__(self, func: Callable, args_mode: ArgsMode = ArgsMode.ITEM, max_batch: int = 0,
+                 max_latency: float = 0, **kwargs) -> None:
         """ A FIFO queue to run the callable when an item is introduced or while the queue had elements.
 
         :param func: The callable function to call for each queue element.
@@ -23,17 +52,54 @@ class CallableQueueThread(threading.Thread):
             ArgsTypes.ITEM pass the element as a single parameter (item);
             ArgsTypes.ARGS pass the element as a list of parameters (*item);
             ArgsTypes.KWARGS pass the element a dictionary of named parameters (**item).
+        :param max_batch: If it is greater than 0, the callable is called with a list of up to max_batch elements
+            instead of each element. In that case, args_mode has to be ArgsMode.ITEM.
+        :param max_latency: In batch mode, the milliseconds to wait for more elements since the first one of the batch
+            was added. If it is 0, the batch only contains the elements which are already in the queue.
         :param kwargs: The rest of Thread constructor parameters.
         """
         super().__init__(**kwargs)
+        if max_batch < 0:
+            raise ValueError(f'The maximum batch size should be 0 and over. Defined value: {max_batch}')
+        if max_latency < 0:
+            raise ValueError(f'The maximum latency should be 0 and over. Defined value: {max_latency}')
+        if max_batch and args_mode != ArgsMode.ITEM:
+            raise ValueError(f'The batches can only be passed as a single parameter with ArgsMode.ITEM.')
         self.__args_type = args_mode
         self.__func = func  # Callable to execute on each queue item
         self.__queue = Queue()  # Queue to store elements
         self.__stop_event = threading.Event()  # Event to signal when to stop the threads
         self.__wait = False  # If the queue has to wait to process all the elements before to finish
+        self.__max_batch = max_batch
+        self.__max_latency = max_latency / 1000
+        # The number of batches by size and the number of elements by latency
+        self.__batch_sizes = Counter()
+        self.__latencies = Counter()
+        self.__stats_lock = threading.Lock()
+
+    @property
+    def batch_sizes(self) -> Dict[int, int]:
+        """
+        :return: The histogram of the batch sizes, the number of batches of each size.
+        """
+        with self.__stats_lock:
+            return dict(sorted(self.__batch_sizes.items()))
+
+    @property
+    def latencies(self) -> Dict[int, int]:
+        """
+        :return: The histogram of the time since the batch elements were added until the callable was called.
+            The number of elements by buckets of milliseconds: 1, 2, 4, 8, etc., each one contains the latencies
+            greater than the previous bucket and lower than or equal to this one.
+        """
+        with self.__stats_lock:
+            return dict(sorted(self.__latencies.items()))
 
     def run(self) -> None:
         """ Run this thread. """
+        if self.__max_batch:
+            self.__run_batches()
+            return
         while not self.__stop_event.is_set() or self.__wait:
             # Safely retrieve an item from the queue
             item = self.pop()
@@ -49,6 +115,43 @@ class CallableQueueThread(threading.Thread):
                     raise ValueError(f'Invalid value for args_type: {self.__args_type}. '
                                      f'Valid values: ArgsTypes.ITEM, ArgsTypes.ARGS, ArgsTypes.KWARGS')
 
+    def __run_batches(self) -> None:
+        """ Call the callable with batches of elements until the thread is stopped. """
+        finished = False
+        while not finished:
+            added, item = self.__queue.get()
+            if isinstance(item, _Finished):
+                break
+            batch, times = [item], [added]
+            deadline = added + self.__max_latency
+            while len(batch) < self.__max_batch:
+                timeout = deadline - monotonic()
+                try:
+                    # When waiting to finish, the batch is sent without waiting for more elements
+                    added, item = self.__queue.get(timeout=timeout) if timeout > 0 and not self.__wait \
+                        else self.__queue.get_nowait()
+                except Empty:
+                    break
+                if isinstance(item, _Finished):
+                    finished = True
+                    break
+                batch.append(item)
+                times.append(added)
+            if self.__stop_event.is_set() and not self.__wait:
+                break
+            self.__record(times)
+            self.__func(batch)
+
+    def __record(self, times: List[float]) -> None:
+        """ Update the histograms with a batch.
+
+        :param times: When the batch elements were added.
+        """
+        now = monotonic()
+        with self.__stats_lock:
+            self.__batch_sizes[len(times)] += 1
+            self.__latencies.update(_latency_bucket(now - added) for added in times)
+
     def add(self, item: Any) -> None:
         """ Add an item to the queue and wake up a worker thread if necessary.
 
@@ -57,14 +160,16 @@ class CallableQueueThread(threading.Thread):
         if self.__wait:
             raise IndexError(f'You cannot add more elements if you are waiting to finish')
         if not self.__stop_event.is_set():
-            self.__queue.put(item)  # Add the item to the queue
+            # Add the item to the queue, in batch mode, with the time to calculate the latency
+            self.__queue.put((monotonic(), item) if self.__max_batch else item)
 
     def pop(self) -> Any:
         """ Remove and return the item at the front of the queue.
 
         :return: The removed element.
         """
-        return self.__queue.get()
+        item = self.__queue.get()
+        return item[1] if self.__max_batch else item
 
     def wait(self) -> None:
         """ Stop the process waiting to empty the queue. """
@@ -76,7 +181,7 @@ class CallableQueueThread(threading.Thread):
         """ Signal the workers to stop processing and exit. """
         self.__stop_event.set()  # Set the stop event
         # self.__queue.join()
-        self.__queue.put(_Finished())
+        self.__queue.put((monotonic(), _Finished()) if self.__max_batch else _Finished())
 
     def __enter__(self) -> 'CallableQueueThread':
         # Start the thread
@@ -86,3 +191,195 @@ class CallableQueueThread(threading.Thread):
     def __exit__(self, exc_type, exc_value, traceback):
         # Stop the thread
         self.wait()
+
+
+class CallableQueuePool(object):
+    def __init__(self, func: Callable, args_mode: ArgsMode = ArgsMode.ITEM, workers: int = 4,
+                 ordered: bool = False, on_result: Optional[Callable[[Any, Future], None]] = None,
+                 processes: bool = False) -> None:
+        """ A FIFO queue like CallableQueueThread, but with several workers which call the callable at the same time.
+        With threads, it is useful for I/O-bound callables, and, with processes, for CPU-bound ones. In that case,
+        the callable, the items and the results have to be picklable.
+        The exceptions raised by the callable do not stop the workers, they are stored in the Future of the item and
+        in the errors property.
+
+        :param func: The callable function to call for each queue element.
+        :param args_mode: How the queue elements will be passed to the callable:
+            ArgsTypes.ITEM pass the element as a single parameter (item);
+            ArgsTypes.ARGS pass the element as a list of parameters (*item);
+            ArgsTypes.KWARGS pass the element a dictionary of named parameters (**item).
+        :param workers: The number of worker threads or processes.
+        :param ordered: If True, on_result is called in the same order the items were added,
+            otherwise, as soon as each item is finished.
+        :param on_result: A function to call with each item and its Future when it is finished.
+        :param processes: If True, use worker processes instead of threads.
+        """
+        if not isinstance(args_mode, ArgsMode):
+            raise ValueError(f'Invalid value for args_type: {args_mode}. '
+                             f'Valid values: ArgsTypes.ITEM, ArgsTypes.ARGS, ArgsTypes.KWARGS')
+        if workers <= 0:
+            raise ValueError(f'The number of workers should be over 0. Defined value: {workers}')
+        self.__func = func
+        self.__args_mode = args_mode
+        self.__workers = workers
+        self.__ordered = ordered
+        self.__on_result = on_result
+        self.__processes = processes
+        self.__executor: Optional[Executor] = None
+        # The unfinished items by their future, in the order they were added
+        self.__pending: 'OrderedDict[Future, Any]' = OrderedDict()
+        # The items added before starting the workers
+        self.__queued: List[Tuple[Future, Any]] = []
+        # The calls sent to the workers by the future of their item
+        self.__calls: Dict[Future, Future] = {}
+        self.__errors: List[Tuple[Any, BaseException]] = []
+        # Reentrant because on_result can add new items which are finished immediately
+        self.__lock = threading.RLock()
+        self.__stopped = False
+        self.__wait = False
+
+    @property
+    def workers(self) -> int:
+        """
+        :return: The number of worker threads or processes.
+        """
+        return self.__workers
+
+    @property
+    def errors(self) -> List[Tuple[Any, BaseException]]:
+        """
+        :return: The items whose call raised an exception, and the exceptions.
+        """
+        with self.__lock:
+            return list(self.__errors)
+
+    def start(self) -> None:
+        """ Start the workers. """
+        with self.__lock:
+            if self.__executor is not None:
+                raise RuntimeError('The workers can only be started once')
+            self.__executor = ProcessPoolExecutor(self.__workers) if self.__processes \
+                else ThreadPoolExecutor(self.__workers)
+            for future, item in self.__queued:
+                self.__submit(future, item)
+            self.__queued.clear()
+
+    def add(self, item: Any) -> Optional[Future]:
+        """ Add an item to the queue to call the callable with it in the next free worker.
+
+        :param item: The element to add to the queue.
+        :return: The Future with the result or the exception of the call,
+            or None if the queue is stopped and the item is ignored.
+        """
+        with self.__lock:
+            if self.__wait:
+                raise IndexError(f'You cannot add more elements if you are waiting to finish')
+            if self.__stopped:
+                return None
+            future = Future()
+            self.__pending[future] = item
+            if self.__executor is None:
+                self.__queued.append((future, item))
+            else:
+                self.__submit(future, item)
+        return future
+
+    def __submit(self, future: Future, item: Any) -> None:
+        """ Send an item to the workers.
+
+        :param future: The Future of the item.
+        :param item: The item.
+        """
+        call = self.__executor.submit(_call, self.__func, self.__args_mode, item)
+        self.__calls[future] = call
+        call.add_done_callback(lambda finished: self.__finish(future, finished))
+
+    def __finish(self, future: Future, call: Future) -> None:
+        """ Copy the result of a finished call to the Future of the item and deliver it.
+
+        :param future: The Future of the item.
+        :param call: The Future of the call.
+        """
+        with self.__lock:
+            self.__calls.pop(future, None)
+            if call.cancelled():
+                future.cancel()
+                claimed = False
+            else:
+                # Once it is running, stop() cannot cancel the Future of a finished call.
+                # It is False if the Future was cancelled before, and then, it is only delivered
+                claimed = future.set_running_or_notify_cancel()
+        if claimed and call.exception() is not None:
+            future.set_exception(call.exception())
+        elif claimed:
+            future.set_result(call.result())
+        self.__deliver(future)
+
+    def __deliver(self, future: Future) -> None:
+        """ Call on_result with the finished items, in order if it is necessary.
+
+        :param future: The Future of the last finished item.
+        """
+        with self.__lock:
+            if not self.__ordered:
+                self.__result(future, self.__pending.pop(future))
+                return
+            # Each item is removed before calling on_result, so an item is never delivered twice
+            while self.__pending:
+                future = next(iter(self.__pending))
+                if not future.done():
+                    break
+                self.__result(future, self.__pending.pop(future))
+
+    def __result(self, future: Future, item: Any) -> None:
+        """ Record the exception of a finished item and call on_result.
+
+        :param future: The Future of the item.
+        :param item: The item.
+        """
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self.__errors.append((item, future.exception()))
+        if self.__on_result is not None:
+            self.__on_result(item, future)
+
+    def wait(self) -> None:
+        """ Stop the workers waiting to process all the elements of the queue. """
+        with self.__lock:
+            self.__wait = True
+            if self.__executor is None:
+                self.start()
+            executor = self.__executor
+        executor.shutdown(wait=True)
+        with self.__lock:
+            self.__stopped = True
+            self.__wait = False
+
+    def stop(self) -> None:
+        """ Signal the workers to stop processing and exit. The items which are not being processed are discarded. """
+        with self.__lock:
+            self.__stopped = True
+            self.__queued.clear()
+            for future in list(self.__pending):
+                call = self.__calls.get(future)
+                # The item of a cancelled call is cancelled by its callback
+                if call is None and future.cancel():
+                    self.__deliver(future)
+                elif call is not None:
+                    call.cancel()
+            executor = self.__executor
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def join(self) -> None:
+        """ Wait until the workers finish the running calls after stop() or wait(). """
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=True)
+
+    def __enter__(self) -> 'CallableQueuePool':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wait()
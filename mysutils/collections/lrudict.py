@@ -1,36 +1,151 @@
 from collections import OrderedDict
-from typing import Any
+from typing import Any, Callable, Optional
 
 
 class LRUDict(OrderedDict):
-    def __init__(self, max_size: int = 0) -> None:
+    def __init__(self, max_size: int = 0, max_weight: float = 0,
+                 weigher: Optional[Callable[[Any], float]] = None,
+                 on_evict: Optional[Callable[[Any, Any], None]] = None) -> None:
         """
         A dictionary with a maximum capacity.
         When it is reached, the first element added or acceded is removed to be able to add the new ones.
         If max_size is 0, then, no limit.
+        The capacity can also be limited by weight, for example, the size in bytes of the values. In that case,
+        the least recently used items are removed until the sum of the weights of the values is not over max_weight.
 
         :param max_size: The maximum number of items the dictionary can hold.
+        :param max_weight: The maximum total weight of the values. If it is 0, then, no limit.
+        :param weigher: The function to calculate the weight of a value, for example, len or sys.getsizeof.
+           By default, each value weighs 1.
+        :param on_evict: A function to call with the key and the value of each item removed because the capacity is
+           exceeded, for example, to save or close the value. It is not called when the items are deleted explicitly.
         """
         if max_size < 0:
             raise ValueError(f'The maximum size of the dict should be 0 and over. Defined value: {max_size}')
+        if max_weight < 0:
+            raise ValueError(f'The maximum weight of the dict should be 0 and over. Defined value: {max_weight}')
         self.max_size = max_size
+        self.max_weight = max_weight
+        self.weigher = weigher
+        self.on_evict = on_evict
+        # The weight of each item, only if they are weighed
+        self.__weights = {}
+        self.__weight = 0
         super().__init__()
 
+    @property
+    def weight(self) -> float:
+        """
+        :return: The total weight of the values. Without weigher, the number of items.
+        """
+        return self.__weight if self.__weighed() else len(self)
+
+    def __weighed(self) -> bool:
+        """
+        :return: True if the weights of the values have to be calculated.
+        """
+        return bool(self.max_weight or self.weigher)
+
     def __setitem__(self, key: Any, value: Any) -> None:
         """
         Add an item to the dictionary.
         If the key already exists, move the item to the end to be removed.
-        If the dictionary exceeds the maximum size, remove the least recently used item.
+        If the dictionary exceeds the maximum size or weight, remove the least recently used items.
 
         :param key: The key of the item.
         :param value: The value of the item.
         """
         if key in self:
-            self.move_to_end(key)
-        super().__setitem__(key, value)
-        if self.max_size != 0 and len(self) > self.max_size:
-            oldest = next(iter(self))
-            del self[oldest]
+            self._hit(key)
+            super().__setitem__(key, value)
+        else:
+            super().__setitem__(key, value)
+            self._added(key)
+        if self.__weighed():
+            self.__forget(key)
+            self.__weights[key] = self.weigher(value) if self.weigher else 1
+            self.__weight += self.__weights[key]
+        while self.max_size != 0 and len(self) > self.max_size or \
+                self.max_weight != 0 and self.__weight > self.max_weight and len(self):
+            victim = self._victim()
+            self.__evict(victim, self.pop(victim))
+
+    def _hit(self, key: Any) -> None:
+        """ Register an access to an existing item. The subclasses can change this to implement other policies.
+
+        :param key: The key of the item.
+        """
+        self.move_to_end(key)
+
+    def _added(self, key: Any) -> None:
+        """ Register a new item. The subclasses can change this to implement other policies.
+
+        :param key: The key of the item.
+        """
+
+    def _removed(self, key: Any) -> None:
+        """ Register that an item has been removed. The subclasses can change this to implement other policies.
+
+        :param key: The key of the item.
+        """
+
+    def _victim(self) -> Any:
+        """ Select the item to remove when the capacity is exceeded.
+          The subclasses can change this to implement other policies.
+
+        :return: The key of the item to remove. By default, the least recently used one.
+        """
+        return next(iter(self))
+
+    def __evict(self, key: Any, value: Any) -> None:
+        """ Notify that an item has been removed because the capacity was exceeded.
+
+        :param key: The key of the removed item.
+        :param value: The value of the removed item.
+        """
+        if self.on_evict is not None:
+            self.on_evict(key, value)
+
+    def __forget(self, key: Any) -> None:
+        """ Remove the weight of an item from the total weight.
+
+        :param key: The key of the item.
+        """
+        self.__weight -= self.__weights.pop(key, 0)
+
+    def __removed(self, key: Any) -> None:
+        """ Remove the weight of an item and notify the removal.
+
+        :param key: The key of the removed item.
+        """
+        self.__forget(key)
+        self._removed(key)
+
+    def __delitem__(self, key: Any) -> None:
+        super().__delitem__(key)
+        self.__removed(key)
+
+    def pop(self, key: Any, *default: Any) -> Any:
+        removed = key in self
+        value = super().pop(key, *default)
+        if removed:
+            self.__removed(key)
+        return value
+
+    def popitem(self, last: bool = True) -> tuple:
+        key, value = super().popitem(last)
+        self.__removed(key)
+        return key, value
+
+    def clear(self) -> None:
+        super().clear()
+        self.__weights.clear()
+        self.__weight = 0
+        self._cleared()
+
+    def _cleared(self) -> None:
+        """ Register that all the items have been removed. The subclasses can change this to implement other policies.
+        """
 
     def __getitem__(self, key: Any) -> None:
         """
@@ -41,7 +156,7 @@ class LRUDict(OrderedDict):
         :return: The value associated with the key.
         """
         value = super().__getitem__(key)
-        self.move_to_end(key)
+        self._hit(key)
         return value
 
     def update(self, *args, **kwargs) -> None:
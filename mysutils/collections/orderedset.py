@@ -1,45 +1,312 @@
+import weakref
+from functools import wraps
 from collections import OrderedDict
-from typing import Set, Iterable, Hashable, Any
+from collections.abc import Mapping, MutableSet, Set as AbstractSet
+from itertools import takewhile
+from operator import lt, le, gt, ge
+from threading import Event, RLock, Thread
+from time import time_ns
+from typing import Iterable, Hashable, Any, Callable, Container, Iterator, List, Optional, Tuple
 from datetime import datetime
 
 
-class OrderedSet(Set, Iterable):
-    """ An ordered set with pop() method, which can be extracted using FIFO or LIFO. """
+class _TimeView(Mapping):
+    """ A read-only view of the items of an OrderedSet and the datetime when they were added. """
+    __slots__ = ('__times',)
 
-    def __init__(self, items: Iterable = iter([])) -> None:
+    def __init__(self, times: 'OrderedDict[Hashable, int]') -> None:
+        """ Constructor.
+
+        :param times: The items and their timestamps.
+        """
+        self.__times = times
+
+    def __getitem__(self, item: Hashable) -> datetime:
+        return _datetime(self.__times[item])
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self.__times)
+
+    def __reversed__(self) -> Iterator[Hashable]:
+        return reversed(self.__times)
+
+    def __len__(self) -> int:
+        return len(self.__times)
+
+    def __contains__(self, item: Any) -> bool:
+        return item in self.__times
+
+
+def _timestamp(date: datetime) -> int:
+    """
+    :param date: The date.
+    :return: The POSIX timestamp of the date in microseconds.
+    """
+    # Without float rounding errors
+    return int(date.replace(microsecond=0).timestamp()) * 1000000 + date.microsecond
+
+
+def _datetime(timestamp: int) -> datetime:
+    """
+    :param timestamp: A POSIX timestamp in microseconds.
+    :return: The local datetime.
+    """
+    return datetime.fromtimestamp(timestamp // 1000000).replace(microsecond=timestamp % 1000000)
+
+
+def _lookup(other: Iterable) -> Container:
+    """
+    :param other: A set or any iterable.
+    :return: The same object if it is a set, otherwise a set with its elements, to search elements in constant time.
+    """
+    return other if isinstance(other, (AbstractSet, Mapping)) else set(other)
+
+
+def _now() -> int:
+    """
+    :return: The current POSIX timestamp in microseconds.
+    """
+    return time_ns() // 1000
+
+
+def _synchronized(method: Callable) -> Callable:
+    """ Method decorator to run a method of an OrderedSet with the lock of its background thread, if it has one.
+
+    :param method: The method.
+    :return: The synchronized method.
+    """
+    @wraps(method)
+    def synchronized(self, *args, **kwargs):
+        lock = self._OrderedSet__lock
+        if lock is None:
+            return method(self, *args, **kwargs)
+        with lock:
+            return method(self, *args, **kwargs)
+
+    return synchronized
+
+
+def _sweep(reference: 'weakref.ref[OrderedSet]', stop: Event, interval: float) -> None:
+    """ Remove periodically the expired elements of an OrderedSet until it is closed or deleted.
+
+    :param reference: A weak reference to the set.
+    :param stop: The event to stop.
+    :param interval: The seconds between two sweeps.
+    """
+    while not stop.wait(interval):
+        items = reference()
+        if items is None:
+            return
+        items.expire()
+        del items
+
+
+class OrderedSet(MutableSet):
+    """ An ordered set with pop() method, which can be extracted using FIFO or LIFO.
+      Each element is stored once, in an ordered dictionary with the POSIX timestamp in microseconds when it was added.
+    """
+    __slots__ = ('__times', '__ordered', '__ttl', '__expiration', '__max_size', '__lock', '__stop', '__weakref__')
+
+    def __init__(self, items: Iterable = iter([]), ttl: Optional[float] = None, max_size: int = 0,
+                 sweep_interval: Optional[float] = None) -> None:
         """ Initialize the OrderedSet with an empty dictionary or a list of elements.
+          With ttl, the elements expire after that number of seconds since they were added, and they are removed from
+          the head of the set when it is used, or periodically by a background thread if sweep_interval is given.
+          With max_size, the first elements are removed when the set exceeds that size.
+          Each element is removed only once, so both options cost constant amortized time per element.
 
         :param items: The elements to add.
-        """
-        super().__init__(items)
-        self.items = OrderedDict()
+        :param ttl: The seconds that the elements remain in the set. If it is None, they do not expire.
+        :param max_size: The maximum number of elements. If it is 0, then, no limit.
+        :param sweep_interval: The seconds between two removals of the expired elements in a background thread.
+           The thread takes the lock of the set to remove them, and so does each operation of the set.
+           Take it also to run several operations atomically or to go through the items property.
+        """
+        if ttl is not None and ttl <= 0:
+            raise ValueError(f'The ttl should be over 0. Defined value: {ttl}')
+        if max_size < 0:
+            raise ValueError(f'The maximum size of the set should be 0 and over. Defined value: {max_size}')
+        if sweep_interval is not None and ttl is None:
+            raise ValueError('The sweep_interval requires a ttl.')
+        self.__times = OrderedDict()
+        # True while the times are in the same order than the items, then, the time queries do not check all the items
+        self.__ordered = True
+        self.__ttl = None if ttl is None else int(ttl * 1000000)
+        # When the next element expires, to avoid checking the set head in each access
+        self.__expiration = 0
+        self.__max_size = max_size
+        self.__lock = None
+        self.__stop = None
         self.update(items)
+        if sweep_interval is not None:
+            self.__lock = RLock()
+            self.__stop = Event()
+            Thread(target=_sweep, args=(weakref.ref(self), self.__stop, sweep_interval), daemon=True).start()
+
+    @property
+    def ttl(self) -> Optional[float]:
+        """
+        :return: The seconds that the elements remain in the set, or None if they do not expire.
+        """
+        return None if self.__ttl is None else self.__ttl / 1000000
+
+    @property
+    def max_size(self) -> int:
+        """
+        :return: The maximum number of elements. If it is 0, then, no limit.
+        """
+        return self.__max_size
 
+    @property
+    def lock(self) -> Optional[RLock]:
+        """
+        :return: The lock which the background thread takes to remove the expired elements,
+          or None if there is not background thread.
+        """
+        return self.__lock
+
+    def expire(self) -> None:
+        """ Remove the expired elements. """
+        if self.__ttl is None or _now() < self.__expiration:
+            return
+        if self.__lock is None:
+            self.__expire()
+        else:
+            with self.__lock:
+                self.__expire()
+
+    def __expire(self) -> None:
+        """ Remove the elements added before the current time minus the ttl.
+          If the times are ordered, only the expired elements at the head of the set are checked.
+        """
+        times, cutoff = self.__times, _now() - self.__ttl
+        # With pop() instead of del because other thread could remove the same element
+        if not self.__ordered:
+            for item, _ in self.__select(cutoff, le, True):
+                times.pop(item, None)
+            self.__expiration = min(times.values()) + self.__ttl if times else 0
+            return
+        while times:
+            item, timestamp = next(iter(times.items()))
+            if timestamp > cutoff:
+                self.__expiration = timestamp + self.__ttl
+                return
+            times.pop(item, None)
+        self.__expiration = 0
+
+    def __valid_times(self) -> 'OrderedDict[Hashable, int]':
+        """
+        :return: The elements and their timestamps after removing the expired ones.
+        """
+        if self.__ttl is not None:
+            self.expire()
+        return self.__times
+
+    def __trim(self) -> None:
+        """ Remove the first elements while the set exceeds its maximum size. """
+        times = self.__times
+        while len(times) > self.__max_size:
+            times.popitem(False)
+
+    def close(self) -> None:
+        """ Stop the background thread which removes the expired elements, if any. """
+        if self.__stop is not None:
+            self.__stop.set()
+
+    @property
+    def items(self) -> Mapping:
+        """
+        :return: A read-only mapping with the elements and the datetime when they were added.
+        """
+        return _TimeView(self.__valid_times())
+
+    @_synchronized
     def update(self, items: Iterable) -> None:
         """ Update the OrderedSet with a list of elements.
 
         :param items: The elements to add.
         """
+        if self.__ttl is not None:
+            self.expire()
+        times = self.__times
+        timestamp = _now()
+        if times and next(reversed(times.values())) > timestamp:
+            self.__ordered = False
+        elif not times:
+            self.__ordered = True
         for item in items:
-            self.add(item)
-        super().update(items)
+            if item not in times:
+                times[item] = timestamp
+        if self.__max_size:
+            self.__trim()
 
     def add(self, item: Hashable) -> None:
         """ Add an element to the set.
 
         :param item: The element to add.
         """
-        if item not in self.items:
-            self.items[item] = datetime.now()
-            super().add(item)
+        # Not decorated with @_synchronized to be faster, only the sets with ttl can have a background thread
+        if self.__ttl is not None:
+            if self.__lock is None:
+                self.__add_expiring(item)
+            else:
+                with self.__lock:
+                    self.__add_expiring(item)
+        elif item not in self.__times:
+            timestamp = _now()
+            self.__check_order(item, timestamp)
+            self.__times[item] = timestamp
+            if self.__max_size and len(self.__times) > self.__max_size:
+                self.__trim()
+
+    def __add_expiring(self, item: Hashable) -> None:
+        """ Add an element to a set with ttl. If the element has expired but it has not been removed yet,
+          it is moved to the end with the current time.
 
+        :param item: The element to add.
+        """
+        # This is the most frequent operation with ttl, then, the helper functions are inlined
+        timestamp, ttl, times = time_ns() // 1000, self.__ttl, self.__times
+        # The expired elements are removed in batches, when the first one has expired for an eighth of the ttl.
+        # Meanwhile, they are detected by their times
+        if timestamp >= self.__expiration + (ttl >> 3):
+            self.expire()
+        current = times.get(item)
+        if current is not None:
+            if current > timestamp - ttl:
+                return
+            times.pop(item, None)
+        if not times:
+            self.__ordered = True
+        elif self.__ordered and next(reversed(times.values())) > timestamp:
+            self.__ordered = False
+        times[item] = timestamp
+        if self.__max_size and len(times) > self.__max_size:
+            self.__trim()
+
+    def __check_order(self, item: Hashable, timestamp: int) -> None:
+        """ Check if the items are still ordered by time after setting the time of an item.
+
+        :param item: The item.
+        :param timestamp: The new time of the item.
+        """
+        if not self.__times:
+            self.__ordered = True
+        elif item in self.__times:
+            self.__ordered = self.__ordered and self.__times[item] == timestamp
+        elif self.__ordered:
+            self.__ordered = next(reversed(self.__times.values())) <= timestamp
+
+    @_synchronized
     def time(self, item: Hashable) -> datetime:
         """ Get the time when an element was added.
 
         :param item: The item to search the time.
         :return: A datetime object with the time where the object was introduced in the set.
         """
-        return self.items[item]
+        if self.__ttl is not None:
+            self.expire()
+        return _datetime(self.__times[item])
 
     def __getitem__(self, item: Hashable) -> datetime:
         """ Get the time when an element was added.
@@ -49,14 +316,19 @@ class OrderedSet(Set, Iterable):
         """
         return self.time(item)
 
+    @_synchronized
     def set_time(self, item: Hashable, date: datetime) -> None:
         """ Set the time of an element in the set.
 
         :param item: The item to modify its introduction date.
         :param date: The date to modify.
         """
-        self.items[item] = date
-        super().add(item)
+        timestamp = _timestamp(date)
+        self.__check_order(item, timestamp)
+        self.__times[item] = timestamp
+        self.__expiration = 0
+        if self.__max_size:
+            self.__trim()
 
     def __setitem__(self, item: Hashable, date: datetime) -> None:
         """ Set the time of an element in the set.
@@ -65,61 +337,97 @@ class OrderedSet(Set, Iterable):
         :param date: The date to modify.
         """
         self.set_time(item, date)
-        super().add(item)
 
+    @_synchronized
     def before(self, date: datetime) -> 'OrderedSet':
         """ Get a copy of the OrderedSet with items were introduced before the given date.
 
         :param date: The date to search the set.
         :return: A copy of the OrderedSet with items added before the given date.
         """
-        items = OrderedSet()
-        for item in [i for i in self.items if self[i] < date]:
-            items[item] = self.items[item]
-        return items
+        if self.__ttl is not None:
+            self.expire()
+        return self.__subset(self.__select(_timestamp(date), lt, True))
 
+    @_synchronized
     def until(self, date: datetime) -> 'OrderedSet':
         """ Get a copy of the OrderedSet with items were introduced until the given date, including the same date.
 
         :param date: The date to search the set.
         :return: A copy of the OrderedSet with items added until the given date.
         """
-        items = OrderedSet()
-        for item in [i for i in self.items if self[i] <= date]:
-            items[item] = self.items[item]
-        return items
+        if self.__ttl is not None:
+            self.expire()
+        return self.__subset(self.__select(_timestamp(date), le, True))
 
+    @_synchronized
     def after(self, date: datetime) -> 'OrderedSet':
         """ Get a copy of the OrderedSet with items were introduced after the given date.
 
         :param date: The date to search the set.
         :return: A copy of the OrderedSet with items added before the given date.
         """
-        items = OrderedSet()
-        for item in [i for i in self.items if self[i] > date]:
-            items[item] = self.items[item]
-        return items
+        if self.__ttl is not None:
+            self.expire()
+        return self.__subset(self.__select(_timestamp(date), gt, False))
 
+    @_synchronized
     def since(self, date: datetime) -> 'OrderedSet':
         """ Get a copy of the OrderedSet with items were introduced since the given date, including the same date.
 
         :param date: The date to search the set.
         :return: A copy of the OrderedSet with items added since the given date.
         """
-        items = OrderedSet()
-        for item in [i for i in self.items if self[i] >= date]:
-            items[item] = self.items[item]
-        return items
-
+        if self.__ttl is not None:
+            self.expire()
+        return self.__subset(self.__select(_timestamp(date), ge, False))
+
+    def __select(self, timestamp: int, compare: Callable[[int, int], bool],
+                 from_head: bool) -> List[Tuple[Hashable, int]]:
+        """ Get the items whose time meets the condition compare(time, timestamp).
+          If the items are ordered by time, only the matching items from the head or the tail are checked.
+
+        :param timestamp: The timestamp to compare.
+        :param compare: The comparison function.
+        :param from_head: True if the matching items are the first ones when they are ordered, False if the last ones.
+        :return: The items and their timestamps in the set order.
+        """
+        if self.__ordered:
+            if from_head:
+                return list(takewhile(lambda entry: compare(entry[1], timestamp), self.__times.items()))
+            return list(takewhile(lambda entry: compare(entry[1], timestamp), reversed(self.__times.items())))[::-1]
+        selected, previous, ordered = [], None, True
+        for item, time in self.__times.items():
+            if compare(time, timestamp):
+                selected.append((item, time))
+            ordered = ordered and (previous is None or previous <= time)
+            previous = time
+        # The order is checked again because the items out of order could have been removed
+        self.__ordered = ordered
+        return selected
+
+    @staticmethod
+    def __subset(items: List[Tuple[Hashable, int]]) -> 'OrderedSet':
+        """ Create an OrderedSet with some items and times.
+
+        :param items: The items and their timestamps.
+        :return: The new OrderedSet.
+        """
+        subset = OrderedSet()
+        subset.__times.update(items)
+        # The items of a set modified with set_time() could be out of order
+        subset.__ordered = all(previous[1] <= entry[1] for previous, entry in zip(items, items[1:]))
+        return subset
+
+    @_synchronized
     def remove(self, item: Hashable) -> None:
         """ Remove an element from the set.
 
         :param item: The element to remove.
         """
-        if item in self.items:
-            del self.items[item]
-            super().remove(item)
+        self.__times.pop(item, None)
 
+    @_synchronized
     def pop(self, last: bool = False) -> Any:
         """ Pop an element from the set. By default, it pops the first element introduced,
           but also it is possible to pop the last.
@@ -127,10 +435,11 @@ class OrderedSet(Set, Iterable):
         :param last: If True, the last element introduced will be removed, otherwise the first one.
         :return: The last element from the set.
         """
-        item = self.items.popitem(last)[0]
-        super().remove(item)
-        return item
+        if self.__ttl is not None:
+            self.expire()
+        return self.__times.popitem(last)[0]
 
+    @_synchronized
     def remove_items(self, items: Iterable[Hashable], discard: bool = False) -> None:
         """ Remove the given items from the set.
 
@@ -143,78 +452,90 @@ class OrderedSet(Set, Iterable):
             else:
                 self.remove(item)
 
+    @_synchronized
     def remove_before(self, date: datetime, discard: bool = False) -> None:
         """ Remove all the introduced items before the given date.
 
         :param date: The date to search the set.
         :param discard: If True, do not raise a KeyError if the item is not found.
         """
-        self.remove_items([i for i in self.items if self[i] < date], discard)
+        self.remove_items([item for item, _ in self.__select(_timestamp(date), lt, True)], discard)
 
+    @_synchronized
     def remove_until(self, date: datetime, discard: bool = False) -> None:
         """ Remove all the introduced items  until the given date, including the same date.
 
         :param date: The date to search the set.
         :param discard: If True, do not raise a KeyError if the item is not found.
         """
-        self.remove_items([i for i in self.items if self[i] <= date], discard)
+        self.remove_items([item for item, _ in self.__select(_timestamp(date), le, True)], discard)
 
+    @_synchronized
     def remove_after(self, date: datetime, discard: bool = False) -> None:
         """ Remove all the introduced items after the given date.
 
         :param date: The date to search the set.
         :param discard: If True, do not raise a KeyError if the item is not found.
         """
-        self.remove_items([i for i in self.items if self[i] > date], discard)
+        self.remove_items([item for item, _ in self.__select(_timestamp(date), gt, False)], discard)
 
+    @_synchronized
     def remove_since(self, date: datetime, discard: bool = False) -> None:
         """ Remove all the introduced items since the given date, including the same date.
 
         :param date: The date to search the set.
         :param discard: If True, do not raise a KeyError if the item is not found.
         """
-        self.remove_items([i for i in self.items if self[i] >= date])
+        self.remove_items([item for item, _ in self.__select(_timestamp(date), ge, False)], discard)
 
+    @_synchronized
     def first(self) -> 'Hashable':
         """ Get the first element of the OrderedDict without removing it.
 
         :return: The first element of the set.
         """
-        if self.items:
-            return next(iter(self.items))
+        if self.__ttl is not None:
+            self.expire()
+        if self.__times:
+            return next(iter(self.__times))
         else:
             raise KeyError('set is empty.')
 
+    @_synchronized
     def discard(self, item: Hashable) -> None:
         """ Remove an element from the set.
 
         :param item: The element to remove.
         """
-        del self.items[item]
-        super().discard(item)
+        del self.__times[item]
 
+    @_synchronized
     def clear(self) -> None:
         """ Remove all elements from the set. """
-        self.items.clear()
-        super().clear()
+        self.__times.clear()
 
+    @_synchronized
     def copy(self) -> 'OrderedSet':
-        """ Return a copy of the OrderedSet."""
-        items = OrderedSet([k for k in self.items.keys()])
-        for item in items:
-            items[item] = self.items[item]
+        """ Return a copy of the OrderedSet. The copy does not expire or have a maximum size."""
+        if self.__ttl is not None:
+            self.expire()
+        items = OrderedSet()
+        items.__times = self.__times.copy()
+        items.__ordered = self.__ordered
         return items
 
+    @_synchronized
     def difference(self, other: set) -> 'OrderedSet':
-        """ Get the elements in the set which are not present in the other set.
+        """ Get the elements in the set which are not present in the other set, keeping their order and times.
 
         :param other: The other set.
         :return: The elements which are not present in the other set.
         """
-        return OrderedSet(set(self.items.keys()) - set(other))
+        return self.__derive(self.__without(self.__valid_times().keys() & self.__iterable(other)))
 
+    @_synchronized
     def __set__(self):
-        return set(self.items.keys())
+        return set(self.__valid_times().keys())
 
     def __sub__(self, other: set) -> 'OrderedSet':
         """ Get the elements in the set which are not present in the other set.
@@ -224,23 +545,27 @@ class OrderedSet(Set, Iterable):
         """
         return self.difference(other)
 
+    @_synchronized
     def difference_update(self, other: set) -> None:
-        """ Remove the elements in the set which are not present in the other set.
+        """ Remove the elements in the set which are present in the other set.
 
         :param other: The other set.
         """
-        items = self.items.keys() - set(other)
-        self.items = OrderedDict()
-        self.update(items)
-        super().difference_update(other)
+        if other is self:
+            self.clear()
+            return
+        times = self.__times
+        for item in other:
+            times.pop(item, None)
 
+    @_synchronized
     def intersection(self, other: set) -> 'OrderedSet':
-        """ Get the elements in the set which are present in the other set.
+        """ Get the elements in the set which are present in the other set, keeping their order and times.
 
         :param other: The other set.
         :return: The elements which are present in the other set.
         """
-        return OrderedSet(self.items.keys() & set(other))
+        return self.__derive(self.__without(self.__valid_times().keys() - self.__iterable(other)))
 
     def __and__(self, other: set) -> 'OrderedSet':
         """ Get the elements in the set which are present in the other set.
@@ -250,24 +575,28 @@ class OrderedSet(Set, Iterable):
         """
         return self.intersection(other)
 
+    @_synchronized
     def intersection_update(self, other: set) -> None:
-        """ Remove the elements in the set which are not present in the other set.
+        """ Remove the elements in the set which are not present in the other set. The rest keep their times.
 
         :param other: The other set.
         """
-        items = self.items.keys() & set(other)
-        self.items = OrderedDict()
-        self.update(items)
-        super().update(items)
+        times = self.__times
+        for item in times.keys() - self.__iterable(other):
+            del times[item]
 
+    @_synchronized
     def union(self, other: set) -> 'OrderedSet':
         """ Return the union of two sets as a new `OrderedSet`.
+          The elements of this set go first and then the new elements of the other one, in the same order.
+          The elements keep their times if the other set is also an `OrderedSet`.
 
         :param other: The other set to union with.
         :return: The union of the two sets as a new `OrderedSet`.
         """
-        super().union(other)
-        return OrderedSet(self.items.keys() | set(other))
+        items = self.copy()
+        items.__extend(other)
+        return items
 
     def __or__(self, other: set) -> 'OrderedSet':
         """ Return the union of two sets as a new `OrderedSet`.
@@ -277,21 +606,25 @@ class OrderedSet(Set, Iterable):
         """
         return self.union(other)
 
+    @_synchronized
     def isdisjoint(self, other: set) -> bool:
         """ Check if the set is disjoint from the other set.
 
         :param other: The other set.
         :return: True if the set is disjoint from the other set, False otherwise.
         """
-        return not bool(self.items.keys() & set(other))
+        other = _lookup(other)
+        return not any(item in other for item in self.__valid_times())
 
+    @_synchronized
     def issubset(self, other: set) -> bool:
         """ Check if the set is a subset of the other set.
 
         :param other: The other set.
         :return: True if the set is a subset of the other set, False otherwise.
         """
-        return self.items.keys() <= set(other)
+        other = _lookup(other)
+        return len(self.__valid_times()) <= len(other) and all(item in other for item in self.__times)
 
     def __le__(self, other: set) -> bool:
         """ Check if the set is a subset of the other set.
@@ -301,13 +634,14 @@ class OrderedSet(Set, Iterable):
         """
         return self.issubset(other)
 
+    @_synchronized
     def issuperset(self, other: set) -> bool:
         """ Check if the set is a superset of the other set.
 
         :param other: The other set.
         :return: True if the set is a superset of the other set, False otherwise.
         """
-        return self.items.keys() >= set(other)
+        return all(item in self.__valid_times() for item in other)
 
     def __ge__(self, other: set) -> bool:
         """ Check if the set is a superset of the other set.
@@ -317,15 +651,21 @@ class OrderedSet(Set, Iterable):
         """
         return self.issuperset(other)
 
+    @_synchronized
     def symmetric_difference(self, other: set) -> 'OrderedSet':
         """ Return the symmetric difference of two sets as a new `OrderedSet`.
+          The elements of this set go first and then the ones of the other set, in the same order and with their times.
 
         :param other: The other set to take the symmetric difference with.
         :return: The symmetric difference of the two sets as a new `OrderedSet`.
         """
-        return OrderedSet(self.items.keys() ^ set(other))
+        other = other if isinstance(other, OrderedSet) else OrderedSet(other)
+        common = self.__valid_times().keys() & other.__valid_times().keys()
+        items = self.__derive(self.__without(common))
+        items.__append(other.__without(common), other.__ordered)
+        return items
 
-    def __pow__(self, other: set) -> 'OrderedSet':
+    def __xor__(self, other: set) -> 'OrderedSet':
         """ Return the symmetric difference of two sets as a new `OrderedSet`.
 
         :param other: The other set to take the symmetric difference with.
@@ -333,29 +673,142 @@ class OrderedSet(Set, Iterable):
         """
         return self.symmetric_difference(other)
 
+    __pow__ = __xor__
+
+    @_synchronized
+    def symmetric_difference_update(self, other: set) -> None:
+        """ Remove the elements which are present in both sets and add the elements of the other set which are not in
+          this one, in the same order.
+
+        :param other: The other set.
+        """
+        other = other if isinstance(other, OrderedSet) else OrderedSet(other)
+        common = self.__valid_times().keys() & other.__valid_times().keys()
+        new_times = other.__without(common)
+        for item in common:
+            del self.__times[item]
+        self.__append(new_times, other.__ordered)
+
+    @_synchronized
+    def __ior__(self, other: set) -> 'OrderedSet':
+        self.__extend(other)
+        return self
+
+    def __iand__(self, other: set) -> 'OrderedSet':
+        self.intersection_update(other)
+        return self
+
+    def __isub__(self, other: set) -> 'OrderedSet':
+        self.difference_update(other)
+        return self
+
+    def __ixor__(self, other: set) -> 'OrderedSet':
+        self.symmetric_difference_update(other)
+        return self
+
+    def __without(self, items: Iterable[Hashable]) -> 'OrderedDict[Hashable, int]':
+        """ Copy the elements and their times except some of them.
+
+        :param items: The elements to exclude, which must be in this set.
+        :return: The ordered dictionary with the rest of elements and their times.
+        """
+        times = self.__times.copy()
+        for item in items:
+            del times[item]
+        return times
+
+    def __derive(self, times: 'OrderedDict[Hashable, int]') -> 'OrderedSet':
+        """ Create an OrderedSet with a subset of the elements of this one.
+
+        :param times: The elements and their timestamps, in the same order than in this set.
+        :return: The new OrderedSet.
+        """
+        items = OrderedSet()
+        items.__times = times
+        # A subsequence of ordered times is also ordered
+        items.__ordered = self.__ordered or not times
+        return items
+
+    def __extend(self, other: Iterable) -> None:
+        """ Add the elements of other at the end, with their times if it is an OrderedSet, or with the current time.
+
+        :param other: The elements to add.
+        """
+        if not isinstance(other, OrderedSet):
+            self.update(other)
+            return
+        self.__append(other.__without(other.__valid_times().keys() & self.__valid_times().keys()), other.__ordered)
+
+    def __append(self, new_times: 'OrderedDict[Hashable, int]', ordered: bool) -> None:
+        """ Add new elements at the end with their times.
+
+        :param new_times: The new elements, which are not in this set, and their times.
+        :param ordered: If the new times are in the same order than the new elements.
+        """
+        times = self.__times
+        if new_times:
+            self.__ordered = ordered and (not times or self.__ordered and
+                                          next(reversed(times.values())) <= next(iter(new_times.values())))
+            times.update(new_times)
+
+    @staticmethod
+    def __iterable(other: Iterable) -> Iterable:
+        """
+        :param other: A set or any iterable.
+        :return: An iterable to operate with the dictionary views.
+        """
+        # The dictionary views iterate the elements of a dictionary faster than an OrderedSet
+        return other.__times if isinstance(other, OrderedSet) else other
+
     def __len__(self):
         """ Get the number of elements in the set. """
-        return len(self.items)
+        if self.__ttl is not None:
+            self.expire()
+        return len(self.__times)
 
     def __contains__(self, item):
         """ Check if the set contains an element. """
-        return item in self.items
+        if self.__ttl is None:
+            return item in self.__times
+        if self.__lock is None:
+            return self.__contains_expiring(item)
+        with self.__lock:
+            return self.__contains_expiring(item)
 
-    def __iter__(self):
-        """ Iterate over the elements in the set. """
-        return iter(self.items.keys())
+    def __contains_expiring(self, item: Hashable) -> bool:
+        """ Check if a set with ttl contains an element which has not expired.
 
+        :param item: The element to check.
+        :return: True if the element is in the set and it has not expired yet.
+        """
+        timestamp, ttl = time_ns() // 1000, self.__ttl
+        if timestamp >= self.__expiration + (ttl >> 3):
+            self.expire()
+        current = self.__times.get(item)
+        return current is not None and current > timestamp - ttl
+
+    def __iter__(self):
+        """ Iterate over the elements in the set. With a background thread, over a copy of the elements. """
+        if self.__ttl is not None:
+            self.expire()
+        if self.__lock is not None:
+            with self.__lock:
+                return iter(list(self.__times))
+        return iter(self.__times)
+
+    @_synchronized
     def __list__(self):
         """ Get the elements in the set. """
-        return list(self.items.keys())
+        return list(self.__valid_times().keys())
 
+    @_synchronized
     def __eq__(self, other: set) -> bool:
         """ Check if the set is equal to the other set.
 
         :param other: The other set.
         :return: True if the set is equal to the other set, False otherwise.
         """
-        return set(self.items.keys()) == set(other)
+        return self.__valid_times().keys() == (other if isinstance(other, AbstractSet) else set(other))
 
     def __neq__(self, other: set) -> bool:
         """ Check if the set is not equal to the other set.
@@ -363,12 +816,14 @@ class OrderedSet(Set, Iterable):
         :param other: The other set.
         :return: True if the set is not equal to the other set, False otherwise.
         """
-        return set(self.items.keys()) != set(other)
+        return not self == other
 
+    @_synchronized
     def __repr__(self):
         """ Get the string representation of the set. """
-        return repr(set(self.items.keys()))
+        return repr(set(self.__valid_times().keys()))
 
+    @_synchronized
     def __rsub__(self, s: set): # real signature unknown
         """ Return value-self. """
-        return s - set(self.items.keys())
+        return s - set(self.__valid_times().keys())
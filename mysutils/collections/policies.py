@@ -0,0 +1,327 @@
+from collections import OrderedDict, namedtuple
+from os import PathLike
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, Optional, Union
+
+from mysutils.file import open_file
+from .lrudict import LRUDict
+
+ReplayResult = namedtuple('ReplayResult', ['hits', 'misses', 'hit_ratio', 'ops_per_second'])
+
+
+class TwoQueueDict(LRUDict):
+    def __init__(self, max_size: int = 0, max_weight: float = 0,
+                 weigher: Optional[Callable[[Any], float]] = None,
+                 on_evict: Optional[Callable[[Any, Any], None]] = None,
+                 in_ratio: float = 0.25, out_ratio: float = 0.5) -> None:
+        """
+        A LRUDict with the 2Q eviction policy, which is resistant to scans.
+        The new items go into a FIFO queue (A1in). When they are removed from there, their keys are remembered in
+        another queue (A1out). Only if an item is added again while it is remembered, it goes into the main LRU queue
+        (Am). Therefore, the items used only once, like in a scan of all the keys, do not remove the frequent ones.
+
+        :param max_size: The maximum number of items the dictionary can hold.
+        :param max_weight: The maximum total weight of the values. If it is 0, then, no limit.
+        :param weigher: The function to calculate the weight of a value. By default, each value weighs 1.
+        :param on_evict: A function to call with the key and the value of each evicted item.
+        :param in_ratio: The proportion of the capacity for the new items.
+        :param out_ratio: The number of remembered keys in proportion to the capacity.
+        """
+        self.__in_ratio = in_ratio
+        self.__out_ratio = out_ratio
+        self.__a1in = OrderedDict()
+        self.__a1out = OrderedDict()
+        self.__am = OrderedDict()
+        super().__init__(max_size, max_weight, weigher, on_evict)
+
+    def _hit(self, key: Any) -> None:
+        # The accesses to the items in A1in do not change anything, they could be correlated references
+        if key in self.__am:
+            self.__am.move_to_end(key)
+
+    def _added(self, key: Any) -> None:
+        if self.__a1out.pop(key, False) is None:
+            self.__am[key] = None
+        else:
+            self.__a1in[key] = None
+
+    def _removed(self, key: Any) -> None:
+        self.__a1in.pop(key, None)
+        self.__am.pop(key, None)
+
+    def _cleared(self) -> None:
+        self.__a1in.clear()
+        self.__a1out.clear()
+        self.__am.clear()
+
+    def _victim(self) -> Any:
+        capacity = _capacity(self)
+        if self.__a1in and (len(self.__a1in) > max(1, int(capacity * self.__in_ratio)) or not self.__am):
+            key = next(iter(self.__a1in))
+            self.__a1out[key] = None
+            while len(self.__a1out) > max(1, int(capacity * self.__out_ratio)):
+                self.__a1out.popitem(last=False)
+            return key
+        return next(iter(self.__am))
+
+
+class ARCDict(LRUDict):
+    def __init__(self, max_size: int = 0, max_weight: float = 0,
+                 weigher: Optional[Callable[[Any], float]] = None,
+                 on_evict: Optional[Callable[[Any, Any], None]] = None) -> None:
+        """
+        A LRUDict with the ARC (Adaptive Replacement Cache) eviction policy, which is resistant to scans.
+        The items used once (T1) and the items used several times (T2) are kept in different LRU lists.
+        The keys of the items removed from each list are remembered (B1 and B2) and, when one of them is added again,
+        the target size of T1 grows or shrinks to adapt to the access pattern.
+
+        :param max_size: The maximum number of items the dictionary can hold.
+        :param max_weight: The maximum total weight of the values. If it is 0, then, no limit.
+        :param weigher: The function to calculate the weight of a value. By default, each value weighs 1.
+        :param on_evict: A function to call with the key and the value of each evicted item.
+        """
+        self.__t1, self.__t2 = OrderedDict(), OrderedDict()
+        self.__b1, self.__b2 = OrderedDict(), OrderedDict()
+        # The target size of T1
+        self.__p = 0
+        # The last added key and if it was remembered in B2
+        self.__last = None
+        self.__from_b2 = False
+        super().__init__(max_size, max_weight, weigher, on_evict)
+
+    def _hit(self, key: Any) -> None:
+        self.__t1.pop(key, None)
+        self.__t2[key] = None
+        self.__t2.move_to_end(key)
+
+    def _added(self, key: Any) -> None:
+        capacity = _capacity(self)
+        self.__last, self.__from_b2 = key, False
+        if key in self.__b1:
+            self.__p = min(capacity, self.__p + max(len(self.__b2) / len(self.__b1), 1))
+            del self.__b1[key]
+            self.__t2[key] = None
+        elif key in self.__b2:
+            self.__p = max(0, self.__p - max(len(self.__b1) / len(self.__b2), 1))
+            del self.__b2[key]
+            self.__t2[key] = None
+            self.__from_b2 = True
+        else:
+            self.__t1[key] = None
+
+    def _removed(self, key: Any) -> None:
+        self.__t1.pop(key, None)
+        self.__t2.pop(key, None)
+        # The remembered keys are limited to the capacity
+        capacity = _capacity(self)
+        while self.__b1 and len(self.__t1) + len(self.__b1) > capacity:
+            self.__b1.popitem(last=False)
+        while self.__b2 and len(self.__t1) + len(self.__t2) + len(self.__b1) + len(self.__b2) > 2 * capacity:
+            self.__b2.popitem(last=False)
+
+    def _cleared(self) -> None:
+        for keys in self.__t1, self.__t2, self.__b1, self.__b2:
+            keys.clear()
+        self.__p = 0
+
+    def _victim(self) -> Any:
+        # The just added key is not taken into account to choose the list
+        t1 = len(self.__t1) - (self.__last in self.__t1)
+        if self.__t1 and (t1 > self.__p or (self.__from_b2 and t1 == self.__p) or not self.__t2):
+            key = next(iter(self.__t1))
+            self.__b1[key] = None
+        else:
+            key = next(iter(self.__t2))
+            self.__b2[key] = None
+        return key
+
+
+class TinyLFUDict(LRUDict):
+    def __init__(self, max_size: int = 0, max_weight: float = 0,
+                 weigher: Optional[Callable[[Any], float]] = None,
+                 on_evict: Optional[Callable[[Any, Any], None]] = None,
+                 window_ratio: float = 0.01, protected_ratio: float = 0.8) -> None:
+        """
+        A LRUDict with the W-TinyLFU eviction policy, which is resistant to scans.
+        The new items go into a small LRU window. When they leave the window, they are only admitted into the main
+        cache if they have been used more times than the item that would be evicted. The number of uses of each key
+        is estimated with a count-min sketch, whose counters are halved periodically to forget the old accesses.
+        The main cache is a segmented LRU: the items accessed again move from the probation segment to the protected one.
+
+        :param max_size: The maximum number of items the dictionary can hold.
+        :param max_weight: The maximum total weight of the values. If it is 0, then, no limit.
+        :param weigher: The function to calculate the weight of a value. By default, each value weighs 1.
+        :param on_evict: A function to call with the key and the value of each evicted item,
+           also when a new item is not admitted.
+        :param window_ratio: The proportion of the capacity for the window.
+        :param protected_ratio: The proportion of the main cache for the protected segment.
+        """
+        self.__window_ratio = window_ratio
+        self.__protected_ratio = protected_ratio
+        self.__window = OrderedDict()
+        self.__probation = OrderedDict()
+        self.__protected = OrderedDict()
+        self.__sketch = _FrequencySketch(max(max_size, 16))
+        self.__candidate = None
+        super().__init__(max_size, max_weight, weigher, on_evict)
+
+    def frequency(self, key: Any) -> int:
+        """ The estimated number of recent uses of a key.
+
+        :param key: The key.
+        :return: The estimation.
+        """
+        return self.__sketch.frequency(key)
+
+    def _hit(self, key: Any) -> None:
+        self.__sketch.increment(key)
+        if key in self.__window:
+            self.__window.move_to_end(key)
+        elif key in self.__probation:
+            del self.__probation[key]
+            self.__protected[key] = None
+            protected_size = max(1, int((_capacity(self) - self.__window_size()) * self.__protected_ratio))
+            while len(self.__protected) > protected_size:
+                self.__probation[self.__protected.popitem(last=False)[0]] = None
+        elif key in self.__protected:
+            self.__protected.move_to_end(key)
+
+    def _added(self, key: Any) -> None:
+        self.__sketch.increment(key)
+        self.__window[key] = None
+
+    def _removed(self, key: Any) -> None:
+        self.__window.pop(key, None)
+        self.__probation.pop(key, None)
+        self.__protected.pop(key, None)
+
+    def _cleared(self) -> None:
+        self.__window.clear()
+        self.__probation.clear()
+        self.__protected.clear()
+        self.__candidate = None
+
+    def __window_size(self) -> int:
+        """
+        :return: The maximum number of items in the window.
+        """
+        return max(1, int(_capacity(self) * self.__window_ratio))
+
+    def _victim(self) -> Any:
+        # The items which leave the window compete to enter in the main cache
+        while len(self.__window) > self.__window_size() or (self.__window and not (self.__probation or self.__protected)):
+            self.__candidate = self.__window.popitem(last=False)[0]
+            self.__probation[self.__candidate] = None
+        if self.__candidate not in self.__probation:
+            self.__candidate = None
+        victim = next((key for key in self.__probation if key != self.__candidate), None)
+        if victim is None:
+            victim = next(iter(self.__protected), self.__candidate)
+        if victim is None:
+            return next(iter(self.__window))
+        if self.__candidate is not None and victim != self.__candidate and \
+                self.__sketch.frequency(self.__candidate) <= self.__sketch.frequency(victim):
+            victim, self.__candidate = self.__candidate, None
+        return victim
+
+
+class _FrequencySketch(object):
+    """ A count-min sketch with 4 rows of counters up to 15, which are halved after a number of increments. """
+
+    def __init__(self, size: int) -> None:
+        """ Constructor.
+
+        :param size: The expected number of different keys.
+        """
+        self.__width = 1 << (size - 1).bit_length()
+        self.__mask = self.__width - 1
+        self.__rows = [bytearray(self.__width) for _ in range(4)]
+        self.__seeds = (0x9E3779B9, 0x85EBCA6B, 0xC2B2AE35, 0x27D4EB2F)
+        self.__sample_size = 10 * size
+        self.__increments = 0
+
+    def __indexes(self, key: Any) -> Iterable[int]:
+        """
+        :param key: The key.
+        :return: The index of the counter of the key in each row.
+        """
+        h = hash(key)
+        return [((h ^ seed) * 0x9E3779B1 >> 16) & self.__mask for seed in self.__seeds]
+
+    def increment(self, key: Any) -> None:
+        """ Count an use of a key.
+
+        :param key: The key.
+        """
+        for row, index in zip(self.__rows, self.__indexes(key)):
+            if row[index] < 15:
+                row[index] += 1
+        self.__increments += 1
+        if self.__increments >= self.__sample_size:
+            self.__increments //= 2
+            for row in self.__rows:
+                row[:] = bytes(counter >> 1 for counter in row)
+
+    def frequency(self, key: Any) -> int:
+        """
+        :param key: The key.
+        :return: The estimated number of uses.
+        """
+        return min(row[index] for row, index in zip(self.__rows, self.__indexes(key)))
+
+
+def _capacity(cache: LRUDict) -> int:
+    """
+    :param cache: The cache.
+    :return: The maximum number of items or, if it is only limited by weight, the current number of items.
+    """
+    return cache.max_size if cache.max_size else max(len(cache), 1)
+
+
+def _load_trace(trace: Union[Iterable[Any], str, PathLike]) -> Iterable[Any]:
+    """
+    :param trace: A sequence of keys or the path to a text file with a key in each line.
+    :return: The sequence of keys.
+    """
+    if isinstance(trace, (str, PathLike)):
+        with open_file(trace, 'rt') as file:
+            return [line.rstrip('\n') for line in file]
+    return trace
+
+
+def replay_trace(cache: LRUDict, trace: Union[Iterable[Any], str, PathLike]) -> ReplayResult:
+    """ Replay a sequence of accesses in a cache and measure its efficiency.
+      Each key is looked up and, if it is not in the cache, it is added.
+
+    :param cache: The cache to test, which can be empty or not.
+    :param trace: A sequence of keys or the path to a text file with a key in each line. It may be gzip compressed.
+    :return: The number of hits and misses, the hit ratio and the number of accesses by second.
+    """
+    trace = _load_trace(trace)
+    hits = misses = 0
+    start = perf_counter()
+    for key in trace:
+        if key in cache:
+            cache[key]
+            hits += 1
+        else:
+            cache[key] = key
+            misses += 1
+    elapsed = perf_counter() - start
+    total = hits + misses
+    return ReplayResult(hits, misses, hits / total if total else 0, total / elapsed if elapsed else 0)
+
+
+def compare_policies(trace: Union[Iterable[Any], str, PathLike], max_size: int,
+                     policies: Dict[str, Callable[[int], LRUDict]] = None) -> Dict[str, ReplayResult]:
+    """ Replay the same sequence of accesses with several eviction policies.
+
+    :param trace: A sequence of keys or the path to a text file with a key in each line. It may be gzip compressed.
+    :param max_size: The maximum number of items of the caches.
+    :param policies: A dictionary with the name of each policy and the function to create a cache with a max_size.
+       By default, LRU, 2Q, ARC and W-TinyLFU.
+    :return: A dictionary with the name of each policy and its result.
+    """
+    trace = list(_load_trace(trace))
+    policies = policies if policies else {'LRU': LRUDict, '2Q': TwoQueueDict, 'ARC': ARCDict, 'W-TinyLFU': TinyLFUDict}
+    return {name: replay_trace(factory(max_size), trace) for name, factory in policies.items()}
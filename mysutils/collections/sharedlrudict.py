@@ -0,0 +1,204 @@
+import pickle
+import sqlite3
+from collections.abc import MutableMapping
+from os import PathLike, getpid
+from threading import Lock
+from typing import Any, Callable, Iterator, List, Optional, Union
+
+_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS items (key BLOB PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, '
+    'used INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS items_used ON items (used)',
+    # The number of items and the total size are kept updated by triggers to avoid counting them
+    'CREATE TABLE IF NOT EXISTS stats (id INTEGER PRIMARY KEY CHECK (id = 0), count INTEGER NOT NULL, '
+    'size INTEGER NOT NULL)',
+    'INSERT OR IGNORE INTO stats VALUES (0, 0, 0)',
+    'CREATE TRIGGER IF NOT EXISTS items_insert AFTER INSERT ON items BEGIN '
+    'UPDATE stats SET count = count + 1, size = size + NEW.size; END',
+    'CREATE TRIGGER IF NOT EXISTS items_delete AFTER DELETE ON items BEGIN '
+    'UPDATE stats SET count = count - 1, size = size - OLD.size; END',
+    'CREATE TRIGGER IF NOT EXISTS items_update AFTER UPDATE OF size ON items BEGIN '
+    'UPDATE stats SET size = size - OLD.size + NEW.size; END'
+]
+# The next access number, the items with lower numbers were used less recently
+_NEXT_USE = '(SELECT COALESCE(MAX(used), 0) + 1 FROM items)'
+
+
+class SharedLRUDict(MutableMapping):
+    def __init__(self, filename: Union[PathLike, str], max_size: int = 0, max_weight: int = 0,
+                 timeout: float = 30) -> None:
+        """
+        A dictionary with a maximum capacity which is shared by several processes, for example, the workers of a web
+        service. The items are stored in a SQLite database, so all the processes that open the same file see the same
+        items and the least recently used one by any of them is removed when the capacity is exceeded.
+        The keys and the values are pickled, therefore, the equal keys must have the same type, for instance, 1 and
+        1.0 are different keys. The instances can be used by several threads and they also work after a fork.
+
+        :param filename: The database file. If it does not exist, it is created.
+        :param max_size: The maximum number of items. If it is 0, then, no limit.
+        :param max_weight: The maximum size in bytes of all the pickled values. If it is 0, then, no limit.
+        :param timeout: The seconds to wait if the database is locked by another process.
+        """
+        if max_size < 0:
+            raise ValueError(f'The maximum size of the dict should be 0 and over. Defined value: {max_size}')
+        if max_weight < 0:
+            raise ValueError(f'The maximum weight of the dict should be 0 and over. Defined value: {max_weight}')
+        self.filename = filename
+        self.max_size = max_size
+        self.max_weight = max_weight
+        self.timeout = timeout
+        self.__lock = Lock()
+        self.__connection = None
+        self.__pid = None
+        with self.__transaction() as cursor:
+            for statement in _SCHEMA:
+                cursor.execute(statement)
+
+    def __connect(self) -> sqlite3.Connection:
+        """
+        :return: The connection of this process. The connections cannot be shared with the forked processes.
+        """
+        if self.__connection is None or self.__pid != getpid():
+            self.__connection = sqlite3.connect(self.filename, timeout=self.timeout, isolation_level=None,
+                                                check_same_thread=False)
+            self.__connection.execute('PRAGMA journal_mode=WAL')
+            self.__connection.execute('PRAGMA synchronous=NORMAL')
+            self.__pid = getpid()
+        return self.__connection
+
+    def __transaction(self) -> '_Transaction':
+        """
+        :return: A context manager with a cursor in a write transaction. It also takes the lock of the threads.
+        """
+        return _Transaction(self.__lock, self.__connect)
+
+    @property
+    def weight(self) -> int:
+        """
+        :return: The size in bytes of all the pickled values.
+        """
+        with self.__lock:
+            return self.__connect().execute('SELECT size FROM stats').fetchone()[0]
+
+    def __getitem__(self, key: Any) -> Any:
+        """
+        Get the value associated with the key and mark it as the most recently used.
+
+        :param key: The key of the item to retrieve.
+        :return: The value associated with the key.
+        """
+        pickled_key = pickle.dumps(key)
+        with self.__transaction() as cursor:
+            cursor.execute(f'UPDATE items SET used = {_NEXT_USE} WHERE key = ?', (pickled_key,))
+            if not cursor.rowcount:
+                raise KeyError(key)
+            value = cursor.execute('SELECT value FROM items WHERE key = ?', (pickled_key,)).fetchone()[0]
+        return pickle.loads(value)
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        """
+        Add an item to the dictionary. If the dictionary exceeds the maximum size or weight,
+        remove the least recently used items.
+
+        :param key: The key of the item.
+        :param value: The value of the item.
+        """
+        pickled_key, pickled_value = pickle.dumps(key), pickle.dumps(value)
+        with self.__transaction() as cursor:
+            cursor.execute(f'UPDATE items SET value = ?, size = ?, used = {_NEXT_USE} WHERE key = ?',
+                           (pickled_value, len(pickled_value), pickled_key))
+            if not cursor.rowcount:
+                cursor.execute(f'INSERT INTO items VALUES (?, ?, ?, {_NEXT_USE})',
+                               (pickled_key, pickled_value, len(pickled_value)))
+            self.__evict(cursor)
+
+    def __evict(self, cursor: sqlite3.Cursor) -> None:
+        """ Remove the least recently used items while the capacity is exceeded.
+
+        :param cursor: The cursor of the current transaction.
+        """
+        count, size = cursor.execute('SELECT count, size FROM stats').fetchone()
+        if self.max_size and count > self.max_size:
+            cursor.execute('DELETE FROM items WHERE key IN (SELECT key FROM items ORDER BY used LIMIT ?)',
+                           (count - self.max_size,))
+        while self.max_weight and size > self.max_weight and count:
+            cursor.execute('DELETE FROM items WHERE key = (SELECT key FROM items ORDER BY used LIMIT 1)')
+            count, size = cursor.execute('SELECT count, size FROM stats').fetchone()
+
+    def __delitem__(self, key: Any) -> None:
+        with self.__transaction() as cursor:
+            cursor.execute('DELETE FROM items WHERE key = ?', (pickle.dumps(key),))
+            if not cursor.rowcount:
+                raise KeyError(key)
+
+    def __contains__(self, key: Any) -> bool:
+        with self.__lock:
+            return self.__connect().execute('SELECT 1 FROM items WHERE key = ?',
+                                            (pickle.dumps(key),)).fetchone() is not None
+
+    def __keys(self) -> List[Any]:
+        """
+        :return: The keys from the least to the most recently used.
+        """
+        with self.__lock:
+            rows = self.__connect().execute('SELECT key FROM items ORDER BY used').fetchall()
+        return [pickle.loads(row[0]) for row in rows]
+
+    def __iter__(self) -> Iterator[Any]:
+        """
+        :return: An iterator over a snapshot of the keys, from the least to the most recently used.
+        """
+        return iter(self.__keys())
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return self.__connect().execute('SELECT count FROM stats').fetchone()[0]
+
+    def clear(self) -> None:
+        with self.__transaction() as cursor:
+            cursor.execute('DELETE FROM items')
+
+    def close(self) -> None:
+        """ Close the connection to the database of this process. """
+        with self.__lock:
+            if self.__connection is not None and self.__pid == getpid():
+                self.__connection.close()
+            self.__connection = None
+
+    def __enter__(self) -> 'SharedLRUDict':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+class _Transaction(object):
+    """ A write transaction, which is committed if there is not any error, and rolled back otherwise. """
+
+    def __init__(self, lock: Lock, connect: Callable[[], sqlite3.Connection]) -> None:
+        """ Constructor.
+
+        :param lock: The lock of the threads.
+        :param connect: The function to get the connection.
+        """
+        self.__lock = lock
+        self.__connect = connect
+        self.__cursor: Optional[sqlite3.Cursor] = None
+
+    def __enter__(self) -> sqlite3.Cursor:
+        self.__lock.acquire()
+        try:
+            self.__cursor = self.__connect().cursor()
+            # Immediate to avoid deadlocks between the processes that read and then write
+            self.__cursor.execute('BEGIN IMMEDIATE')
+        except BaseException:
+            self.__lock.release()
+            raise
+        return self.__cursor
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        try:
+            self.__cursor.execute('COMMIT' if exc_type is None else 'ROLLBACK')
+        finally:
+            self.__cursor.close()
+            self.__lock.release()
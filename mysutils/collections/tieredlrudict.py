@@ -0,0 +1,190 @@
+import pickle
+from collections.abc import MutableMapping
+from hashlib import sha1
+from os import PathLike, makedirs, remove, replace, scandir
+from os.path import join
+from typing import Any, Callable, Iterator, Optional, Tuple, Union
+
+from .lrudict import LRUDict
+
+_EXTENSION = '.pkl'
+
+
+class TieredLRUDict(MutableMapping):
+    def __init__(self, folder: Union[PathLike, str],
+                 max_size: int = 0,
+                 max_weight: float = 0,
+                 weigher: Optional[Callable[[Any], float]] = None,
+                 disk_max_size: int = 0,
+                 disk_max_bytes: int = 0) -> None:
+        """
+        A dictionary with two levels of cache: the most recently used items are in memory, in a LRUDict, and the items
+        evicted from memory are saved as pickle files in a folder instead of being lost.
+        When an item is read from disk, it is removed from the folder and moved to memory again.
+        The disk level has its own limits and removes the least recently saved files when they are exceeded.
+        The files remain in the folder, therefore, a new TieredLRUDict with the same folder can use them,
+        for example, after restarting the program. Use close() to save also the items in memory.
+        The keys and the values have to be picklable, the values which cannot be pickled are not saved.
+        This class is not thread-safe.
+
+        :param folder: The folder to save the evicted items. If it does not exist, it is created.
+        :param max_size: The maximum number of items in memory. If it is 0, then, no limit.
+        :param max_weight: The maximum total weight of the values in memory. If it is 0, then, no limit.
+        :param weigher: The function to calculate the weight of a value in memory. By default, each value weighs 1.
+        :param disk_max_size: The maximum number of files. If it is 0, then, no limit.
+        :param disk_max_bytes: The maximum size in bytes of all the files. If it is 0, then, no limit.
+        """
+        self.folder = folder
+        makedirs(folder, exist_ok=True)
+        self.__memory = LRUDict(max_size, max_weight, weigher, on_evict=self.__spill)
+        # The file name and size of each saved item, in the order they were saved
+        self.__disk = LRUDict(disk_max_size, disk_max_bytes, lambda entry: entry[1],
+                              on_evict=lambda key, entry: self.__remove_file(entry[0]))
+        self.__load_index()
+
+    @property
+    def memory(self) -> LRUDict:
+        """
+        :return: The items in memory.
+        """
+        return self.__memory
+
+    @property
+    def disk_bytes(self) -> int:
+        """
+        :return: The size in bytes of all the saved items.
+        """
+        return self.__disk.weight
+
+    def __load_index(self) -> None:
+        """ Index the items saved in the folder from the oldest to the newest. """
+        files = sorted((entry for entry in scandir(self.folder) if entry.name.endswith(_EXTENSION) and entry.is_file()),
+                       key=lambda entry: entry.stat().st_mtime_ns)
+        for entry in files:
+            try:
+                with open(entry.path, 'rb') as file:
+                    key = pickle.load(file)
+            except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+                self.__remove_file(entry.name)
+                continue
+            self.__disk[key] = entry.name, entry.stat().st_size
+
+    def __remove_file(self, name: str) -> None:
+        """ Remove a saved item.
+
+        :param name: The file name.
+        """
+        try:
+            remove(join(self.folder, name))
+        except FileNotFoundError:
+            pass
+
+    def __spill(self, key: Any, value: Any) -> None:
+        """ Save in a file an item evicted from memory.
+         The key is pickled first to read it without loading the value.
+
+        :param key: The key of the item.
+        :param value: The value of the item.
+        """
+        try:
+            pickled_key = pickle.dumps(key)
+            data = pickled_key + pickle.dumps(value)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return
+        name = sha1(pickled_key).hexdigest() + _EXTENSION
+        temp_file = join(self.folder, name + '.tmp')
+        with open(temp_file, 'wb') as file:
+            file.write(data)
+        # Atomic, a file with an item is always complete
+        replace(temp_file, join(self.folder, name))
+        self.__disk[key] = name, len(data)
+
+    def __load(self, key: Any) -> Tuple[bool, Any]:
+        """ Remove an item from disk.
+
+        :param key: The key of the item.
+        :return: If the item was saved and its value.
+        """
+        entry = self.__disk.pop(key, None)
+        if entry is None:
+            return False, None
+        try:
+            with open(join(self.folder, entry[0]), 'rb') as file:
+                pickle.load(file)
+                value = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return False, None
+        finally:
+            self.__remove_file(entry[0])
+        return True, value
+
+    def __getitem__(self, key: Any) -> Any:
+        """
+        Get the value associated with the key. If it is on disk, move it to memory.
+
+        :param key: The key of the item.
+        :return: The value associated with the key.
+        """
+        try:
+            return self.__memory[key]
+        except KeyError:
+            pass
+        found, value = self.__load(key)
+        if not found:
+            raise KeyError(key)
+        self.__memory[key] = value
+        return value
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        """
+        Add an item to memory. If the memory capacity is exceeded, the least recently used items are saved on disk.
+
+        :param key: The key of the item.
+        :param value: The value of the item.
+        """
+        if key in self.__disk:
+            self.__remove_file(self.__disk.pop(key)[0])
+        self.__memory[key] = value
+
+    def __delitem__(self, key: Any) -> None:
+        if key in self.__memory:
+            del self.__memory[key]
+        elif key in self.__disk:
+            self.__remove_file(self.__disk.pop(key)[0])
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.__memory or key in self.__disk
+
+    def __iter__(self) -> Iterator[Any]:
+        """
+        :return: An iterator over the keys in memory and then the keys on disk.
+        """
+        yield from list(self.__memory)
+        yield from list(self.__disk)
+
+    def __len__(self) -> int:
+        return len(self.__memory) + len(self.__disk)
+
+    def clear(self) -> None:
+        """ Remove all the items from memory and disk. """
+        self.__memory.clear()
+        for name, _ in self.__disk.values():
+            self.__remove_file(name)
+        self.__disk.clear()
+
+    def flush(self) -> None:
+        """ Move all the items in memory to disk. """
+        while self.__memory:
+            self.__spill(*self.__memory.popitem(last=False))
+
+    def close(self) -> None:
+        """ Save the items in memory to disk to use them in the next executions. """
+        self.flush()
+
+    def __enter__(self) -> 'TieredLRUDict':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
@@ -1,5 +1,44 @@
+import functools
+import weakref
+from collections import namedtuple, deque
+from concurrent.futures import Future
 from threading import Lock
-from typing import Callable
+from time import monotonic
+from typing import Callable, Optional, Any, Hashable
+
+from mysutils.collections import LRUDict
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'evictions', 'max_size', 'current_size'])
+
+
+class _KwargsMark(object):
+    pass
+
+
+# Separator between the positional and the named arguments in the cache keys
+_KWARGS_MARK = _KwargsMark()
+
+
+class _InstanceMark(object):
+    pass
+
+
+# The first element of the cache keys of the method calls, followed by the instance id or _InstanceRef
+_INSTANCE_MARK = _InstanceMark()
+
+
+class _InstanceRef(object):
+    """ A reference to an instance which does not support weak references, compared by identity. """
+    __slots__ = ('instance',)
+
+    def __init__(self, instance: Any) -> None:
+        self.instance = instance
+
+    def __hash__(self) -> int:
+        return id(self.instance)
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, _InstanceRef) and other.instance is self.instance
 
 
 def synchronized(method: Callable) -> Callable:
@@ -20,3 +59,226 @@ def synchronized(method: Callable) -> Callable:
                 return method(self, *args, **kws)
 
     return sync_method
+
+
+def lru_cache_ttl(max_size: int = 128, ttl: Optional[float] = None, typed: bool = False) -> Callable:
+    """ Function decorator to cache the results of a function or method in a LRUDict.
+
+    Unlike functools.lru_cache(), each result expires after ttl seconds, the concurrent calls with the same
+      arguments wait for the first one instead of calling the function again, and, with methods, the cache does not
+      keep the instances alive and their results are removed when they are destroyed. The instances are distinguished
+      by identity, not by equality. The decorated function has the methods cache_info() and cache_clear().
+
+    :param max_size: The maximum number of cached results. If it is 0, then, no limit.
+    :param ttl: The seconds that a result is valid. If it is None, the results do not expire.
+    :param typed: If True, the arguments of different types are cached separately, for example, 3 and 3.0.
+    :return: The decorator.
+    """
+    if callable(max_size):
+        # Used as @lru_cache_ttl without parentheses
+        return _TTLCache(max_size, 128, ttl, typed)
+    return lambda func: _TTLCache(func, max_size, ttl, typed)
+
+
+class _TTLCache(object):
+    """ The cached version of a function. """
+
+    def __init__(self, func: Callable, max_size: int, ttl: Optional[float], typed: bool) -> None:
+        """ Constructor.
+
+        :param func: The function to cache.
+        :param max_size: The maximum number of cached results. If it is 0, then, no limit.
+        :param ttl: The seconds that a result is valid. If it is None, the results do not expire.
+        :param typed: If True, the arguments of different types are cached separately.
+        """
+        functools.update_wrapper(self, func)
+        self.__func = func
+        self.__max_size = max_size
+        self.__ttl = ttl
+        self.__typed = typed
+        self.__cache = LRUDict(max_size, on_evict=self.__count_eviction)
+        self.__lock = Lock()
+        # The calls in progress by key, to avoid calling the function twice with the same arguments at the same time
+        self.__calls = {}
+        self.__hits = self.__misses = self.__evictions = 0
+        # The finalizers of the instances with cached results and the keys of their results, by the instance id
+        self.__instances = {}
+        self.__keys = {}
+        # The ids of the destroyed instances whose results have not been removed yet
+        self.__dead = deque()
+
+    def __call__(self, *args, **kwargs) -> Any:
+        return self._cached_call(self.__make_key(args, kwargs), args, kwargs)
+
+    def __get__(self, instance: Any, owner: type) -> Any:
+        if instance is None:
+            return self
+        return _BoundTTLCache(self, instance)
+
+    def __make_key(self, args: tuple, kwargs: dict) -> Hashable:
+        """ Create the cache key of the function arguments.
+
+        :param args: The positional arguments.
+        :param kwargs: The named arguments.
+        :return: The key.
+        """
+        key = args + (_KWARGS_MARK,) + tuple(kwargs.items()) if kwargs else args
+        if self.__typed:
+            key += tuple(type(arg) for arg in args) + tuple(type(arg) for arg in kwargs.values())
+        return key
+
+    def _call_method(self, instance: Any, args: tuple, kwargs: dict) -> Any:
+        """ Call the function as a method of an instance. The key contains the instance id and the results of the
+          instance are removed when it is destroyed. If the instance does not support weak references, for example,
+          because of __slots__, the key keeps the instance alive until its results are removed.
+
+        :param instance: The instance.
+        :param args: The positional arguments without the instance.
+        :param kwargs: The named arguments.
+        :return: The cached or calculated result.
+        """
+        if type(instance).__weakrefoffset__:
+            key = self.__make_key((_INSTANCE_MARK, id(instance)) + args, kwargs)
+            return self._cached_call(key, (instance,) + args, kwargs, instance)
+        key = self.__make_key((_INSTANCE_MARK, _InstanceRef(instance)) + args, kwargs)
+        return self._cached_call(key, (instance,) + args, kwargs)
+
+    def _cached_call(self, key: Hashable, args: tuple, kwargs: dict, owner: Any = None) -> Any:
+        """ Return the cached result for the key or calculate it if it is not cached or it has expired.
+
+        :param key: The cache key.
+        :param args: The positional arguments.
+        :param kwargs: The named arguments.
+        :param owner: The instance whose id is in the key, if the result has to be removed when it is destroyed.
+        :return: The result.
+        """
+        with self.__lock:
+            # The results of a destroyed instance are removed before its id can match a new instance
+            if self.__dead:
+                self.__purge()
+            # OrderedDict.get() and move_to_end() avoid the slower LRUDict.__getitem__()
+            entry = self.__cache.get(key)
+            if entry is not None:
+                value, expiration = entry
+                if expiration is None or expiration > monotonic():
+                    self.__cache.move_to_end(key)
+                    self.__hits += 1
+                    return value
+                del self.__cache[key]
+                self.__unindex(key)
+                self.__evictions += 1
+            self.__misses += 1
+            call = self.__calls.get(key)
+            if call is None:
+                call = self.__calls[key] = Future()
+                first = True
+            else:
+                first = False
+        if not first:
+            return call.result()
+        try:
+            value = self.__func(*args, **kwargs)
+        except BaseException as e:
+            with self.__lock:
+                del self.__calls[key]
+            call.set_exception(e)
+            raise
+        with self.__lock:
+            if self.__dead:
+                self.__purge()
+            self.__cache[key] = value, None if self.__ttl is None else monotonic() + self.__ttl
+            if owner is not None:
+                self.__index(owner, key)
+            del self.__calls[key]
+        call.set_result(value)
+        return value
+
+    def __count_eviction(self, key: Hashable, value: Any) -> None:
+        self.__evictions += 1
+        self.__unindex(key)
+
+    def __index(self, owner: Any, key: Hashable) -> None:
+        """ Register the key of a result of an instance to remove it when the instance is destroyed.
+          The lock must be taken.
+
+        :param owner: The instance.
+        :param key: The key of the result.
+        """
+        ident = id(owner)
+        if ident not in self.__instances:
+            finalizer = weakref.finalize(owner, self.__forget, ident)
+            finalizer.atexit = False
+            self.__instances[ident] = finalizer
+        self.__keys.setdefault(ident, set()).add(key)
+
+    def __unindex(self, key: Hashable) -> None:
+        """ Unregister the key of a removed result. The lock must be taken.
+
+        :param key: The key of the result.
+        """
+        if key and key[0] is _INSTANCE_MARK and key[1] in self.__keys:
+            keys = self.__keys[key[1]]
+            keys.discard(key)
+            if not keys:
+                del self.__keys[key[1]]
+
+    def __forget(self, ident: int) -> None:
+        """ Remove the results of a destroyed instance. It is called by the garbage collector from any thread, maybe
+          while the lock is taken, in that case, they are removed in the next call.
+
+        :param ident: The id of the destroyed instance.
+        """
+        self.__dead.append(ident)
+        if self.__lock.acquire(blocking=False):
+            try:
+                self.__purge()
+            finally:
+                self.__lock.release()
+
+    def __purge(self) -> None:
+        """ Remove the results of the destroyed instances. The lock must be taken. """
+        while self.__dead:
+            ident = self.__dead.popleft()
+            self.__instances.pop(ident, None)
+            for key in self.__keys.pop(ident, ()):
+                self.__cache.pop(key, None)
+
+    def cache_info(self) -> CacheInfo:
+        """
+        :return: The number of hits, misses and evicted or expired results, the maximum size and the current size.
+        """
+        with self.__lock:
+            if self.__dead:
+                self.__purge()
+            return CacheInfo(self.__hits, self.__misses, self.__evictions, self.__max_size, len(self.__cache))
+
+    def cache_clear(self) -> None:
+        """ Remove all the cached results and reset the statistics. """
+        with self.__lock:
+            self.__cache.clear()
+            self.__keys.clear()
+            self.__hits = self.__misses = self.__evictions = 0
+
+
+class _BoundTTLCache(object):
+    """ A cached function bound to an instance, like a method. """
+
+    def __init__(self, cache: _TTLCache, instance: Any) -> None:
+        """ Constructor.
+
+        :param cache: The cached function.
+        :param instance: The instance.
+        """
+        self.__cache = cache
+        self.__instance = instance
+        self.__wrapped__ = cache.__wrapped__
+
+    def __call__(self, *args, **kwargs) -> Any:
+        return self.__cache._call_method(self.__instance, args, kwargs)
+
+    def cache_info(self) -> CacheInfo:
+        return self.__cache.cache_info()
+
+    def cache_clear(self) -> None:
+        self.__cache.cache_clear()
+
@@ -1,17 +1,34 @@
+import bz2
 import gzip
 import json
+import lzma
 import pickle
 import tarfile
-from os import makedirs, PathLike
+import threading
+import zlib
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext, ExitStack
+from copy import copy
+from fnmatch import fnmatchcase
+from functools import partial
+from io import BytesIO, BufferedReader, RawIOBase, SEEK_SET, SEEK_CUR, SEEK_END
+from logging import getLogger
+from os import makedirs, PathLike, stat, fsdecode, remove, replace
+from urllib.parse import urlparse
 from tarfile import TarInfo
-from os.path import basename, isdir, join, exists, splitext, dirname, normpath
-from typing import List, Any, Union
-from shutil import move
+from os.path import basename, isdir, join, exists, splitext, dirname, normpath, abspath, isabs, realpath, commonpath
+from typing import List, Any, Union, Iterator, Tuple, Iterable, Optional, Callable, Dict
+from shutil import move, copyfileobj
+from tempfile import SpooledTemporaryFile
+from time import time
 
 from typing import IO
 
 
-from mysutils.file import copy_files, list_dir
+from mysutils.collections import LRUDict
+from mysutils.file import save_pickle, load_pickle
 from mysutils.tmp import removable_tmp
 # Import tqdm if it is installed, otherwise a dummy tqdm function is used.
 try:
@@ -20,27 +37,58 @@ except ModuleNotFoundError as e:
     def tqdm(obj: Any) -> Any:
         return obj
 
-# Available tar compress methods
-COMPRESS_METHODS = {'gz', 'bz2', 'xz'}
+# Available tar compress methods. Zstandard (zst) and LZ4 (lz4) require the modules zstandard and lz4.
+COMPRESS_METHODS = {'gz', 'bz2', 'xz', 'zst', 'lz4'}
+# Default size in bytes of the blocks compressed in parallel by create_tar()
+PARALLEL_BLOCK_SIZE = 4 * 1024 * 1024
+# Default distance in bytes of uncompressed data between two gzip checkpoints of a TarIndex
+INDEX_SPAN = 4 * 1024 * 1024
+# Default maximum size in bytes of the member contents waiting to be written by the extraction threads
+EXTRACT_IN_FLIGHT_BYTES = 64 * 1024 * 1024
+# Maximum number of tar archives whose member listing is kept in memory
+LISTING_CACHE_SIZE = 32
+
+logger = getLogger(__name__)
+
+_COMPRESS_OPENERS = {'gz': gzip.open, 'bz2': bz2.open, 'xz': lzma.open,
+                     'zst': lambda name, mode: _zstd_open(name),
+                     'lz4': lambda name, mode: _lz4_frame().open(name, mode)}
+_CHUNK_SIZE = 64 * 1024
+_TAR_EOF = tarfile.NUL * tarfile.BLOCKSIZE * 2
+_BLOCK_COMPRESSORS = {'gz': partial(gzip.compress, mtime=0), 'bz2': bz2.compress, 'xz': lzma.compress,
+                      'lz4': lambda data, compresslevel=0: _lz4_frame().compress(data, compression_level=compresslevel)}
+# The name of the compression level argument of each compression method
+_LEVEL_ARGS = {'gz': 'compresslevel', 'bz2': 'compresslevel', 'xz': 'preset', 'zst': 'compresslevel',
+               'lz4': 'compresslevel'}
+_INDEX_VERSION = 1
+_LISTING_CACHE = LRUDict(LISTING_CACHE_SIZE)
+_LISTING_LOCK = threading.Lock()
 
 
 def create_tar(filename: Union[str, PathLike, bytes],
                *files: Union[str, PathLike, bytes],
-               verbose: bool = False, compress_method: str = None) -> str:
+               verbose: bool = False, compress_method: str = None,
+               workers: int = 1, block_size: int = PARALLEL_BLOCK_SIZE, compress_level: int = None) -> str:
     """
-    Create a tar file with a given list of files. If the filename has any of these extensions 'gz', 'bz2' or 'xz',
-      then the tar file will be compressed with the specify method.
+    Create a tar file with a given list of files. If the filename has any of these extensions 'gz', 'bz2', 'xz', 'zst'
+      or 'lz4', then the tar file will be compressed with the specify method.
+    If workers is greater than 1, the tar stream is split in blocks which are compressed in parallel by a thread pool.
+      The result is a standard multi-member gzip, multi-stream bzip2, xz or lz4 file, which can be read by
+      any tool, but slightly bigger because each block is compressed independently.
+      Zstandard uses its own multi-threaded compression instead.
     :param filename: The name of the tar file.
     :param files: The list of file paths to include in the tar file.
     :param verbose: if True, show a bar progress.
     :param compress_method: Force the compression or decompression method to use.
        By default, select from the file extension.
+    :param workers: The number of threads to compress the tar file.
+    :param block_size: The size in bytes of the uncompressed blocks when workers is greater than 1.
+    :param compress_level: The compression level. By default, the default level of each compression method.
     :return: The TAR filename.
     """
-    compress_method = compress_method if compress_method else detect_compress_method(filename)
-    with tarfile.open(filename, f'w:{compress_method}') as tar:
+    with TarWriter(filename, compress_method, workers, block_size, compress_level) as tar:
         for file in tqdm(files, desc='Creating tar file', disable=not verbose):
-            tar.add(file, basename(normpath(file)))
+            tar.add(file)
     return filename
 
 
@@ -48,6 +96,10 @@ def add_tar_files(filename: Union[str, PathLike, bytes],
                   *files: Union[str, PathLike, bytes],
                   verbose: bool = False, compress_method: str = None) -> str:
     """ Add files to a previously created tar file.
+    In uncompressed and gzip tar files, the files are appended: if a file already exists, the archive keeps both
+      copies, list_tar() returns both of them, and the functions to read and extract files use the last one.
+      With other compression methods, the archive is rewritten without the previous copies. See
+      add_compressed_tar_files().
 
     :param filename: The TAR file. It may be a compressed one or not.
     :param files: A list of file paths to include in the tar file
@@ -58,9 +110,9 @@ def add_tar_files(filename: Union[str, PathLike, bytes],
     """
     compress_method = compress_method if compress_method else detect_compress_method(filename)
     if compress_method and exists(filename):
-        add_compressed_tar_files(filename, *files, verbose=verbose)
+        add_compressed_tar_files(filename, *files, verbose=verbose, compress_method=compress_method)
     else:
-        with tarfile.open(filename, f'a' if exists(filename) else f'w:{compress_method}') as tar:
+        with _open_tar(filename, f'a' if exists(filename) else f'w:{compress_method}') as tar:
             for file in tqdm(files, desc='Adding files to tar', disable=not verbose):
                 tar.add(file, basename(normpath(file)))
     return filename
@@ -70,6 +122,14 @@ def add_compressed_tar_files(filename: Union[str, PathLike, bytes],
                              *files: Union[str, PathLike, bytes],
                              verbose: bool = False, compress_method: str = None) -> str:
     """ Add files to a previously created tar file.
+    For gzip, the new files are appended as a new gzip member, without decompressing the previous ones. Like in
+      uncompressed tar files, if a file already exists, the new one is appended and it hides the old one,
+      but both copies are listed by list_tar().
+      The first time that files are added to a gzip tar file not created by this function, the last gzip member
+      is recompressed to move the end-of-archive marker to its own gzip member.
+    For other compression methods, the archive members are copied into a new archive, followed by the new files.
+      The previous members with the same name than the new files are not copied, so the archive has only one copy.
+    If there is any error with a compressed archive, it is not modified.
 
     :param filename: The TAR file. It has to be a compressed one.
     :param files: A list of file paths to include in the tar file
@@ -79,49 +139,210 @@ def add_compressed_tar_files(filename: Union[str, PathLike, bytes],
     :return: The TAR filename.
     """
     compress_method = compress_method if compress_method else detect_compress_method(filename)
-    if compress_method and exists(filename):
-        with removable_tmp(True) as tmp_dir:
-            extract_tar(filename, tmp_dir, False, verbose)
-            copy_files(tmp_dir, *files, force=True)
-            with removable_tmp(suffix=f'.{compress_method}') as tmp_file:
-                create_tar(tmp_file, *list_dir(tmp_dir), verbose=verbose)
-                move(tmp_file, filename)
+    if compress_method == 'gz' and exists(filename):
+        _append_gzip_tar(filename, files, verbose)
+    elif compress_method and exists(filename):
+        names = {basename(normpath(file)) for file in files}
+        with removable_tmp(suffix=f'.{compress_method}') as tmp_file:
+            with _open_tar(filename, f'r|{compress_method}') as reader, \
+                    _open_tar(tmp_file, f'w:{compress_method}') as writer:
+                for member in reader:
+                    if member.path.split('/')[0] not in names:
+                        writer.addfile(member, reader.extractfile(member) if member.isfile() else None)
+                for file in tqdm(files, desc='Adding files to tar', disable=not verbose):
+                    writer.add(file, basename(normpath(file)))
+            move(tmp_file, filename)
     else:
-        with tarfile.open(filename, f'a' if exists(filename) else f'w:{compress_method}') as tar:
+        with _open_tar(filename, f'a' if exists(filename) else f'w:{compress_method}') as tar:
             for file in tqdm(files, desc='Adding files to tar', disable=not verbose):
                 tar.add(file, basename(file))
     return filename
 
 
+def _append_gzip_tar(filename: Union[str, PathLike, bytes],
+                     files: Iterable[Union[str, PathLike, bytes]],
+                     verbose: bool = False) -> None:
+    """ Append files to a gzip tar file writing a new gzip member with the new files and another one with the
+      end-of-archive marker.
+    The new members are compressed into a temporary file before modifying the archive. If the archive already ends
+      with an end-of-archive member, that member is replaced by the new ones, and it is restored if there is any error.
+      Otherwise, the archive is rewritten into a temporary file which replaces it atomically.
+
+    :param filename: The gzip TAR file.
+    :param files: A list of file paths to include in the tar file
+    :param verbose: If you want to show a progress bar.
+    """
+    with removable_tmp() as members_file:
+        with open(members_file, 'wb') as members:
+            _write_gzip_tar_members(members, files, verbose)
+        with open(filename, 'r+b') as file:
+            offset = _gzip_tar_eof(file)
+            if offset is not None:
+                file.seek(offset)
+                tail = file.read()
+                try:
+                    file.seek(offset)
+                    file.truncate()
+                    with open(members_file, 'rb') as members:
+                        copyfileobj(members, file)
+                except BaseException:
+                    file.seek(offset)
+                    file.truncate()
+                    file.write(tail)
+                    raise
+                return
+        _rewrite_gzip_tar(filename, members_file)
+
+
+def _write_gzip_tar_members(output: IO, files: Iterable[Union[str, PathLike, bytes]], verbose: bool = False) -> None:
+    """ Write a gzip member with tar entries of some files and another one with the end-of-archive marker.
+
+    :param output: The opened binary file to write.
+    :param files: A list of file paths to include.
+    :param verbose: If you want to show a progress bar.
+    """
+    with gzip.GzipFile(fileobj=output, mode='wb', mtime=0) as writer:
+        tar = tarfile.open(fileobj=writer, mode='w')
+        for file_path in tqdm(files, desc='Adding files to tar', disable=not verbose):
+            tar.add(file_path, basename(normpath(file_path)))
+        # The tar is not closed because the end-of-archive marker is written in its own gzip member
+    output.write(gzip.compress(_TAR_EOF, mtime=0))
+
+
+def _rewrite_gzip_tar(filename: Union[str, PathLike, bytes], members_file: Union[str, PathLike]) -> None:
+    """ Rewrite a gzip TAR file which does not end with an end-of-archive member, recompressing its last gzip member
+      without the end-of-archive marker and adding new members. The previous gzip members are copied as they are.
+
+    :param filename: The gzip TAR file.
+    :param members_file: The file with the new gzip members.
+    """
+    temp_file = fsdecode(filename) + '.tmp'
+    try:
+        with open(filename, 'rb') as file, open(temp_file, 'wb') as output, removable_tmp() as tail_file:
+            with open(tail_file, 'w+b') as tail:
+                offset = _recompress_gzip_tar_tail(file, tail)
+                file.seek(0)
+                remaining = offset
+                while remaining:
+                    chunk = file.read(min(_CHUNK_SIZE, remaining))
+                    output.write(chunk)
+                    remaining -= len(chunk)
+                tail.seek(0)
+                copyfileobj(tail, output)
+            with open(members_file, 'rb') as members:
+                copyfileobj(members, output)
+        # Atomic, the archive is always complete
+        replace(temp_file, filename)
+    except BaseException:
+        if exists(temp_file):
+            remove(temp_file)
+        raise
+
+
+def _gzip_tar_eof(file: IO) -> Optional[int]:
+    """ Search the gzip member with the end-of-archive marker written by _append_gzip_tar() at the end of a file.
+
+    :param file: The opened gzip TAR file.
+    :return: The position where that gzip member starts or None if the file does not end with it.
+    """
+    size = file.seek(0, 2)
+    file.seek(max(0, size - 128))
+    tail = file.read()
+    start = tail.find(b'\x1f\x8b')
+    while start >= 0:
+        try:
+            if gzip.decompress(tail[start:]) == _TAR_EOF:
+                return size - len(tail) + start
+        except (OSError, EOFError, zlib.error):
+            pass
+        start = tail.find(b'\x1f\x8b', start + 1)
+    return None
+
+
+def _recompress_gzip_tar_tail(file: IO, output: IO) -> int:
+    """ Recompress the data of a gzip TAR file between the last gzip member boundary and the end of the last tar entry,
+      removing the end-of-archive marker. If the file is not compressed, its whole content is compressed.
+
+    :param file: The opened gzip TAR file.
+    :param output: The file where the recompressed data is written.
+    :return: The position of the file where the recompressed data starts.
+    """
+    file.seek(0)
+    compressed = file.read(2) == b'\x1f\x8b'
+    boundaries = [(0, 0)]
+
+    def chunks(offset: int = 0) -> Iterator[bytes]:
+        uncompressed = 0
+        for data, position, state in _gzip_chunks(file, offset) if compressed else _raw_chunks(file, offset):
+            uncompressed += len(data)
+            if state is None:
+                boundaries.append((uncompressed, position))
+            yield data
+
+    with tarfile.open(fileobj=_ChunkReader(chunks()), mode='r|') as tar:
+        for _ in tar:
+            pass
+        end = tar.offset
+    start, offset = [boundary for boundary in boundaries if boundary[0] <= end][-1]
+    with gzip.GzipFile(fileobj=output, mode='wb', mtime=0) as writer:
+        for data in chunks(offset):
+            writer.write(data[:end - start])
+            start += len(data)
+            if start >= end:
+                break
+    return offset
+
+
+def _raw_chunks(file: IO, offset: int = 0) -> Iterator[Tuple[bytes, int, Any]]:
+    """ Read an uncompressed file by chunks with the same format as _gzip_chunks().
+
+    :param file: The opened file.
+    :param offset: The position to start from.
+    :return: An iterator of tuples with a chunk, the position after that chunk and a dummy decompressor state.
+    """
+    file.seek(offset)
+    for chunk in iter(lambda: file.read(_CHUNK_SIZE), b''):
+        offset += len(chunk)
+        yield chunk, offset, file
+
+
 def detect_compress_method(filename: Union[str, PathLike, bytes]) -> str:
     """ Detecting the compression method based on the extension of the filename.
 
     :param filename: The file path to the tar file.
-    :return: 'gz', 'bz2' or 'xz' if the file is compressed by one of these methods, otherwise an empty string.
+    :return: 'gz', 'bz2', 'xz', 'zst' or 'lz4' if the file is compressed by one of these methods,
+      otherwise an empty string.
     """
-    extension = splitext(str(filename))[1]
+    extension = splitext(urlparse(filename).path if _is_url(filename) else str(filename))[1]
     if extension.endswith('.tgz'):
         return 'gz'
+    if extension.endswith('.tzst'):
+        return 'zst'
     return extension[1:].lower() if extension[1:].lower() in COMPRESS_METHODS else ''
 
 
 def open_tar_file(tar_file: Union[str, PathLike, bytes],
                   filename: Union[str, PathLike, bytes],
-                  compress_method: str = None) -> IO:
+                  compress_method: str = None,
+                  index: 'TarIndex' = None) -> IO:
     """ Open a tar file and return a IO stream to the file.
 
     :param tar_file: The path to the tar file-.
     :param filename: The path inside of the tar to the file to extract.
     :param compress_method: Force the compression or decompression method to use.
        By default, select from the file extension.
+    :param index: Optionally, a TarIndex of the tar file to read the file without scanning the archive.
     :return: An IO stream.
     """
+    if index is not None:
+        return index.open(filename)
     compress_method = compress_method if compress_method else detect_compress_method(tar_file)
-    tar = tarfile.open(tar_file, f'r:{compress_method}')
-    try:
-        file = tar.extractfile(filename)
-    except KeyError:
+    # With the cached listing, the member is read directly from its position without scanning the archive headers
+    member = _tar_listing(tar_file, compress_method).names.get(str(filename))
+    if member is None:
         raise FileNotFoundError(f'The file "{filename}" is not in "{tar_file}".')
+    tar = _open_tar(tar_file, f'r:{compress_method}')
+    file = tar.extractfile(member)
     old_close = file.close
 
     def close():
@@ -134,16 +355,18 @@ def open_tar_file(tar_file: Union[str, PathLike, bytes],
 
 def load_tar_json(tar_file: Union[str, PathLike, bytes],
                   filename: Union[str, PathLike, bytes],
-                  compress_method: str = None) -> Any:
+                  compress_method: str = None,
+                  index: 'TarIndex' = None) -> Any:
     """ Load an object from a JSON file stored in a tar file.
 
     :param tar_file: The path to the tar file-.
     :param filename: The path inside of the tar to the file to extract.
     :param compress_method: Force the compression or decompression method to use.
        By default, select from the file extension.
+    :param index: Optionally, a TarIndex of the tar file to read the file without scanning the archive.
     :return: The loaded object.
     """
-    with open_tar_file(tar_file, filename, compress_method) as file:
+    with open_tar_file(tar_file, filename, compress_method, index) as file:
         if str(filename).lower().endswith('.gz') or str(filename).lower().endswith('.tgz'):
             return json.load(gzip.open(file))
         return json.load(file)
@@ -151,32 +374,188 @@ def load_tar_json(tar_file: Union[str, PathLike, bytes],
 
 def load_tar_pickle(tar_file: Union[str, PathLike, bytes],
                     filename: Union[str, PathLike, bytes],
-                    compress_method: str = None) -> Any:
+                    compress_method: str = None,
+                    index: 'TarIndex' = None) -> Any:
     """ Load an object from a pickle file stored in a tar file.
 
     :param tar_file: The path to the tar file-.
     :param filename: The path inside of the tar to the file to extract.
     :param compress_method: Force the compression or decompression method to use.
        By default, select from the file extension.
+    :param index: Optionally, a TarIndex of the tar file to read the file without scanning the archive.
     :return: The loaded object.
     """
-    with open_tar_file(tar_file, filename, compress_method) as file:
+    with open_tar_file(tar_file, filename, compress_method, index) as file:
         if str(filename).lower().endswith('.gz') or str(filename).lower().endswith('.tgz'):
             return pickle.load(gzip.open(file))
         return pickle.load(file)
 
 
+def load_tar_members(tar_file: Union[str, PathLike, bytes],
+                     patterns: Union[str, Iterable[str]] = '*',
+                     compress_method: str = None,
+                     workers: int = 1,
+                     index: 'TarIndex' = None) -> Dict[str, Any]:
+    """ Load all the files of a tar archive whose path matches with any of the given patterns,
+      reading the archive only once. The files are loaded depending on their extension: JSON (.json),
+      pickle (.pkl, .pickle) or YAML (.yaml, .yml), also if they are gzip compressed (.gz). The content of the rest of
+      files is returned as bytes. If a path is several times in the archive, the last one is returned.
+
+    :param tar_file: The path to the tar file.
+    :param patterns: A shell-style wildcard or a list of them, for example, 'model/*.json'.
+      Note that '*' also matches with the '/' character.
+    :param compress_method: Force the compression or decompression method to use.
+       By default, select from the file extension.
+    :param workers: The number of threads to decode the files while the archive is read.
+    :param index: Optionally, a TarIndex of the tar file to read only the matching files.
+    :return: A dictionary with the paths of the matching files in the archive order as keys,
+      and their loaded objects as values.
+    """
+    patterns = [patterns] if isinstance(patterns, str) else list(patterns)
+    matches = partial(_matches, patterns=patterns)
+    with ThreadPoolExecutor(max_workers=workers) if workers > 1 else nullcontext() as executor:
+        decode = partial(executor.submit, _decode_member) if executor else None
+        results = {}
+        if index:
+            for member in index.members():
+                if member.isfile() and matches(member.path):
+                    results.pop(member.path, None)
+                    data = index.read(member.path)
+                    results[member.path] = decode(member.path, data) if decode else _decode_member(member.path, data)
+        else:
+            compress_method = compress_method if compress_method else detect_compress_method(tar_file)
+            with _open_tar(tar_file, f'r|{compress_method}') as tar:
+                for member in tar:
+                    if member.isfile() and matches(member.path):
+                        with tar.extractfile(member) as reader:
+                            data = reader.read()
+                        results.pop(member.path, None)
+                        results[member.path] = \
+                            decode(member.path, data) if decode else _decode_member(member.path, data)
+        return {path: value.result() for path, value in results.items()} if decode else results
+
+
+def _matches(path: str, patterns: List[str]) -> bool:
+    """ Check if a path matches with any pattern.
+
+    :param path: The path.
+    :param patterns: The list of shell-style wildcards.
+    :return: True if the path matches with any of the patterns, otherwise False.
+    """
+    return any(fnmatchcase(path, pattern) for pattern in patterns)
+
+
+def _decode_member(path: str, data: bytes) -> Any:
+    """ Load the content of a file depending on its extension.
+
+    :param path: The file path.
+    :param data: The file content.
+    :return: The loaded object for JSON, pickle and YAML files, otherwise, the same content.
+    """
+    path = path.lower()
+    if path.endswith('.gz'):
+        path = path[:-3]
+        data = gzip.decompress(data)
+    extension = splitext(path)[1]
+    if extension == '.json':
+        return json.loads(data)
+    if extension in ('.pkl', '.pickle'):
+        return pickle.loads(data)
+    if extension in ('.yaml', '.yml'):
+        from mysutils.yaml import load, SafeLoader
+        return load(data, SafeLoader)
+    return data
+
+
 def list_tar(tar_file: Union[str, PathLike, bytes], compress_method: str = None) -> List[TarInfo]:
     """ Obtain a list with the information of each file or directory of a tar file.
 
     :param tar_file: The path to the tar file.
     :param compress_method: Force the compression or decompression method to use.
        By default, select from the file extension.
-    :return: A list of TarInfo instances.
+    :return: A list of TarInfo instances. They are copies, thus, modifying them does not change the cached listing.
+    """
+    return [copy(member) for member in _tar_listing(tar_file, compress_method).members]
+
+
+def tar_members(tar_file: Union[str, PathLike, bytes], compress_method: str = None) -> Dict[str, TarInfo]:
+    """ Obtain a dictionary with the path of each file or directory of a tar file and its information.
+      If a path is repeated in the archive, the last one is returned, like tarfile does.
+      The listing is cached while the tar file does not change its size or modification time.
+
+    :param tar_file: The path to the tar file.
+    :param compress_method: Force the compression or decompression method to use.
+       By default, select from the file extension.
+    :return: A dictionary with the member paths as keys and copies of their TarInfo instances as values.
+    """
+    return {name: copy(member) for name, member in _tar_listing(tar_file, compress_method).names.items()}
+
+
+def clear_tar_listings() -> None:
+    """ Remove all the cached tar listings. """
+    with _LISTING_LOCK:
+        _LISTING_CACHE.clear()
+
+
+class _TarListing(object):
+    """ The member headers of a tar file. """
+
+    def __init__(self, stamp: tuple, members: List[TarInfo]) -> None:
+        """ Constructor.
+
+        :param stamp: The values to check if the tar file has changed since it was listed. See _file_stamp().
+        :param members: The tar members in the archive order.
+        """
+        self.stamp = stamp
+        self.members = members
+        self.names = {member.path: member for member in members}
+
+
+def _tar_listing(tar_file: Union[str, PathLike, bytes], compress_method: str = None) -> _TarListing:
+    """ Obtain the cached listing of a tar file or read it if it is not cached or the file has changed.
+      Only the headers are read, the content of the members is skipped.
+
+    :param tar_file: The path to the tar file.
+    :param compress_method: Force the compression or decompression method to use.
+       By default, select from the file extension.
+    :return: The listing of the tar file.
     """
     compress_method = compress_method if compress_method else detect_compress_method(tar_file)
-    with tarfile.open(tar_file, f'r:{compress_method}') as tar:
-        return tar.getmembers()
+    stamp = _file_stamp(tar_file)
+    listing = _cached_listing(tar_file, compress_method, stamp)
+    if listing is not None:
+        return listing
+    with _open_tar(tar_file, f'r:{compress_method}') as tar:
+        listing = _TarListing(stamp, list(tar))
+    with _LISTING_LOCK:
+        _LISTING_CACHE[_listing_key(tar_file, compress_method)] = listing
+    return listing
+
+
+def _cached_listing(tar_file: Union[str, PathLike, bytes], compress_method: str,
+                    stamp: tuple = None) -> Optional[_TarListing]:
+    """ Obtain the cached listing of a tar file without reading the file if it is not cached.
+
+    :param tar_file: The path to the tar file.
+    :param compress_method: The compression method of the tar file.
+    :param stamp: The current stamp of the tar file. By default, it is obtained with _file_stamp().
+    :return: The listing of the tar file or None if it is not cached or the file has changed.
+    """
+    with _LISTING_LOCK:
+        listing = _LISTING_CACHE.get(_listing_key(tar_file, compress_method))
+    if listing is None or listing.stamp != (_file_stamp(tar_file) if stamp is None else stamp):
+        return None
+    return listing
+
+
+def _listing_key(tar_file: Union[str, PathLike, bytes], compress_method: str) -> tuple:
+    """ The key of a tar file in the listing cache.
+
+    :param tar_file: The path to the tar file or its URL.
+    :param compress_method: The compression method of the tar file.
+    :return: The key.
+    """
+    return tar_file if _is_url(tar_file) else abspath(tar_file), compress_method
 
 
 def extract_tar_file(tar_file: Union[str, PathLike, bytes],
@@ -194,7 +573,7 @@ def extract_tar_file(tar_file: Union[str, PathLike, bytes],
     """
     compress_method = compress_method if compress_method else detect_compress_method(tar_file)
     dest = join(dest, filename) if isdir(dest) else dest
-    with tarfile.open(tar_file, f'r:{compress_method}') as tar:
+    with _open_tar(tar_file, f'r:{compress_method}') as tar:
         with tar.extractfile(filename) as reader:
             if dirname(dest) and not exists(dirname(dest)):
                 makedirs(dirname(dest))
@@ -207,32 +586,66 @@ def extract_tar_file(tar_file: Union[str, PathLike, bytes],
 def extract_tar_files(tar_file: Union[str, PathLike, bytes],
                       dest: Union[str, PathLike, bytes],
                       *files: Union[str, PathLike, bytes],
-                      force: bool = False, verbose: bool = False, compress_method: str = None) -> str:
-    """ Extract a file inside of a tar archive.
+                      force: bool = False, verbose: bool = False, compress_method: str = None,
+                      workers: int = 1, max_in_flight: int = EXTRACT_IN_FLIGHT_BYTES) -> str:
+    """ Extract several files inside of a tar archive.
+    The archive is read only once. If it was listed before, the reading stops as soon as all the requested files are
+      extracted, otherwise, it is read to the end. If a file is several times in the archive, for example, because it was appended again with add_tar_files(),
+      the last one is extracted, like load_tar_json() and the other functions to read tar files.
 
     :param tar_file: The path to the tar file.
     :param dest: The folder where the tar archive should be extracted.
     :param files: The relative path inside of the tar file to extract.
-    :param force: If True, create the destination directory if it doesn't exist.
       If files is not given, then extract all the files.
+    :param force: If True, create the destination directory if it doesn't exist.
     :param verbose: If verbose, show the progress bar.
     :param compress_method: Force the compression or decompression method to use.
        By default, select from the file extension.
+    :param workers: The number of threads to write the extracted files. See extract_tar().
+    :param max_in_flight: The maximum size in bytes of the file contents waiting to be written.
     :return: The TAR filename.
+    :raises KeyError: If any of the files is not in the tar archive.
     """
     if not exists(dest) and force:
         makedirs(dest)
     if not isdir(dest):
         raise ValueError(f'The destination is not an existing folder.')
-    files = files if files else [file.path for file in list_tar(tar_file)]
-    for file in tqdm(files, desc='Extracting files', disable=not verbose):
-        extract_tar_file(tar_file, dest, file, compress_method)
+    if not files:
+        return extract_tar(tar_file, dest, verbose=verbose, compress_method=compress_method,
+                           workers=workers, max_in_flight=max_in_flight)
+    compress_method = compress_method if compress_method else detect_compress_method(tar_file)
+    requested = {str(file) for file in files}
+    # A cached listing has the last member of each path, identified by its position, so the reading stops after it.
+    # Without it, the archive is read to the end and the later copies of a file overwrite the previous ones
+    listing = _cached_listing(tar_file, compress_method)
+    wanted = {listing.names[file].offset for file in requested if file in listing.names} if listing else None
+    found = set()
+    with _open_tar(tar_file, f'r|{compress_method}') as tar, _extractor(dest, workers, max_in_flight) as extract:
+        with tqdm(total=len(requested), desc='Extracting files', disable=not verbose) as progress:
+            for member in tar:
+                if member.path in requested and (wanted is None or member.offset in wanted):
+                    extract(tar, member)
+                    if member.path not in found:
+                        found.add(member.path)
+                        progress.update()
+                    if wanted is not None:
+                        wanted.remove(member.offset)
+                        if not wanted:
+                            break
+    missing = requested - found
+    if missing:
+        raise KeyError(f'The files {sorted(missing)} are not in "{tar_file}".')
     return tar_file
 
 
 def extract_tar(tar_file: Union[str, PathLike, bytes], dest: Union[str, PathLike, bytes],
-                force: bool = False, verbose: bool = False, compress_method: str = None) -> str:
+                force: bool = False, verbose: bool = False, compress_method: str = None,
+                workers: int = 1, max_in_flight: int = EXTRACT_IN_FLIGHT_BYTES) -> str:
     """ Extract all the files inside of a tar file in the specified directory.
+    If workers is greater than 1, the archive is still decompressed by the calling thread, but the files are written
+      by a pool of threads. This is faster when creating many small files, for example, in network file systems.
+      The contents waiting to be written never take more than max_in_flight bytes of memory,
+      bigger files are written directly by the calling thread.
 
     :param tar_file: The tar file to extract.
     :param dest: The destination directory.
@@ -240,6 +653,8 @@ def extract_tar(tar_file: Union[str, PathLike, bytes], dest: Union[str, PathLike
     :param verbose: If verbose, show the progress bar.
     :param compress_method: Force the compression or decompression method to use.
        By default, select from the file extension.
+    :param workers: The number of threads to write the extracted files.
+    :param max_in_flight: The maximum size in bytes of the file contents waiting to be written.
     :return: The TAR filename.
     """
     if not exists(dest) and force:
@@ -247,15 +662,102 @@ def extract_tar(tar_file: Union[str, PathLike, bytes], dest: Union[str, PathLike
     if not exists(dest):
         raise FileNotFoundError(f'The folder "{dest}" does not exists. Create it or put the parameter force to True.')
 
-    files = list_tar(tar_file, compress_method)
-    for file in tqdm(files, desc='Extracting files', disable=not verbose):
-        if file.isdir():
-            makedirs(join(dest, file.path))
-        else:
-            extract_tar_file(tar_file, dest, file.path, compress_method)
+    compress_method = compress_method if compress_method else detect_compress_method(tar_file)
+    with _open_tar(tar_file, f'r|{compress_method}') as tar, _extractor(dest, workers, max_in_flight) as extract:
+        for member in tqdm(tar, desc='Extracting files', disable=not verbose):
+            extract(tar, member)
     return tar_file
 
 
+def _extractor(dest: Union[str, PathLike, bytes], workers: int, max_in_flight: int) -> Any:
+    """ Create the context manager to extract the tar members.
+
+    :param dest: The destination folder.
+    :param workers: The number of threads to write the files. If it is 1, the files are written by the calling thread.
+    :param max_in_flight: The maximum size in bytes of the file contents waiting to be written.
+    :return: A context manager that returns a function to extract a member of an opened tar archive.
+    """
+    if workers > 1:
+        return _ParallelExtractor(dest, workers, max_in_flight)
+    return nullcontext(lambda tar, member: _extract_member(tar, member, dest))
+
+
+def _member_path(member: TarInfo, dest: Union[str, PathLike, bytes]) -> str:
+    """ Obtain the path where a member is extracted, checking that it is inside of the destination folder.
+      The absolute names, the names with .. and the names under a symbolic link to outside of the folder are rejected.
+
+    :param member: The tar member.
+    :param dest: The destination folder.
+    :return: The path to extract the member.
+    :raises ValueError: If the member would be extracted outside of the destination folder.
+    """
+    name = member.path
+    path = join(dest, name)
+    if isabs(name) or '..' in name.replace('\\', '/').split('/') or not _is_inside(path, dest):
+        raise ValueError(f'The member "{name}" would be extracted outside of the folder "{fsdecode(dest)}".')
+    return path
+
+
+def _is_inside(path: Union[str, PathLike], folder: Union[str, PathLike]) -> bool:
+    """ Check if a path is inside of a folder once the symbolic links are resolved.
+
+    :param path: The path.
+    :param folder: The folder.
+    :return: True if the path is the folder or it is inside of it.
+    """
+    folder = realpath(folder)
+    return commonpath([folder, realpath(path)]) == folder
+
+
+def _extract_link(tar: tarfile.TarFile, member: TarInfo, dest: Union[str, PathLike, bytes]) -> None:
+    """ Extract a member which is not a regular file or a directory, only if it is a link inside of the destination.
+      The 'data' extraction filter is used if this Python version has it, otherwise, the links are checked here.
+
+    :param tar: The opened tar archive.
+    :param member: The member to extract.
+    :param dest: The destination folder.
+    :raises ValueError: If the member is a device or a link to outside of the destination folder.
+    """
+    path = _member_path(member, dest)
+    if hasattr(tarfile, 'data_filter'):
+        try:
+            tar.extract(member, dest, filter='data')
+        except tarfile.FilterError as e:
+            raise ValueError(f'The member "{member.path}" cannot be extracted safely: {e}') from e
+        return
+    if member.issym():
+        target = join(dirname(path), member.linkname)
+    elif member.islnk():
+        target = join(dest, member.linkname)
+    else:
+        raise ValueError(f'The member "{member.path}" is a special file and it cannot be extracted safely.')
+    if isabs(member.linkname) or not _is_inside(target, dest):
+        raise ValueError(f'The link "{member.path}" points to outside of the folder "{fsdecode(dest)}".')
+    tar.extract(member, dest)
+
+
+def _extract_member(tar: tarfile.TarFile, member: TarInfo, dest: Union[str, PathLike, bytes]) -> None:
+    """ Extract a member of an opened tar archive. It also works with tar archives opened in stream mode.
+      The members which would be written outside of dest, directly or through a link, are rejected.
+
+    :param tar: The opened tar archive.
+    :param member: The member to extract.
+    :param dest: The destination folder.
+    :raises ValueError: If the member would be extracted outside of the destination folder.
+    """
+    if member.isdir():
+        makedirs(_member_path(member, dest), exist_ok=True)
+    elif member.isfile():
+        path = _member_path(member, dest)
+        if dirname(path) and not exists(dirname(path)):
+            makedirs(dirname(path))
+        with tar.extractfile(member) as reader:
+            with open(path, 'wb') as writer:
+                copyfileobj(reader, writer)
+    else:
+        _extract_link(tar, member, dest)
+
+
 def exist_tar_files(tar_file: Union[str, PathLike, bytes],
                     *files: Union[str, PathLike, bytes],
                     compress_method: str = None) -> bool:
@@ -268,10 +770,865 @@ def exist_tar_files(tar_file: Union[str, PathLike, bytes],
        By default, select from the file extension.
     :return: True if all the files exist, otherwise False.
     """
-    compress_method = compress_method if compress_method else detect_compress_method(tar_file)
-    with tarfile.open(tar_file, f'r:{compress_method}') as tar:
-        filenames = tar.getnames()
-    for file in files:
-        if file not in filenames:
+    names = _tar_listing(tar_file, compress_method).names
+    return all(str(file) in names for file in files)
+
+
+def _open_tar(tar_file: Union[str, PathLike, bytes], mode: str, **kwargs) -> tarfile.TarFile:
+    """ Open a tar file like tarfile.open(), but also with the Zstandard and LZ4 compression methods.
+      The stream reading modes are opened in the normal ones because the tarfile streams only decompress the first
+      gzip member or bzip2/xz stream, and the archives created in parallel or appended have several of them.
+      Reading the archive sequentially is as fast in both modes.
+
+    :param tar_file: The path to the tar file or its HTTP URL. The remote files are read by HTTP Range requests.
+    :param mode: The tarfile.open() mode, for example, 'r:gz', 'r|xz' or 'w:zst'.
+    :param kwargs: Other arguments for tarfile.open().
+    :return: The opened tar file.
+    """
+    if mode.startswith('r|'):
+        mode = f'r:{mode[2:]}'
+    if not _is_url(tar_file):
+        return _TarFile.open(tar_file, mode, **kwargs)
+    file = _open_binary(tar_file)
+    try:
+        tar = _TarFile.open(tar_file, mode, fileobj=file, **kwargs)
+    except BaseException:
+        file.close()
+        raise
+    tar.source = file
+    return tar
+
+
+def _is_url(path: Any) -> bool:
+    """ Check if a path is an HTTP or HTTPS URL.
+
+    :param path: The path.
+    :return: True if it is a string which starts with 'http://' or 'https://', otherwise False.
+    """
+    return isinstance(path, str) and path.lower().startswith(('http://', 'https://'))
+
+
+def _open_binary(file: Union[str, PathLike, bytes]) -> IO:
+    """ Open a local file or a remote one by its HTTP URL to read in binary mode.
+
+    :param file: The path to the file or its URL.
+    :return: The binary reader.
+    """
+    if _is_url(file):
+        from mysutils.web import open_url
+        return open_url(file)
+    return open(file, 'rb')
+
+
+def _file_stamp(file: Union[str, PathLike, bytes]) -> tuple:
+    """ Obtain the values to check if a file has changed.
+
+    :param file: The path to the file or its URL.
+    :return: The size and modification time of a local file with its inode,
+      or the size, Last-Modified and ETag headers of a remote one.
+    """
+    if _is_url(file):
+        from mysutils.web import url_stamp
+        return url_stamp(file)
+    stat_result = stat(file)
+    return stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino
+
+
+def _compress_kwargs(compress_method: str, compress_level: Optional[int]) -> dict:
+    """ Obtain the arguments to use a compression level with a compression method.
+
+    :param compress_method: The compression method.
+    :param compress_level: The compression level or None to use the default one.
+    :return: A dictionary with the level argument or an empty one.
+    """
+    if compress_level is None or not compress_method:
+        return {}
+    return {_LEVEL_ARGS[compress_method]: compress_level}
+
+
+class _TarFile(tarfile.TarFile):
+    """ A TarFile which also supports the Zstandard and LZ4 compression methods. """
+    # The compression methods not supported by tarfile
+    EXTRA_METHODS = {'zst', 'lz4'}
+    OPEN_METH = {**tarfile.TarFile.OPEN_METH, 'zst': 'zstopen', 'lz4': 'lz4open'}
+    # The file object opened by _open_tar() which is closed with the tar file
+    source = None
+
+    def close(self) -> None:
+        """ Close the tar file and its source file if it was opened by _open_tar(). """
+        try:
+            super().close()
+        finally:
+            if self.source is not None:
+                self.source.close()
+
+    @classmethod
+    def zstopen(cls, name: Union[str, PathLike, bytes], mode: str = 'r', fileobj: IO = None,
+                compresslevel: int = 3, threads: int = 0, **kwargs) -> tarfile.TarFile:
+        """ Open a Zstandard compressed tar archive.
+
+        :param name: The path to the tar file.
+        :param mode: 'r' to read, 'w' or 'x' to write.
+        :param fileobj: Optionally, the file object of the compressed archive.
+        :param compresslevel: The compression level.
+        :param threads: The number of compression threads. 0 to compress in the calling thread.
+        :param kwargs: Other TarFile arguments.
+        :return: The opened tar file.
+        """
+        zstandard = _zstandard()
+        if mode not in ('r', 'w', 'x'):
+            raise ValueError("mode must be 'r', 'w' or 'x'")
+        if mode == 'r':
+            fileobj = _zstd_open(fileobj or name)
+        else:
+            compressor = zstandard.ZstdCompressor(level=compresslevel, threads=threads)
+            fileobj = compressor.stream_writer(fileobj or open(name, f'{mode}b'), closefd=fileobj is None)
+        return cls.__taropen(name, mode, fileobj, zstandard.ZstdError, **kwargs)
+
+    @classmethod
+    def lz4open(cls, name: Union[str, PathLike, bytes], mode: str = 'r', fileobj: IO = None,
+                compresslevel: int = 0, **kwargs) -> tarfile.TarFile:
+        """ Open a LZ4 compressed tar archive.
+
+        :param name: The path to the tar file.
+        :param mode: 'r' to read, 'w' or 'x' to write.
+        :param fileobj: Optionally, the file object of the compressed archive.
+        :param compresslevel: The compression level.
+        :param kwargs: Other TarFile arguments.
+        :return: The opened tar file.
+        """
+        lz4_frame = _lz4_frame()
+        if mode not in ('r', 'w', 'x'):
+            raise ValueError("mode must be 'r', 'w' or 'x'")
+        fileobj = lz4_frame.open(fileobj or name, f'{mode}b', compression_level=compresslevel)
+        return cls.__taropen(name, mode, fileobj, RuntimeError, **kwargs)
+
+    @classmethod
+    def __taropen(cls, name: Union[str, PathLike, bytes], mode: str, fileobj: IO,
+                  error: type, **kwargs) -> tarfile.TarFile:
+        """ Open a tar archive over a compressed file object like tarfile does with its compression methods.
+
+        :param name: The path to the tar file.
+        :param mode: 'r' to read, 'w' or 'x' to write.
+        :param fileobj: The opened compressed stream.
+        :param error: The exception raised by the decompressor when the data is not valid.
+        :param kwargs: Other TarFile arguments.
+        :return: The opened tar file.
+        """
+        try:
+            tar = cls.taropen(name, mode, fileobj, **kwargs)
+        except (error, EOFError) as e:
+            fileobj.close()
+            if mode == 'r':
+                raise tarfile.ReadError('not a compressed file') from e
+            raise
+        except BaseException:
+            fileobj.close()
+            raise
+        # The tar file closes the compressed stream, like with the tarfile compression methods
+        tar._extfileobj = False
+        return tar
+
+
+def _zstandard() -> Any:
+    """
+    :return: The zstandard module.
+    """
+    try:
+        import zstandard
+        return zstandard
+    except ModuleNotFoundError:
+        raise ModuleNotFoundError('ModuleNotFoundError: No module named \'zstandard\'. '
+                                  'Please install it with the command:\n\n'
+                                  'pip install zstandard')
+
+
+def _lz4_frame() -> Any:
+    """
+    :return: The lz4.frame module.
+    """
+    try:
+        import lz4.frame
+        return lz4.frame
+    except ModuleNotFoundError:
+        raise ModuleNotFoundError('ModuleNotFoundError: No module named \'lz4\'. '
+                                  'Please install it with the command:\n\n'
+                                  'pip install lz4')
+
+
+def _zstd_open(file: Union[str, PathLike, bytes, IO]) -> IO:
+    """ Open a Zstandard compressed file to read. Unlike the zstandard readers, it can seek backwards.
+
+    :param file: The path to the file or its file object.
+    :return: A buffered binary reader of the decompressed data.
+    """
+    zstandard = _zstandard()
+    source = file if hasattr(file, 'read') else open(file, 'rb')
+    start = source.tell()
+    decompressor = zstandard.ZstdDecompressor()
+
+    def reader() -> IO:
+        source.seek(start)
+        return decompressor.stream_reader(source, read_across_frames=True, closefd=False)
+
+    return BufferedReader(_RewindableReader(reader, source if source is not file else None))
+
+
+class _RewindableReader(RawIOBase):
+    """ A seekable reader over a forward-only decompression stream. To seek backwards, the stream is reopened. """
+
+    def __init__(self, factory: Callable[[], IO], source: IO = None) -> None:
+        """ Constructor.
+
+        :param factory: The function to open the decompression stream from the beginning.
+        :param source: The file to close when this reader is closed.
+        """
+        super().__init__()
+        self.__factory = factory
+        self.__source = source
+        self.__reader = factory()
+        self.__position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        size = self.__reader.readinto(buffer)
+        self.__position += size
+        return size
+
+    def tell(self) -> int:
+        return self.__position
+
+    def seek(self, offset: int, whence: int = SEEK_SET) -> int:
+        if whence == SEEK_CUR:
+            offset += self.__position
+        elif whence == SEEK_END:
+            while self.read(_CHUNK_SIZE):
+                pass
+            offset += self.__position
+        if offset < self.__position:
+            self.__reader.close()
+            self.__reader = self.__factory()
+            self.__position = 0
+        while self.__position < offset and self.read(min(_CHUNK_SIZE, offset - self.__position)):
+            pass
+        return self.__position
+
+    def close(self) -> None:
+        if not self.closed:
+            self.__reader.close()
+            if self.__source is not None:
+                self.__source.close()
+        super().close()
+
+
+class TarWriter(object):
+    """ Write a tar archive adding the members directly from files, Python objects or binary streams,
+      without saving them into temporal files.
+    """
+
+    @property
+    def filename(self) -> Union[str, PathLike, bytes]:
+        """
+        :return: The path to the tar file.
+        """
+        return self.__filename
+
+    @property
+    def compress_method(self) -> str:
+        """
+        :return: The compression method of the tar file.
+        """
+        return self.__compress_method
+
+    def __init__(self, filename: Union[str, PathLike, bytes], compress_method: str = None, workers: int = 1,
+                 block_size: int = PARALLEL_BLOCK_SIZE, compress_level: int = None) -> None:
+        """ Create the tar file. If the filename has any of these extensions 'gz', 'bz2', 'xz', 'zst' or 'lz4',
+          then the tar file will be compressed with the specify method. See create_tar() for the parallel compression.
+
+        :param filename: The name of the tar file.
+        :param compress_method: Force the compression method to use. By default, select from the file extension.
+        :param workers: The number of threads to compress the tar file.
+        :param block_size: The size in bytes of the uncompressed blocks when workers is greater than 1.
+        :param compress_level: The compression level. By default, the default level of each compression method.
+        """
+        self.__filename = filename
+        self.__compress_method = compress_method if compress_method else detect_compress_method(filename)
+        self.__closing = ExitStack()
+        level = _compress_kwargs(self.__compress_method, compress_level)
+        if self.__compress_method == 'zst':
+            self.__tar = _open_tar(filename, 'w:zst', threads=workers if workers > 1 else 0, **level)
+        elif workers > 1 and self.__compress_method:
+            file = self.__closing.enter_context(open(filename, 'wb'))
+            compress = partial(_BLOCK_COMPRESSORS[self.__compress_method], **level)
+            writer = self.__closing.enter_context(_ParallelCompressor(file, compress, workers, block_size))
+            self.__tar = tarfile.open(fileobj=writer, mode='w')
+        else:
+            self.__tar = _open_tar(filename, f'w:{self.__compress_method}', **level)
+
+    def add(self, path: Union[str, PathLike, bytes], arcname: Union[str, PathLike, bytes] = None) -> None:
+        """ Add a file or a folder with all its content.
+
+        :param path: The path to the file or folder.
+        :param arcname: The path inside of the tar file. By default, the file or folder name.
+        """
+        self.__tar.add(path, arcname if arcname else basename(normpath(path)))
+
+    def add_bytes(self, arcname: Union[str, PathLike, bytes], data: bytes) -> None:
+        """ Add a file with the given content.
+
+        :param arcname: The path inside of the tar file.
+        :param data: The file content.
+        """
+        self.add_stream(arcname, BytesIO(data), len(data))
+
+    def add_stream(self, arcname: Union[str, PathLike, bytes], stream: IO, size: int = None) -> None:
+        """ Add a file with the content of a binary stream.
+          The size is written before the content, therefore, if it is not given and the stream is not seekable,
+          the content is buffered in memory, or in a temporal file if it is bigger than PARALLEL_BLOCK_SIZE.
+
+        :param arcname: The path inside of the tar file.
+        :param stream: The binary stream to read from its current position until its end.
+        :param size: The number of bytes to read from the stream.
+        """
+        if size is None and stream.seekable():
+            position = stream.tell()
+            size = stream.seek(0, SEEK_END) - position
+            stream.seek(position)
+        if size is None:
+            with SpooledTemporaryFile(PARALLEL_BLOCK_SIZE) as buffer:
+                copyfileobj(stream, buffer)
+                size = buffer.tell()
+                buffer.seek(0)
+                return self.add_stream(arcname, buffer, size)
+        member = TarInfo(str(arcname))
+        member.size = size
+        member.mtime = int(time())
+        member.mode = 0o644
+        self.__tar.addfile(member, stream)
+
+    def add_json(self, arcname: Union[str, PathLike, bytes], obj: Any, encoding: Optional[str] = None) -> None:
+        """ Add a JSON file with the same format as save_json(). If arcname ends with '.gz', it is gzip compressed.
+
+        :param arcname: The path inside of the tar file.
+        :param obj: The object to save.
+        :param encoding: The file encoding. By default, utf-8 but only with ASCII characters.
+        """
+        text = json.dumps(obj, indent=2, ensure_ascii=encoding is None)
+        self.__add_content(arcname, text.encode(encoding if encoding else 'utf-8'))
+
+    def add_pickle(self, arcname: Union[str, PathLike, bytes], obj: Any) -> None:
+        """ Add a pickle file. If arcname ends with '.gz', it is gzip compressed.
+
+        :param arcname: The path inside of the tar file.
+        :param obj: The object to save.
+        """
+        self.__add_content(arcname, pickle.dumps(obj))
+
+    def add_yaml(self, arcname: Union[str, PathLike, bytes], data: Any, encoding: Optional[str] = None) -> None:
+        """ Add a YAML file with the same format as save_yaml(). If arcname ends with '.gz', it is gzip compressed.
+
+        :param arcname: The path inside of the tar file.
+        :param data: The data to save.
+        :param encoding: The file encoding. By default, utf-8 but only with ASCII characters.
+        """
+        from mysutils.yaml import _dump_yaml
+        self.__add_content(arcname, _dump_yaml(data, encoding=encoding).encode(encoding if encoding else 'utf-8'))
+
+    def __add_content(self, arcname: Union[str, PathLike, bytes], data: bytes) -> None:
+        """ Add a file compressing its content if its name ends with '.gz' or '.tgz'.
+
+        :param arcname: The path inside of the tar file.
+        :param data: The file content.
+        """
+        if str(arcname).lower().endswith('.gz') or str(arcname).lower().endswith('.tgz'):
+            data = gzip.compress(data)
+        self.add_bytes(arcname, data)
+
+    def close(self) -> None:
+        """ Write the end of the tar archive and close the file. """
+        with self.__closing:
+            self.__tar.close()
+
+    def __enter__(self) -> 'TarWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+class TarIndex(object):
+    """ A random-access index of the members of a tar archive.
+
+    It stores the position and size of each member inside the uncompressed tar stream, therefore a member can be read
+      without scanning the archive from the beginning. For gzip archives, it also keeps inflate checkpoints every
+      span bytes of uncompressed data, like zlib's zran example, thus only the data between the nearest checkpoint and
+      the member is decompressed. The gzip member boundaries are also checkpoints and, unlike the rest, they are stored
+      in the sidecar file, so multi-member gzip archives can be read in near-constant time from a cold start.
+      Single-member gzip archives loaded from the sidecar recover their checkpoints the first time they are read.
+    The index is thread-safe and can be reused across reads.
+    """
+
+    @property
+    def tar_file(self) -> Union[str, PathLike, bytes]:
+        """
+        :return: The path to the indexed tar file.
+        """
+        return self.__tar_file
+
+    @property
+    def compress_method(self) -> str:
+        """
+        :return: The compression method of the tar file.
+        """
+        return self.__compress_method
+
+    @property
+    def index_file(self) -> Union[str, PathLike, bytes]:
+        """
+        :return: The path to the sidecar index file.
+        """
+        return self.__index_file
+
+    def __init__(self, tar_file: Union[str, PathLike, bytes], compress_method: str = None,
+                 index_file: Union[str, PathLike, bytes] = None, sidecar: bool = True,
+                 span: int = INDEX_SPAN) -> None:
+        """ Load the index from its sidecar file or, if it does not exist or it is outdated, build it.
+
+        :param tar_file: The path to the tar file.
+        :param compress_method: Force the compression or decompression method to use.
+           By default, select from the file extension.
+        :param index_file: The path to the sidecar index file. By default, the tar file path with the suffix '.idx',
+           or None if the tar file is an URL.
+        :param sidecar: If True, load the index from the sidecar file and save it there when it is built.
+           It is ignored if there is no index file.
+        :param span: The distance in bytes of uncompressed data between two gzip checkpoints.
+        """
+        self.__tar_file = tar_file
+        self.__compress_method = compress_method if compress_method else detect_compress_method(tar_file)
+        self.__index_file = index_file if index_file else None if _is_url(tar_file) else f'{tar_file}.idx'
+        self.__span = span
+        self.__lock = threading.Lock()
+        self.__members = {}
+        self.__checkpoints = [(0, 0, None)]
+        self.__offsets = [0]
+        sidecar = sidecar and self.__index_file is not None
+        if not (sidecar and self.__load()):
+            self.__build()
+            if sidecar:
+                self.save()
+
+    def __stamp(self) -> tuple:
+        """
+        :return: The values to check if the sidecar index file is up to date.
+        """
+        return (_INDEX_VERSION, *_file_stamp(self.__tar_file)[:2], self.__compress_method)
+
+    def __load(self) -> bool:
+        """ Load the index from the sidecar file.
+
+        :return: True if the sidecar file exists and it is up to date, otherwise False.
+        """
+        data = load_pickle(self.__index_file, default={})
+        if data.get('stamp') != self.__stamp():
             return False
-    return True
+        self.__members = data['members']
+        self.__checkpoints = [(uncompressed, compressed, None) for uncompressed, compressed in data['checkpoints']]
+        self.__offsets = [checkpoint[0] for checkpoint in self.__checkpoints]
+        return True
+
+    def save(self) -> None:
+        """ Save the index into its sidecar file. Only the gzip member boundaries are stored as checkpoints. """
+        if self.__index_file is None:
+            raise ValueError(f'There is no index file to save the index of "{self.__tar_file}".')
+        with self.__lock:
+            checkpoints = [(uncompressed, compressed) for uncompressed, compressed, state in self.__checkpoints
+                           if state is None]
+        try:
+            save_pickle({'stamp': self.__stamp(), 'members': self.__members, 'checkpoints': checkpoints},
+                        self.__index_file)
+        except OSError as e:
+            logger.warning(f'The index of "{self.__tar_file}" cannot be saved in "{self.__index_file}": {e}')
+
+    def __build(self) -> None:
+        """ Build the index scanning the whole tar archive once. """
+        if self.__compress_method == 'gz':
+            with _open_binary(self.__tar_file) as file:
+                with tarfile.open(fileobj=_ChunkReader(self.__gzip_chunks(file, self.__checkpoints[0])), mode='r|') as tar:
+                    self.__members = {member.path: member for member in tar}
+        else:
+            self.__members = dict(_tar_listing(self.__tar_file, self.__compress_method).names)
+
+    def __gzip_chunks(self, file: IO, checkpoint: Tuple[int, int, Any]) -> Iterator[bytes]:
+        """ Decompress a gzip archive from a checkpoint and add new checkpoints while the data is decompressed.
+
+        :param file: The opened archive.
+        :param checkpoint: The checkpoint to start from: the uncompressed and compressed positions, and the state.
+           It is a tuple and not an index because other threads can insert checkpoints meanwhile.
+        :return: An iterator of uncompressed chunks.
+        """
+        uncompressed, compressed, state = checkpoint
+        for data, position, decompressor in _gzip_chunks(file, compressed, state):
+            uncompressed += len(data)
+            self.__add_checkpoint(uncompressed, position, decompressor)
+            yield data
+
+    def __add_checkpoint(self, uncompressed: int, compressed: int, decompressor: Any) -> None:
+        """ Add a checkpoint if it does not exist yet.
+          The gzip member boundaries are always added, the rest only if they are a span away from the previous one.
+
+        :param uncompressed: The position in the uncompressed stream.
+        :param compressed: The position in the compressed file.
+        :param decompressor: The state of the decompressor in that position or None for a gzip member boundary.
+        """
+        with self.__lock:
+            i = bisect_right(self.__offsets, uncompressed)
+            previous = self.__offsets[i - 1]
+            if uncompressed > previous and (decompressor is None or uncompressed - previous >= self.__span):
+                self.__checkpoints.insert(i, (uncompressed, compressed, decompressor.copy() if decompressor else None))
+                self.__offsets.insert(i, uncompressed)
+
+    def __contains__(self, filename: Union[str, PathLike, bytes]) -> bool:
+        """ Check if a file is in the tar archive.
+
+        :param filename: The path inside of the tar.
+        :return: True if the file is in the tar archive, otherwise False.
+        """
+        return str(filename) in self.__members
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        :return: An iterator of the member paths.
+        """
+        return iter(self.__members)
+
+    def __len__(self) -> int:
+        """
+        :return: The number of members.
+        """
+        return len(self.__members)
+
+    def members(self) -> List[TarInfo]:
+        """
+        :return: A list of TarInfo instances with the information of each member.
+        """
+        return list(self.__members.values())
+
+    def member(self, filename: Union[str, PathLike, bytes]) -> TarInfo:
+        """ Get the information of a member.
+
+        :param filename: The path inside of the tar.
+        :return: The TarInfo of the member.
+        """
+        try:
+            return self.__members[str(filename)]
+        except KeyError:
+            raise FileNotFoundError(f'The file "{filename}" is not in "{self.__tar_file}".')
+
+    def read(self, filename: Union[str, PathLike, bytes]) -> bytes:
+        """ Read the content of a file inside of the tar archive.
+
+        :param filename: The path inside of the tar.
+        :return: The file content.
+        """
+        member = self.member(filename)
+        while member.issym() or member.islnk():
+            target = member.linkname if member.islnk() else normpath(join(dirname(member.path), member.linkname))
+            member = self.member(target)
+        if not member.isfile():
+            raise IsADirectoryError(f'The path "{filename}" is not a file in "{self.__tar_file}".')
+        if self.__compress_method == 'gz':
+            return self.__read_gzip(member.offset_data, member.size)
+        opener = _COMPRESS_OPENERS.get(self.__compress_method)
+        with _open_binary(self.__tar_file) as raw, opener(raw, 'rb') if opener else nullcontext(raw) as file:
+            # The compressed files are sought by decompressing the previous data, but without parsing the headers
+            file.seek(member.offset_data)
+            return file.read(member.size)
+
+    def __read_gzip(self, offset: int, size: int) -> bytes:
+        """ Read a fragment of the uncompressed stream of a gzip archive starting from the nearest checkpoint.
+
+        :param offset: The position in the uncompressed stream.
+        :param size: The number of bytes to read.
+        :return: The read bytes.
+        """
+        with self.__lock:
+            checkpoint = self.__checkpoints[bisect_right(self.__offsets, offset) - 1]
+        position = checkpoint[0]
+        parts = []
+        with _open_binary(self.__tar_file) as file:
+            for chunk in self.__gzip_chunks(file, checkpoint):
+                if position + len(chunk) > offset:
+                    parts.append(chunk[max(0, offset - position):offset + size - position])
+                position += len(chunk)
+                if position >= offset + size:
+                    break
+        return b''.join(parts)
+
+    def open(self, filename: Union[str, PathLike, bytes]) -> IO:
+        """ Open a file inside of the tar archive.
+
+        :param filename: The path inside of the tar.
+        :return: An in-memory binary stream with the file content.
+        """
+        return BytesIO(self.read(filename))
+
+
+def _gzip_chunks(file: IO, offset: int = 0, state: Any = None) -> Iterator[Tuple[bytes, int, Any]]:
+    """ Decompress a gzip file, even with several gzip members, from a position and a decompressor state.
+
+    :param file: The opened gzip file.
+    :param offset: The position in the compressed file to start from.
+    :param state: The zlib decompressor state in that position or None if a gzip member starts there.
+    :return: An iterator of tuples with an uncompressed chunk, the position in the compressed file after that chunk,
+      and the decompressor state in that position or None if a new gzip member starts there.
+    """
+    decompressor = state.copy() if state else zlib.decompressobj(31)
+    fresh = state is None
+    file.seek(offset)
+    position, unused = offset, b''
+    while True:
+        chunk = unused if unused else file.read(_CHUNK_SIZE)
+        if not chunk:
+            return
+        position += 0 if unused else len(chunk)
+        # Ignore the padding zeros between gzip members
+        chunk = chunk.lstrip(b'\x00') if fresh else chunk
+        if not chunk:
+            unused = b''
+            continue
+        data = decompressor.decompress(chunk)
+        fresh = decompressor.eof
+        if decompressor.eof:
+            unused = decompressor.unused_data
+            yield data, position - len(unused), None
+            decompressor = zlib.decompressobj(31)
+        else:
+            unused = b''
+            yield data, position, decompressor
+
+
+class _ParallelCompressor(object):
+    """ A binary writer which compresses the data in independent blocks using a thread pool.
+      The compressed blocks are written in order and the number of pending blocks is bounded.
+    """
+
+    def __init__(self, file: IO, compress: Callable[[bytes], bytes], workers: int, block_size: int) -> None:
+        """ Constructor.
+
+        :param file: The binary file where the compressed blocks are written.
+        :param compress: The function to compress a block.
+        :param workers: The number of threads.
+        :param block_size: The size in bytes of the uncompressed blocks.
+        """
+        self.__file = file
+        self.__compress = compress
+        self.__block_size = block_size
+        self.__max_pending = 2 * workers
+        self.__executor = ThreadPoolExecutor(max_workers=workers)
+        self.__pending = deque()
+        self.__buffer = bytearray()
+        self.__position = 0
+
+    def write(self, data: bytes) -> int:
+        """ Write data. It is compressed when a whole block is available.
+
+        :param data: The data to write.
+        :return: The number of written bytes.
+        """
+        self.__buffer += data
+        self.__position += len(data)
+        while len(self.__buffer) >= self.__block_size:
+            self.__submit(bytes(self.__buffer[:self.__block_size]))
+            del self.__buffer[:self.__block_size]
+        return len(data)
+
+    def tell(self) -> int:
+        """
+        :return: The number of uncompressed bytes written.
+        """
+        return self.__position
+
+    def __submit(self, block: bytes) -> None:
+        """ Compress a block in the thread pool and write the finished blocks if there are too many pending.
+
+        :param block: The uncompressed block.
+        """
+        self.__pending.append(self.__executor.submit(self.__compress, block))
+        while len(self.__pending) > self.__max_pending:
+            self.__file.write(self.__pending.popleft().result())
+
+    def close(self) -> None:
+        """ Compress the last block and write all the pending ones. """
+        if self.__buffer:
+            self.__submit(bytes(self.__buffer))
+            self.__buffer.clear()
+        while self.__pending:
+            self.__file.write(self.__pending.popleft().result())
+        self.__executor.shutdown()
+
+    def __enter__(self) -> '_ParallelCompressor':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+class _ParallelExtractor(object):
+    """ Extract tar members writing their content with a thread pool.
+      The calling thread reads the archive and the memory used by the contents pending to be written is bounded.
+    """
+
+    def __init__(self, dest: Union[str, PathLike, bytes], workers: int, max_in_flight: int) -> None:
+        """ Constructor.
+
+        :param dest: The destination folder.
+        :param workers: The number of threads.
+        :param max_in_flight: The maximum size in bytes of the file contents waiting to be written.
+        """
+        self.__dest = dest
+        self.__max_in_flight = max_in_flight
+        self.__executor = ThreadPoolExecutor(max_workers=workers)
+        self.__pending = deque()
+        # The last pending write of each path, because an archive can have several copies of the same file
+        self.__writes = {}
+        self.__in_flight = 0
+        self.__condition = threading.Condition()
+        self.__folders = set()
+
+    def __call__(self, tar: tarfile.TarFile, member: TarInfo) -> None:
+        """ Extract a member of an opened tar archive.
+          The regular files which fit in memory are written by the thread pool, the rest of members are extracted
+          by the calling thread once all the pending files are written, because they could depend on them.
+          If the same path is written again, the previous write finishes first, thus the last copy remains.
+
+        :param tar: The opened tar archive.
+        :param member: The member to extract.
+        """
+        if member.isfile() and member.size <= self.__max_in_flight:
+            path, size = _member_path(member, self.__dest), member.size
+            # The size is reserved before reading the content, so the memory never exceeds max_in_flight
+            with self.__condition:
+                self.__condition.wait_for(lambda: self.__in_flight + size <= self.__max_in_flight)
+                self.__in_flight += size
+            try:
+                with tar.extractfile(member) as reader:
+                    data = reader.read()
+                previous = self.__writes.get(path)
+                if previous is not None:
+                    previous.result()
+            except BaseException:
+                self.__release(size)
+                raise
+            self.__writes[path] = self.__executor.submit(self.__write, path, data, size)
+            self.__pending.append((path, self.__writes[path]))
+            while self.__pending and self.__pending[0][1].done():
+                self.__finish(*self.__pending.popleft())
+        elif member.isdir():
+            self.__makedirs(_member_path(member, self.__dest))
+        else:
+            self.wait()
+            _extract_member(tar, member, self.__dest)
+
+    def __write(self, path: str, data: bytes, size: int) -> None:
+        """ Write a file creating its folder if it does not exist.
+
+        :param path: The file path.
+        :param data: The file content.
+        :param size: The reserved bytes to release when the file is written.
+        """
+        try:
+            if dirname(path):
+                self.__makedirs(dirname(path))
+            with open(path, 'wb') as file:
+                file.write(data)
+        finally:
+            self.__release(size)
+
+    def __release(self, size: int) -> None:
+        """ Release the memory reserved for a file content.
+
+        :param size: The reserved bytes.
+        """
+        with self.__condition:
+            self.__in_flight -= size
+            self.__condition.notify_all()
+
+    def __makedirs(self, folder: str) -> None:
+        """ Create a folder if it was not created yet.
+
+        :param folder: The folder path.
+        """
+        if folder not in self.__folders:
+            makedirs(folder, exist_ok=True)
+            self.__folders.add(folder)
+
+    def __finish(self, path: str, future: Future) -> None:
+        """ Wait until a pending file is written.
+
+        :param path: The file path.
+        :param future: The future of the write.
+        :raises Exception: The error raised while writing the file.
+        """
+        if self.__writes.get(path) is future:
+            del self.__writes[path]
+        future.result()
+
+    def wait(self) -> None:
+        """ Wait until all the pending files are written.
+
+        :raises Exception: The first error raised while writing a file.
+        """
+        while self.__pending:
+            self.__finish(*self.__pending.popleft())
+
+    def close(self) -> None:
+        """ Wait until all the pending files are written and stop the threads. """
+        try:
+            self.wait()
+        finally:
+            self.__executor.shutdown()
+
+    def __enter__(self) -> '_ParallelExtractor':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            # Do not hide the original error with the writing ones
+            for _, future in self.__pending:
+                future.cancel()
+            self.__executor.shutdown()
+
+
+class _ChunkReader(object):
+    """ A minimal binary reader over an iterator of bytes. """
+
+    def __init__(self, chunks: Iterator[bytes]) -> None:
+        """ Constructor.
+
+        :param chunks: The iterator of bytes.
+        """
+        self.__chunks = chunks
+        self.__buffer = bytearray()
+
+    def read(self, size: int = -1) -> bytes:
+        """ Read bytes.
+
+        :param size: The maximum number of bytes to read. If it is negative, read until the end.
+        :return: The read bytes.
+        """
+        while size < 0 or len(self.__buffer) < size:
+            chunk = next(self.__chunks, None)
+            if chunk is None:
+                break
+            self.__buffer += chunk
+        size = len(self.__buffer) if size < 0 else size
+        data = bytes(self.__buffer[:size])
+        del self.__buffer[:size]
+        return data
@@ -1,5 +1,13 @@
-from os import PathLike
-from typing import Union
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import RawIOBase, BufferedReader, SEEK_SET, SEEK_CUR, SEEK_END
+from itertools import zip_longest
+from os import PathLike, fsdecode, makedirs, remove, replace
+from os.path import exists, getsize, dirname
+from typing import Union, Dict, Optional, List, IO, Any, Tuple
+from urllib.parse import urlparse
 
 from tqdm.auto import tqdm
 
@@ -9,6 +17,16 @@ except ModuleNotFoundError as e:
     raise ModuleNotFoundError('ModuleNotFoundError: No module named \'requests\'. '
                               'Please install it with the command:\n\n'
                               'pip install requests~=2.25.1')
+from requests.adapters import HTTPAdapter
+
+# Default size in bytes of the blocks requested by open_url()
+RANGE_BLOCK_SIZE = 16 * 1024
+# Default number of blocks cached by open_url()
+RANGE_CACHE_BLOCKS = 64
+
+from mysutils.collections import LRUDict
+from mysutils.hash import _hash_file
+from mysutils.request import retry_get, retry_head
 
 
 def download(url: str, filename: Union[str, PathLike, bytes], verbose: bool = True) -> None:
@@ -26,3 +44,305 @@ def download(url: str, filename: Union[str, PathLike, bytes], verbose: bool = Tr
                 for chunk in reader.iter_content(chunk_size=8192):
                     t.update(len(chunk))
                     writer.write(chunk)
+
+
+class DownloadError(Exception):
+    """ The error raised by download_many() when some files cannot be downloaded. """
+
+    @property
+    def errors(self) -> Dict[str, Exception]:
+        """
+        :return: The error of each URL which could not be downloaded.
+        """
+        return self._errors
+
+    @property
+    def files(self) -> List[str]:
+        """
+        :return: The files which were downloaded, excluding the skipped ones.
+        """
+        return self._files
+
+    def __init__(self, errors: Dict[str, Exception], files: List[str]) -> None:
+        super().__init__(f'{len(errors)} files cannot be downloaded: ' +
+                         ', '.join(f'{url} ({error})' for url, error in errors.items()))
+        self._errors = errors
+        self._files = files
+
+
+def download_many(urls_to_paths: Dict[str, Union[str, PathLike, bytes]],
+                  max_workers: int = 8,
+                  per_host_limit: int = 2,
+                  verbose: bool = True,
+                  sizes: Optional[Dict[str, int]] = None,
+                  digests: Optional[Dict[str, str]] = None,
+                  digest_method: str = 'sha256',
+                  num_tries: int = 5,
+                  wait_time: float = 30,
+                  statuses=(429, 500, 502, 503, 504),
+                  chunk_size: int = 65536) -> List[str]:
+    """ Download several files concurrently sharing a connection pool.
+
+    The files are downloaded by a pool of threads, but never more than per_host_limit at the same time from the same
+      host. If a file already exists and its size or digest is the expected one, it is not downloaded again. If neither
+      sizes nor digests are given, the expected size is obtained from the Content-Length header of a HEAD request.
+      Each file is written to a temporal ".part" file and renamed when it is complete and, if it is given, its digest
+      or size is the expected one. Otherwise, the ".part" file is removed.
+      If any file cannot be downloaded, the rest of them are downloaded anyway and then a DownloadError is raised with
+      the error of each failed URL.
+
+    :param urls_to_paths: A dictionary with the URLs to download and the file path where each one should be stored.
+    :param max_workers: The maximum number of simultaneous downloads.
+    :param per_host_limit: The maximum number of simultaneous downloads from the same host.
+    :param verbose: True, if an aggregated progress bar is shown. Otherwise, False.
+    :param sizes: Optionally, a dictionary with the expected size in bytes of each URL.
+    :param digests: Optionally, a dictionary with the expected hexadecimal digest of each URL.
+    :param digest_method: The hashlib algorithm name used to check the digests.
+    :param num_tries: The number of tries for each request. 0, forever.
+    :param wait_time: Time to wait between tries.
+    :param statuses: A list of response statuses that force the repetition.
+    :param chunk_size: The size of the chunks to read from the responses.
+    :return: The list of downloaded file paths, excluding the skipped ones.
+    :raises DownloadError: If any file cannot be downloaded or it is not the expected one.
+    """
+    sizes, digests = sizes or {}, digests or {}
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    host_locks = {host: threading.BoundedSemaphore(per_host_limit) for host in _hosts(urls_to_paths)}
+    progress_lock = threading.Lock()
+
+    with tqdm(desc='Downloading files', total=0, unit='B', unit_scale=True, disable=not verbose) as t:
+        def download_one(url: str) -> Optional[str]:
+            filename = urls_to_paths[url]
+            with host_locks[urlparse(url).netloc]:
+                if exists(filename) and _is_downloaded(session, url, filename, sizes.get(url), digests.get(url),
+                                                       digest_method, num_tries, wait_time):
+                    return None
+                if dirname(filename) and not exists(dirname(filename)):
+                    makedirs(dirname(filename), exist_ok=True)
+                part_file = fsdecode(filename) + '.part'
+                digest = hashlib.new(digest_method) if url in digests else None
+                size = 0
+                try:
+                    with retry_get(url, stream=True, session=session, num_tries=num_tries,
+                                   wait_time=wait_time, statuses=statuses) as reader:
+                        reader.raise_for_status()
+                        with progress_lock:
+                            t.total += int(reader.headers.get('content-length', 0))
+                            t.refresh()
+                        with open(part_file, 'wb') as writer:
+                            for chunk in reader.iter_content(chunk_size=chunk_size):
+                                writer.write(chunk)
+                                size += len(chunk)
+                                if digest is not None:
+                                    digest.update(chunk)
+                                with progress_lock:
+                                    t.update(len(chunk))
+                    if digest is not None and digest.hexdigest() != digests[url].lower():
+                        raise ValueError(f'The {digest_method} digest of the file downloaded from "{url}" is '
+                                         f'{digest.hexdigest()} instead of {digests[url].lower()}.')
+                    if digest is None and url in sizes and size != sizes[url]:
+                        raise ValueError(f'The size of the file downloaded from "{url}" is {size} bytes '
+                                         f'instead of {sizes[url]}.')
+                    replace(part_file, filename)
+                except BaseException:
+                    if exists(part_file):
+                        remove(part_file)
+                    raise
+            return filename
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {url: executor.submit(download_one, url) for url in _interleave_hosts(urls_to_paths)}
+        finally:
+            session.close()
+    files, errors = [], {}
+    for url, future in futures.items():
+        try:
+            file = future.result()
+        except Exception as e:
+            errors[url] = e
+        else:
+            if file is not None:
+                files.append(file)
+    if errors:
+        raise DownloadError(errors, files)
+    return files
+
+
+def _hosts(urls: Dict[str, Union[str, PathLike, bytes]]) -> Dict[str, List[str]]:
+    """ Group the URLs by host preserving their order.
+
+    :param urls: The URLs.
+    :return: A dictionary with the host as key and the list of its URLs as value.
+    """
+    hosts = OrderedDict()
+    for url in urls:
+        hosts.setdefault(urlparse(url).netloc, []).append(url)
+    return hosts
+
+
+def _interleave_hosts(urls: Dict[str, Union[str, PathLike, bytes]]) -> List[str]:
+    """ Sort the URLs in round-robin by host, to avoid that the workers block waiting for the same host.
+
+    :param urls: The URLs.
+    :return: The interleaved list of URLs.
+    """
+    return [url for group in zip_longest(*_hosts(urls).values()) for url in group if url is not None]
+
+
+def _is_downloaded(session: requests.Session, url: str, filename: Union[str, PathLike, bytes],
+                   size: Optional[int], digest: Optional[str], digest_method: str,
+                   num_tries: int, wait_time: float) -> bool:
+    """ Check if a file was already downloaded.
+
+    :param session: The session of the requests.
+    :param url: The URL of the file.
+    :param filename: The local file path.
+    :param size: The expected size or None if it is unknown.
+    :param digest: The expected hexadecimal digest or None if it is unknown.
+    :param digest_method: The hashlib algorithm name.
+    :param num_tries: The number of tries for the HEAD request.
+    :param wait_time: Time to wait between tries.
+    :return: True if the local file is the same as the remote one, otherwise False.
+    """
+    if digest is not None:
+        return _hash_file(filename, method=lambda: hashlib.new(digest_method)) == digest.lower()
+    if size is None:
+        response = retry_head(url, session=session, num_tries=num_tries, wait_time=wait_time, allow_redirects=True)
+        if not response.ok or 'content-length' not in response.headers:
+            return False
+        size = int(response.headers['content-length'])
+    return getsize(filename) == size
+
+
+def open_url(url: str, block_size: int = RANGE_BLOCK_SIZE, cache_blocks: int = RANGE_CACHE_BLOCKS,
+             num_tries: int = 5, wait_time: float = 30) -> IO:
+    """ Open a remote file as a seekable binary stream which only downloads the read fragments by HTTP Range requests.
+      The file is requested in blocks and the last used ones are cached.
+
+    :param url: The URL of the file. Its server must support Range requests.
+    :param block_size: The size in bytes of the requested blocks.
+    :param cache_blocks: The maximum number of cached blocks.
+    :param num_tries: The number of tries for each request. 0, forever.
+    :param wait_time: Time to wait between tries.
+    :return: A buffered binary reader.
+    """
+    return BufferedReader(_RangeReader(url, block_size, cache_blocks, num_tries, wait_time))
+
+
+def url_stamp(url: str, num_tries: int = 5, wait_time: float = 30) -> Tuple[int, Optional[str], Optional[str]]:
+    """ Obtain the values to check if a remote file has changed with a HEAD request.
+
+    :param url: The URL of the file.
+    :param num_tries: The number of tries. 0, forever.
+    :param wait_time: Time to wait between tries.
+    :return: A tuple with the size of the file, its Last-Modified header and its ETag header.
+    """
+    response = retry_head(url, num_tries=num_tries, wait_time=wait_time, allow_redirects=True)
+    response.raise_for_status()
+    return int(response.headers.get('content-length', -1)), \
+        response.headers.get('last-modified'), response.headers.get('etag')
+
+
+class _RangeReader(RawIOBase):
+    """ A seekable raw binary stream of a remote file read by HTTP Range requests. """
+
+    def __init__(self, url: str, block_size: int, cache_blocks: int, num_tries: int, wait_time: float) -> None:
+        """ Constructor.
+
+        :param url: The URL of the file.
+        :param block_size: The size in bytes of the requested blocks.
+        :param cache_blocks: The maximum number of cached blocks.
+        :param num_tries: The number of tries for each request. 0, forever.
+        :param wait_time: Time to wait between tries.
+        """
+        super().__init__()
+        self.__url = url
+        self.__block_size = block_size
+        self.__num_tries = num_tries
+        self.__wait_time = wait_time
+        self.__session = requests.Session()
+        self.__blocks = LRUDict(max(cache_blocks, 1))
+        self.__position = 0
+        response = retry_head(url, session=self.__session, num_tries=num_tries, wait_time=wait_time,
+                              allow_redirects=True)
+        response.raise_for_status()
+        if 'content-length' not in response.headers:
+            raise OSError(f'The size of "{url}" is unknown because the server does not return its Content-Length.')
+        self.__size = int(response.headers['content-length'])
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.__position
+
+    def seek(self, offset: int, whence: int = SEEK_SET) -> int:
+        if whence == SEEK_CUR:
+            offset += self.__position
+        elif whence == SEEK_END:
+            offset += self.__size
+        if offset < 0:
+            raise ValueError(f'Negative seek position {offset}')
+        self.__position = offset
+        return self.__position
+
+    def readinto(self, buffer: Any) -> int:
+        size = min(len(buffer), self.__size - self.__position)
+        if size <= 0:
+            return 0
+        first, last = self.__position // self.__block_size, (self.__position + size - 1) // self.__block_size
+        data = b''.join(self.__read_blocks(first, last))
+        start = self.__position - first * self.__block_size
+        buffer[:size] = data[start:start + size]
+        self.__position += size
+        return size
+
+    def __read_blocks(self, first: int, last: int) -> List[bytes]:
+        """ Obtain a sequence of blocks from the cache or, if they are not cached,
+          requesting each run of consecutive missing blocks at once.
+
+        :param first: The index of the first block.
+        :param last: The index of the last block.
+        :return: The list of blocks.
+        """
+        blocks = {i: self.__blocks[i] for i in range(first, last + 1) if i in self.__blocks}
+        start = first
+        while start <= last:
+            if start in blocks:
+                start += 1
+                continue
+            end = start
+            while end + 1 <= last and end + 1 not in blocks:
+                end += 1
+            data = self.__request(start * self.__block_size, min((end + 1) * self.__block_size, self.__size) - 1)
+            for i in range(start, end + 1):
+                blocks[i] = self.__blocks[i] = data[(i - start) * self.__block_size:(i - start + 1) * self.__block_size]
+            start = end + 1
+        return [blocks[i] for i in range(first, last + 1)]
+
+    def __request(self, start: int, end: int) -> bytes:
+        """ Request a byte range.
+
+        :param start: The position of the first byte.
+        :param end: The position of the last byte, included.
+        :return: The content of the range.
+        """
+        response = retry_get(self.__url, session=self.__session, headers={'Range': f'bytes={start}-{end}'},
+                             num_tries=self.__num_tries, wait_time=self.__wait_time)
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise OSError(f'The server of "{self.__url}" does not support Range requests.')
+        return response.content
+
+    def close(self) -> None:
+        if not self.closed:
+            self.__session.close()
+            self.__blocks.clear()
+        super().close()
@@ -2,9 +2,9 @@ import gzip
 from collections import OrderedDict
 from collections.abc import Hashable
 from os import PathLike
-from typing import Union, Dict, Any, Optional
+from typing import Union, Dict, Any, Optional, TextIO
 
-from mysutils.tar import open_tar_file
+from mysutils.tar import open_tar_file, TarIndex
 from mysutils.file import open_file, force_open
 
 try:
@@ -24,10 +24,22 @@ def save_yaml(data: Union[Dict[Hashable, Any], list, None],
     :param force: Force the creation of the path folders if they do not exist.
     :param encoding: The file encoding. By default, the system default encoding is used.
     """
-    add_representer(OrderedDict, representer=lambda self, d: self.represent_mapping('tag:yaml.org,2002:map', d.items()))
     open_func = force_open if force else open_file
     with open_func(filename, 'wt', encoding=encoding) as file:
-        dump(data, file, default_flow_style=False, allow_unicode=encoding is not None)
+        _dump_yaml(data, file, encoding)
+
+
+def _dump_yaml(data: Union[Dict[Hashable, Any], list, None],
+               stream: Optional[TextIO] = None,
+               encoding: Optional[str] = None) -> Optional[str]:
+    """ Serialize an object as YAML preserving the dictionary order.
+    :param data: The data to serialize.
+    :param stream: The text stream to write. If it is None, the YAML text is returned.
+    :param encoding: The encoding of the output. If it is None, only ASCII characters are used.
+    :return: The YAML text if stream is None.
+    """
+    add_representer(OrderedDict, representer=lambda self, d: self.represent_mapping('tag:yaml.org,2002:map', d.items()))
+    return dump(data, stream, default_flow_style=False, allow_unicode=encoding is not None)
 
 
 def load_yaml(filename: Union[str, PathLike, bytes],
@@ -51,20 +63,22 @@ def load_yaml(filename: Union[str, PathLike, bytes],
 def load_tar_yaml(tar_file: Union[str, PathLike, bytes],
                   filename: Union[str, PathLike, bytes],
                   encoding: Optional[str] = None,
-                  default: Any = None) -> Any:
+                  default: Any = None,
+                  index: TarIndex = None) -> Any:
     """ Load an object from a YAML file stored in a tar file.
 
     :param tar_file: The path to the tar file-.
     :param filename: The path inside of the tar to the file to extract.
     :param encoding: The file encoding. By default, the system default encoding is used.
     :param default: The default value if the file does not exist.
+    :param index: Optionally, a TarIndex of the tar file to read the file without scanning the archive.
     :return: The loaded object.
     """
     try:
-        with open_tar_file(tar_file, filename) as file:
+        with open_tar_file(tar_file, filename, index=index) as file:
             if str(filename).lower().endswith('.gz') or str(filename).lower().endswith('.tgz'):
-                return load(gzip.open(file, encoding=encoding))
-            return load(file)
+                return load(gzip.open(file, 'rt', encoding=encoding), SafeLoader)
+            return load(file, SafeLoader)
     except FileNotFoundError as e:
         if default:
             return default
@@ -1,11 +1,25 @@
+import sys
+import threading
 import unittest
+from time import sleep
+from multiprocessing import Pool
 
 from mysutils.collections import (
     dh, sh, head, del_keys, filter_lst, add_keys, mod_key, mod_keys, mod_value, mod_values, merge_tuples, merge_dicts,
     first_key_value, first_item, last_item, item, first_key, last_key, key, first_value, last_value, value,
-    concat_lists, LRUDict
+    concat_lists, LRUDict, ConcurrentLRUDict, EvictionMode, TwoQueueDict, ARCDict, TinyLFUDict, replay_trace,
+    compare_policies, TieredLRUDict, SharedLRUDict, BloomFilter, RotatingBloomFilter
 )
 from mysutils.collections import list_union
+from mysutils.file import list_dir
+from mysutils.tmp import removable_tmp
+
+
+def _fill_shared_dict(filename: str, start: int) -> int:
+    with SharedLRUDict(filename, max_size=100) as shared_dict:
+        for i in range(start, start + 80):
+            shared_dict[i] = i
+        return len(shared_dict)
 
 
 class MyTestCase(unittest.TestCase):
@@ -229,6 +243,345 @@ class MyTestCase(unittest.TestCase):
 
         self.assertEqual(list(lru_dict.items()), [('b', 2), ('c', 3), ('d', 4)])
 
+    def test_lru_dict_weight(self):
+        evicted = []
+        lru_dict = LRUDict(max_weight=10, weigher=len, on_evict=lambda key, value: evicted.append(key))
+        lru_dict['a'] = 'aaaa'
+        lru_dict['b'] = 'bbbb'
+        self.assertEqual(lru_dict.weight, 8)
+        _ = lru_dict['a']
+        lru_dict['c'] = 'ccc'
+        self.assertEqual(list(lru_dict.items()), [('a', 'aaaa'), ('c', 'ccc')])
+        self.assertEqual(lru_dict.weight, 7)
+        self.assertListEqual(evicted, ['b'])
+        # Replace a value with a heavier one
+        lru_dict['c'] = 'cccccc'
+        self.assertEqual(list(lru_dict.items()), [('a', 'aaaa'), ('c', 'cccccc')])
+        self.assertEqual(lru_dict.weight, 10)
+        # A value heavier than the maximum weight is also evicted
+        lru_dict['d'] = 'd' * 11
+        self.assertEqual(len(lru_dict), 0)
+        self.assertEqual(lru_dict.weight, 0)
+        self.assertListEqual(evicted, ['b', 'a', 'c', 'd'])
+        # The explicit deletions are not evictions
+        lru_dict.update({'e': 'ee', 'f': 'ff', 'g': 'gg'})
+        del lru_dict['e']
+        self.assertEqual(lru_dict.pop('f'), 'ff')
+        self.assertEqual(lru_dict.popitem(), ('g', 'gg'))
+        self.assertEqual(lru_dict.weight, 0)
+        self.assertListEqual(evicted, ['b', 'a', 'c', 'd'])
+        # Both limits at the same time
+        lru_dict = LRUDict(max_size=2, max_weight=100, weigher=len, on_evict=lambda key, value: evicted.append(key))
+        lru_dict.update({'x': 'x', 'y': 'y', 'z': 'z'})
+        self.assertListEqual(list(lru_dict), ['y', 'z'])
+        self.assertEqual(lru_dict.weight, 2)
+        self.assertEqual(evicted[-1], 'x')
+        with self.assertRaises(ValueError):
+            LRUDict(max_weight=-1)
+
+    def test_concurrent_lru_dict(self):
+        for mode in EvictionMode:
+            lru_dict = ConcurrentLRUDict(max_size=3, shards=1, mode=mode)
+            lru_dict['a'] = 1
+            lru_dict['b'] = 2
+            lru_dict['c'] = 3
+            self.assertEqual(lru_dict['a'], 1)
+            lru_dict['d'] = 4
+            # 'a' was used after 'b', therefore 'b' is removed
+            self.assertSetEqual(set(lru_dict.items()), {('a', 1), ('c', 3), ('d', 4)})
+            self.assertIsNone(lru_dict.get('b'))
+            with self.assertRaises(KeyError):
+                _ = lru_dict['b']
+            del lru_dict['c']
+            lru_dict['e'] = 5
+            self.assertSetEqual(set(lru_dict.keys()), {'a', 'd', 'e'})
+            self.assertEqual(len(lru_dict), 3)
+            lru_dict.clear()
+            self.assertEqual(len(lru_dict), 0)
+            with self.assertRaises(ValueError):
+                ConcurrentLRUDict(-1, mode=mode)
+
+    def test_concurrent_lru_dict_capacity(self):
+        for mode in EvictionMode:
+            for max_size in 1, 4, 100, 1000:
+                lru_dict = ConcurrentLRUDict(max_size=max_size, shards=16, mode=mode)
+                for i in range(5000):
+                    lru_dict[i] = i
+                    self.assertLessEqual(len(lru_dict), max_size)
+                # With these keys, all the shards are filled
+                self.assertEqual(len(lru_dict), max_size)
+
+    def test_concurrent_lru_dict_threads(self):
+        for mode in EvictionMode:
+            lru_dict = ConcurrentLRUDict(max_size=1000, shards=8, mode=mode)
+
+            def work(start: int) -> None:
+                for i in range(start, start + 5000):
+                    lru_dict[i % 2000] = i % 2000
+                    value = lru_dict.get((i * 7) % 2000)
+                    self.assertIn(value, (None, (i * 7) % 2000))
+
+            threads = [threading.Thread(target=work, args=(i * 100,)) for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertLessEqual(len(lru_dict), 1000)
+            self.assertTrue(all(lru_dict[key] == key for key in lru_dict))
+
+    def test_concurrent_lru_dict_atomic(self):
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-5)
+        try:
+            for mode in EvictionMode:
+                lru_dict = ConcurrentLRUDict(max_size=100, shards=4, mode=mode)
+                # Without limit, thus, the keys are not evicted and added again
+                defaults = ConcurrentLRUDict(shards=4, mode=mode)
+                errors, winners = [], []
+                barrier = threading.Barrier(8)
+
+                def work(n: int) -> None:
+                    barrier.wait()
+                    try:
+                        for i in range(2000):
+                            # Only one thread adds each value, the rest obtain it
+                            if defaults.setdefault(i, n) == n:
+                                winners.append(i)
+                            lru_dict[i % 10] = i
+                            lru_dict.pop(i % 10, None)
+                    except Exception as e:
+                        errors.append(e)
+
+                threads = [threading.Thread(target=work, args=(n,)) for n in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                self.assertListEqual(errors, [])
+                self.assertListEqual(sorted(winners), list(range(2000)))
+                self.assertLessEqual(len(lru_dict), 100)
+                self.assertEqual(lru_dict.pop('other', 1), 1)
+                with self.assertRaises(KeyError):
+                    lru_dict.pop('other')
+                while lru_dict:
+                    key, value = lru_dict.popitem()
+                    self.assertNotIn(key, lru_dict)
+                with self.assertRaises(KeyError):
+                    lru_dict.popitem()
+                # The released slots are reused
+                for i in range(200):
+                    lru_dict[i] = i
+                self.assertEqual(len(lru_dict), 100)
+        finally:
+            sys.setswitchinterval(interval)
+
+    def test_eviction_policies(self):
+        for policy in TwoQueueDict, ARCDict, TinyLFUDict:
+            evicted = []
+            cache = policy(max_size=100, on_evict=lambda k, v: evicted.append(k))
+            added = 0
+            for i in range(1000):
+                added += i % 300 not in cache
+                cache[i % 300] = i
+                self.assertLessEqual(len(cache), 100)
+            self.assertEqual(len(cache), 100)
+            self.assertEqual(len(evicted), added - 100)
+            self.assertTrue(all(cache[key] % 300 == key for key in cache))
+            del cache[next(iter(cache))]
+            self.assertEqual(len(cache), 99)
+            self.assertEqual(cache.pop('missing', None), None)
+            cache.clear()
+            self.assertEqual(len(cache), 0)
+            for i in range(200):
+                cache[i] = i
+            self.assertEqual(len(cache), 100)
+            weighed = policy(max_weight=10, weigher=len)
+            for i in range(20):
+                weighed[i] = 'abc'
+            self.assertLessEqual(weighed.weight, 10)
+            self.assertEqual(len(weighed), 3)
+
+    def test_scan_resistance(self):
+        hot = list(range(50))
+        for policy in TwoQueueDict, ARCDict, TinyLFUDict:
+            cache = policy(max_size=100)
+            # The hot keys are used frequently mixed with other keys used once
+            for i in range(20):
+                for key in hot + list(range(30 * i + 10000, 30 * i + 10030)):
+                    if key in cache:
+                        cache[key]
+                    else:
+                        cache[key] = key
+            for key in range(1000, 3000):
+                cache[key] = key
+            self.assertEqual(sum(key in cache for key in hot), 50, policy.__name__)
+        # A plain LRUDict loses the hot set
+        cache = LRUDict(max_size=100)
+        for key in hot + list(range(1000, 3000)):
+            cache[key] = key
+        self.assertEqual(sum(key in cache for key in hot), 0)
+
+    def test_replay_trace(self):
+        trace = [1, 2, 1, 3, 1, 2, 4]
+        result = replay_trace(LRUDict(max_size=2), trace)
+        self.assertEqual(result.hits, 2)
+        self.assertEqual(result.misses, 5)
+        self.assertAlmostEqual(result.hit_ratio, 2 / 7)
+        self.assertGreater(result.ops_per_second, 0)
+        results = compare_policies(trace * 10, 3)
+        self.assertListEqual(list(results), ['LRU', '2Q', 'ARC', 'W-TinyLFU'])
+        self.assertTrue(all(r.hits + r.misses == 70 for r in results.values()))
+        results = compare_policies(trace, 2, {'lru': LRUDict})
+        self.assertEqual(results['lru'], result._replace(ops_per_second=results['lru'].ops_per_second))
+
+    def test_tiered_lru_dict(self):
+        with removable_tmp(True) as folder:
+            cache = TieredLRUDict(folder, max_size=2, disk_max_size=3)
+            for i in range(5):
+                cache[i] = str(i)
+            self.assertListEqual(list(cache.memory), [3, 4])
+            self.assertEqual(len(cache), 5)
+            self.assertEqual(len(list_dir(folder)), 3)
+            self.assertGreater(cache.disk_bytes, 0)
+            # Promoted to memory
+            self.assertEqual(cache[0], '0')
+            self.assertListEqual(list(cache.memory), [4, 0])
+            self.assertEqual(len(list_dir(folder)), 3)
+            # The disk limit removes the oldest files
+            cache[5] = '5'
+            cache[6] = '6'
+            self.assertNotIn(1, cache)
+            self.assertNotIn(2, cache)
+            self.assertEqual(len(cache), 5)
+            with self.assertRaises(KeyError):
+                cache[1]
+            del cache[3]
+            self.assertNotIn(3, cache)
+            with self.assertRaises(KeyError):
+                del cache[3]
+            # Not picklable values are not saved
+            cache['f'] = lambda x: x
+            cache['g'] = 'g'
+            cache['h'] = 'h'
+            self.assertNotIn('f', cache)
+            # The saved items are available in a new cache
+            cache.close()
+            self.assertEqual(len(cache.memory), 0)
+            with TieredLRUDict(folder, max_size=2) as cache2:
+                self.assertSetEqual(set(cache2), set(cache))
+                self.assertEqual(cache2['h'], 'h')
+                cache2.clear()
+                self.assertEqual(len(cache2), 0)
+                self.assertListEqual(list_dir(folder), [])
+        with removable_tmp(True) as folder:
+            cache = TieredLRUDict(folder, max_weight=10, weigher=len, disk_max_bytes=100)
+            for i in range(20):
+                cache[i] = 'abcde'
+            self.assertEqual(len(cache.memory), 2)
+            self.assertLessEqual(cache.disk_bytes, 100)
+            self.assertLess(len(cache), 20)
+            self.assertEqual(cache[17], 'abcde')
+
+    def test_shared_lru_dict(self):
+        with removable_tmp(suffix='.db') as filename:
+            with SharedLRUDict(filename, max_size=3) as shared_dict:
+                shared_dict['a'] = 1
+                shared_dict['b'] = 2
+                shared_dict['c'] = 3
+                self.assertEqual(shared_dict['a'], 1)
+                shared_dict['d'] = 4
+                self.assertListEqual(list(shared_dict), ['c', 'a', 'd'])
+                self.assertNotIn('b', shared_dict)
+                self.assertEqual(shared_dict.get('b'), None)
+                with self.assertRaises(KeyError):
+                    shared_dict['b']
+                shared_dict['c'] = [3]
+                self.assertListEqual(list(shared_dict.items()), [('a', 1), ('d', 4), ('c', [3])])
+                del shared_dict['a']
+                with self.assertRaises(KeyError):
+                    del shared_dict['a']
+                self.assertEqual(len(shared_dict), 2)
+                # Other instance with the same file shares the items
+                with SharedLRUDict(filename, max_size=3) as other:
+                    self.assertEqual(other['d'], 4)
+                    other['e'] = 5
+                self.assertEqual(shared_dict['e'], 5)
+                shared_dict.clear()
+                self.assertEqual(len(shared_dict), 0)
+                self.assertEqual(shared_dict.weight, 0)
+            with SharedLRUDict(filename, max_weight=100) as shared_dict:
+                for i in range(10):
+                    shared_dict[i] = b'0' * 30
+                self.assertLessEqual(shared_dict.weight, 100)
+                self.assertListEqual(list(shared_dict), [8, 9])
+                shared_dict.clear()
+            with Pool(4) as pool:
+                sizes = pool.starmap(_fill_shared_dict, [(filename, i * 1000) for i in range(4)])
+            self.assertTrue(all(80 <= size <= 100 for size in sizes))
+            with SharedLRUDict(filename) as shared_dict:
+                self.assertEqual(len(shared_dict), 100)
+            with self.assertRaises(ValueError):
+                SharedLRUDict(filename, max_size=-1)
+
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(10000, 0.01)
+        self.assertEqual(bloom.capacity, 10000)
+        self.assertEqual(bloom.error_rate, 0.01)
+        self.assertLess(bloom.nbytes, 12500)
+        self.assertTrue(bloom.add('a'))
+        self.assertFalse(bloom.add('a'))
+        self.assertIn('a', bloom)
+        self.assertNotIn(b'a', bloom)
+        self.assertEqual(bloom.update([1, 2, 1, ('x', 3)]), [True, True, False, True])
+        self.assertEqual(len(bloom), 4)
+        self.assertEqual(bloom.contains_many([1, 2, 3, ('x', 3)]), [True, True, False, True])
+        bloom.update(range(10000))
+        # No false negatives and about 1% of false positives
+        self.assertTrue(all(bloom.contains_many(range(10000))))
+        false_positives = sum(bloom.contains_many(range(10000, 30000)))
+        self.assertLess(false_positives, 20000 * 0.02)
+        with removable_tmp(suffix='.pkl.gz') as tmp:
+            bloom.save(tmp)
+            loaded = BloomFilter.load(tmp)
+        self.assertTrue(all(loaded.contains_many(range(10000))))
+        self.assertEqual(loaded.contains_many(range(10000, 30000)), bloom.contains_many(range(10000, 30000)))
+        self.assertEqual(len(loaded), len(bloom))
+        bloom.clear()
+        self.assertNotIn('a', bloom)
+        self.assertEqual(len(bloom), 0)
+        with self.assertRaises(ValueError):
+            BloomFilter(0)
+        with self.assertRaises(ValueError):
+            BloomFilter(100, 1)
+
+    def test_rotating_bloom_filter(self):
+        bloom = RotatingBloomFilter(1000, ttl=0.2, error_rate=0.01)
+        self.assertEqual(bloom.ttl, 0.2)
+        self.assertEqual(bloom.update(['a', 'b', 'a']), [True, True, False])
+        sleep(0.25)
+        self.assertTrue(bloom.add('c'))
+        self.assertEqual(bloom.contains_many(['a', 'b', 'c', 'd']), [True, True, True, False])
+        # The items are refreshed when they are added again
+        self.assertFalse(bloom.add('a'))
+        sleep(0.25)
+        self.assertNotIn('b', bloom)
+        self.assertIn('a', bloom)
+        self.assertIn('c', bloom)
+        with removable_tmp(suffix='.pkl') as tmp:
+            bloom.save(tmp)
+            loaded = RotatingBloomFilter.load(tmp)
+        self.assertIn('c', loaded)
+        sleep(0.45)
+        self.assertEqual(bloom.contains_many(['a', 'c']), [False, False])
+        self.assertNotIn('c', loaded)
+        bloom.add('a')
+        bloom.clear()
+        self.assertNotIn('a', bloom)
+        with self.assertRaises(ValueError):
+            RotatingBloomFilter(100, ttl=0)
+        with self.assertRaises(ValueError):
+            RotatingBloomFilter(100, ttl=1, generations=1)
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,9 +1,10 @@
+import sys
 import threading
 import time
 import unittest
 from random import uniform
 
-from mysutils.collections import CallableQueueThread, ArgsMode
+from mysutils.collections import CallableQueueThread, CallableQueuePool, ArgsMode
 
 GLOBAL = []
 
@@ -12,6 +13,18 @@ def func(a: int, b: str = 'a'):
     GLOBAL.append((a, b))
 
 
+def power(a: int, b: int = 2) -> int:
+    if a < 0:
+        raise ValueError(a)
+    return a ** b
+
+
+def slow_power(a: int, b: int = 2) -> int:
+    # The later items finish before
+    time.sleep((10 - a) / 100)
+    return power(a, b)
+
+
 def add_to_queue(queue, num):
     time.sleep(uniform(0, 1))  # Random wait
     queue.add(num)
@@ -155,5 +168,106 @@ class MyTestCase(unittest.TestCase):
         self.assertListEqual(GLOBAL, [(i, 'c') for i in range(20)])
 
 
+    def test_pool(self):
+        results = []
+        with CallableQueuePool(slow_power, workers=10, on_result=lambda item, f: results.append(f.result())) as queue:
+            self.assertEqual(queue.workers, 10)
+            start = time.monotonic()
+            futures = [queue.add(i) for i in range(10)]
+        # The calls are at the same time
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertListEqual([f.result() for f in futures], [i ** 2 for i in range(10)])
+        self.assertNotEqual(results, [i ** 2 for i in range(10)])
+        self.assertSetEqual(set(results), {i ** 2 for i in range(10)})
+        self.assertIsNone(queue.add(10))
+        # Ordered results
+        results.clear()
+        with CallableQueuePool(slow_power, ArgsMode.ARGS, workers=10, ordered=True,
+                               on_result=lambda item, f: results.append((item, f.result()))) as queue:
+            for i in range(10):
+                queue.add((i, 3))
+        self.assertListEqual(results, [((i, 3), i ** 3) for i in range(10)])
+        # Exceptions are captured for each item
+        with CallableQueuePool(power, ArgsMode.KWARGS, workers=2) as queue:
+            futures = [queue.add({'a': i}) for i in range(-2, 3)]
+        self.assertIsInstance(futures[0].exception(), ValueError)
+        self.assertListEqual([f.result() for f in futures[2:]], [0, 1, 4])
+        self.assertListEqual([item for item, e in queue.errors], [{'a': -2}, {'a': -1}])
+        with self.assertRaises(ValueError):
+            CallableQueuePool(power, workers=0)
+
+    def test_pool_processes(self):
+        with CallableQueuePool(power, workers=2, processes=True, ordered=True) as queue:
+            futures = [queue.add(i) for i in range(-1, 20)]
+        self.assertIsInstance(futures[0].exception(), ValueError)
+        self.assertListEqual([f.result() for f in futures[1:]], [i ** 2 for i in range(20)])
+
+    def test_pool_stop(self):
+        queue = CallableQueuePool(slow_power, workers=1)
+        futures = [queue.add(i) for i in range(5)]
+        queue.start()
+        time.sleep(0.05)
+        queue.stop()
+        queue.join()
+        # The running call finishes and the rest are discarded
+        self.assertEqual(futures[0].result(), 0)
+        self.assertTrue(all(f.cancelled() for f in futures[1:]))
+
+    def test_pool_stop_race(self):
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-5)
+        try:
+            for _ in range(20):
+                called, delivered = set(), []
+                queue = CallableQueuePool(called.add, workers=4, on_result=lambda item, f: delivered.append(item))
+                queue.start()
+                futures = [queue.add(i) for i in range(200)]
+                queue.stop()
+                queue.join()
+                # A call which was made is never reported as cancelled
+                for i, future in enumerate(futures):
+                    self.assertEqual(future.cancelled(), i not in called)
+                self.assertSetEqual(set(delivered), called)
+        finally:
+            sys.setswitchinterval(interval)
+        # An item cancelled while its call is running does not block the next ones
+        delivered = []
+        with CallableQueuePool(slow_power, workers=2, ordered=True,
+                               on_result=lambda item, f: delivered.append(item)) as queue:
+            futures = [queue.add(i) for i in range(3)]
+            futures[0].cancel()
+        self.assertListEqual(delivered, [1, 2])
+
+    def test_batches(self):
+        batches = []
+        start = time.monotonic()
+        with CallableQueueThread(batches.append, max_batch=10, max_latency=1000) as queue:
+            for i in range(25):
+                queue.add(i)
+        # The last batch is sent when wait() is called, without waiting for more elements
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertListEqual(batches, [list(range(10)), list(range(10, 20)), list(range(20, 25))])
+        self.assertDictEqual(queue.batch_sizes, {5: 1, 10: 2})
+        self.assertEqual(sum(queue.latencies.values()), 25)
+        # The batch is sent when the latency is reached
+        batches.clear()
+        queue = CallableQueueThread(batches.append, max_batch=100, max_latency=50)
+        queue.start()
+        try:
+            for i in range(3):
+                queue.add(i)
+            time.sleep(0.3)
+            self.assertListEqual(batches, [[0, 1, 2]])
+            self.assertDictEqual(queue.batch_sizes, {3: 1})
+            self.assertEqual(sum(queue.latencies.values()), 3)
+            self.assertGreaterEqual(min(queue.latencies), 64)
+        finally:
+            queue.stop()
+            queue.join()
+        with self.assertRaises(ValueError):
+            CallableQueueThread(func, ArgsMode.ARGS, max_batch=10)
+        with self.assertRaises(ValueError):
+            CallableQueueThread(func, max_batch=-1)
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,8 +1,10 @@
+import gc
 import unittest
+import weakref
 from time import sleep
 from threading import Thread
 
-from mysutils.method import synchronized
+from mysutils.method import synchronized, lru_cache_ttl
 
 
 num = 0
@@ -18,6 +20,42 @@ class MyClass(object):
         print(f'Ending calculation {num}.')
 
 
+class Model(object):
+    def __init__(self, factor: int) -> None:
+        self.factor = factor
+        self.calls = 0
+
+    @lru_cache_ttl(max_size=10)
+    def predict(self, x: int) -> int:
+        self.calls += 1
+        return x * self.factor
+
+
+class SlotsModel(object):
+    __slots__ = ('factor', 'calls')
+
+    def __init__(self, factor: int) -> None:
+        self.factor = factor
+        self.calls = 0
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, SlotsModel) and other.factor == self.factor
+
+    def __hash__(self) -> int:
+        return self.factor
+
+    @lru_cache_ttl(max_size=10)
+    def predict(self, x: int) -> int:
+        self.calls += 1
+        return x * self.factor
+
+
+class UnlimitedModel(Model):
+    @lru_cache_ttl(max_size=0)
+    def predict(self, x: int) -> int:
+        return x * self.factor
+
+
 class MyTestCase(unittest.TestCase):
     def test_method_synchronization(self):
         obj1, obj2 = MyClass(), MyClass()
@@ -28,6 +66,107 @@ class MyTestCase(unittest.TestCase):
         obj2.calculate()
         self.assertEqual(num, 2)  # add assertion here
 
+    def test_lru_cache_ttl(self):
+        calls = []
+
+        @lru_cache_ttl(max_size=2, ttl=0.2)
+        def square(x: int, power: int = 2) -> int:
+            calls.append(x)
+            return x ** power
+
+        self.assertEqual(square(2), 4)
+        self.assertEqual(square(2), 4)
+        self.assertEqual(square(2, power=3), 8)
+        self.assertListEqual(calls, [2, 2])
+        self.assertEqual(square.cache_info(), (1, 2, 0, 2, 2))
+        # The least recently used result, square(2, power=3), is removed
+        square(2)
+        square(3)
+        self.assertEqual(square.cache_info().evictions, 1)
+        self.assertEqual(square(2), 4)
+        self.assertListEqual(calls, [2, 2, 3])
+        # The results expire
+        sleep(0.3)
+        self.assertEqual(square(2), 4)
+        self.assertListEqual(calls, [2, 2, 3, 2])
+        square.cache_clear()
+        self.assertEqual(square.cache_info(), (0, 0, 0, 2, 0))
+
+        @lru_cache_ttl(typed=True)
+        def identity(x):
+            calls.append(x)
+            return x
+
+        identity(3)
+        identity(3.0)
+        self.assertEqual(identity.cache_info().misses, 2)
+
+        @lru_cache_ttl
+        def double(x):
+            return x * 2
+
+        self.assertEqual(double(3), 6)
+        self.assertEqual(double.cache_info().max_size, 128)
+
+    def test_lru_cache_ttl_single_flight(self):
+        calls = []
+
+        @lru_cache_ttl()
+        def slow(x: int) -> int:
+            calls.append(x)
+            sleep(0.3)
+            if x < 0:
+                raise ValueError('Negative')
+            return x + 1
+
+        results, errors = [], []
+
+        def call(x: int) -> None:
+            try:
+                results.append(slow(x))
+            except ValueError as e:
+                errors.append(e)
+
+        threads = [Thread(target=call, args=(x,)) for x in [1] * 5 + [-1] * 3]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertListEqual(calls, [1, -1])
+        self.assertListEqual(results, [2] * 5)
+        self.assertEqual(len(errors), 3)
+
+    def test_lru_cache_ttl_method(self):
+        model1, model2 = Model(2), Model(3)
+        self.assertEqual(model1.predict(5), 10)
+        self.assertEqual(model1.predict(5), 10)
+        self.assertEqual(model2.predict(5), 15)
+        self.assertEqual((model1.calls, model2.calls), (1, 1))
+        self.assertEqual(model1.predict.cache_info().hits, 1)
+        # The cache does not keep the instances alive
+        reference = weakref.ref(model1)
+        del model1
+        gc.collect()
+        self.assertIsNone(reference())
+        # Its results are removed when it is destroyed
+        self.assertEqual(model2.predict.cache_info().current_size, 1)
+        Model.predict.cache_clear()
+
+    def test_lru_cache_ttl_method_identity(self):
+        # Without __weakref__, the instances are kept alive until their results are removed
+        model1, model2 = SlotsModel(2), SlotsModel(2)
+        self.assertEqual(model1.predict(5), 10)
+        self.assertEqual(model2.predict(5), 10)
+        # The instances which are equal do not share the results
+        self.assertEqual((model1.calls, model2.calls), (1, 1))
+        SlotsModel.predict.cache_clear()
+        # Unlimited and without expiration, the results of the destroyed instances are removed as well
+        for i in range(100):
+            # The new instances usually reuse the id of the destroyed ones
+            self.assertEqual(UnlimitedModel(i).predict(5), i * 5)
+        gc.collect()
+        self.assertEqual(UnlimitedModel.predict.cache_info().current_size, 0)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,8 @@
+import sys
+import threading
 import time
 import unittest
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from mysutils.collections import OrderedSet
 
@@ -238,6 +240,198 @@ class MyTestCase(unittest.TestCase):
         symmetric_diff = s3.symmetric_difference(s4)
         self.assertSetEqual(symmetric_diff, {1, 2, 4, 5})
 
+    def test_ordered_set_time_out_of_order(self):
+        date = datetime(2024, 1, 1)
+        s = OrderedSet()
+        for i in range(10):
+            s[i] = date + timedelta(seconds=i)
+        self.assertListEqual(list(s.before(date + timedelta(seconds=3))), [0, 1, 2])
+        self.assertListEqual(list(s.since(date + timedelta(seconds=7))), [7, 8, 9])
+        self.assertEqual(s.after(date + timedelta(seconds=7))[8], date + timedelta(seconds=8))
+        # The time of an item is moved to the past
+        s[5] = date - timedelta(seconds=1)
+        self.assertListEqual(list(s.before(date + timedelta(seconds=3))), [0, 1, 2, 5])
+        self.assertListEqual(list(s.until(date)), [0, 5])
+        self.assertListEqual(list(s.after(date + timedelta(seconds=6))), [7, 8, 9])
+        s.remove_before(date + timedelta(seconds=1))
+        self.assertListEqual(list(s), [1, 2, 3, 4, 6, 7, 8, 9])
+        # A new item older than the last one
+        s[10] = date
+        self.assertListEqual(list(s.until(date + timedelta(seconds=2))), [1, 2, 10])
+        s.remove_since(date + timedelta(seconds=7))
+        self.assertListEqual(list(s), [1, 2, 3, 4, 6, 10])
+        s.remove_until(date)
+        s.remove_after(date + timedelta(seconds=3))
+        self.assertListEqual(list(s), [1, 2, 3])
+        self.assertListEqual(list(s.before(date + timedelta(seconds=3))), [1, 2])
+
+    def test_ordered_set_subset_out_of_order(self):
+        date = datetime(2024, 1, 1)
+        s = OrderedSet()
+        s['a'] = date + timedelta(seconds=2)
+        s['b'] = date
+        s['c'] = date + timedelta(seconds=3)
+        subset = s.before(date + timedelta(seconds=3))
+        self.assertListEqual(list(subset), ['a', 'b'])
+        self.assertListEqual(list(subset.before(date + timedelta(seconds=1))), ['b'])
+        self.assertListEqual(list(subset.since(date + timedelta(seconds=1))), ['a'])
+        self.assertListEqual(list(subset.until(date)), ['b'])
+
+    def test_ordered_set_storage(self):
+        s = OrderedSet(i for i in range(5))
+        self.assertListEqual(list(s), [0, 1, 2, 3, 4])
+        s.update(str(i) for i in range(2))
+        self.assertListEqual(list(s), [0, 1, 2, 3, 4, '0', '1'])
+        self.assertFalse(hasattr(s, '__dict__'))
+        self.assertIsInstance(s.items[0], datetime)
+        self.assertEqual(s.items[3], s[3])
+        self.assertListEqual(list(s.items), list(s))
+        date = datetime(2024, 5, 17, 10, 30, 15, 123457)
+        s[0] = date
+        self.assertEqual(s[0], date)
+        self.assertEqual(s.items[0], date)
+        self.assertListEqual(list(s.since(date)), [0, 1, 2, 3, 4, '0', '1'])
+        self.assertListEqual(list(s.until(date)), [0])
+
+    def test_ordered_set_algebra_order(self):
+        date = datetime(2024, 1, 1)
+        s1, s2 = OrderedSet(), OrderedSet()
+        for i, item in enumerate([5, 1, 4, 2, 3]):
+            s1[item] = date + timedelta(seconds=i)
+        for i, item in enumerate([9, 3, 8, 1, 7]):
+            s2[item] = date + timedelta(seconds=10 + i)
+        self.assertListEqual(list(s1 - s2), [5, 4, 2])
+        self.assertListEqual(list(s1 & s2), [1, 3])
+        self.assertListEqual(list(s1 | s2), [5, 1, 4, 2, 3, 9, 8, 7])
+        self.assertListEqual(list(s1 ^ s2), [5, 4, 2, 9, 8, 7])
+        self.assertListEqual(list(s1.difference([4, 6])), [5, 1, 2, 3])
+        self.assertListEqual(list(s1.intersection(i for i in [3, 5])), [5, 3])
+        # The times are kept
+        union = s1.union(s2)
+        self.assertEqual(union[3], s1[3])
+        self.assertEqual(union[9], s2[9])
+        self.assertEqual((s1 ^ s2)[8], s2[8])
+        self.assertEqual((s1 & s2)[1], s1[1])
+        self.assertListEqual(list(union.before(date + timedelta(seconds=11))), [5, 1, 4, 2, 3, 9])
+        # In place
+        s3 = s1.copy()
+        s3.intersection_update(s2)
+        self.assertListEqual(list(s3), [1, 3])
+        self.assertEqual(s3[3], s1[3])
+        s3 = s1.copy()
+        s3.difference_update(i for i in [1, 3])
+        self.assertListEqual(list(s3), [5, 4, 2])
+        s3 -= {5}
+        self.assertListEqual(list(s3), [4, 2])
+        s3 |= s2
+        self.assertListEqual(list(s3), [4, 2, 9, 3, 8, 1, 7])
+        s3 &= [1, 2, 3, 4]
+        self.assertListEqual(list(s3), [4, 2, 3, 1])
+        s3 ^= OrderedSet([3, 6])
+        self.assertListEqual(list(s3), [4, 2, 1, 6])
+        s3.symmetric_difference_update([1, 5])
+        self.assertListEqual(list(s3), [4, 2, 6, 5])
+        s3 -= s3
+        self.assertEqual(len(s3), 0)
+        self.assertTrue(s1.issuperset(i for i in [1, 2]))
+        self.assertTrue(OrderedSet([1, 3]).issubset(s1))
+        self.assertFalse(s1.isdisjoint([0, 1]))
+        self.assertTrue(s1 == [1, 2, 3, 4, 5])
+        self.assertTrue(s1 != s2)
+
+    def test_ordered_set_ttl(self):
+        s = OrderedSet([1, 2], ttl=0.2)
+        self.assertEqual(s.ttl, 0.2)
+        time.sleep(0.1)
+        s.add(3)
+        s.add(1)
+        self.assertListEqual(list(s), [1, 2, 3])
+        time.sleep(0.15)
+        self.assertNotIn(1, s)
+        self.assertIn(3, s)
+        self.assertListEqual(list(s), [3])
+        self.assertEqual(len(s), 1)
+        # An expired element is added again with a new time
+        s.add(1)
+        self.assertListEqual(list(s), [3, 1])
+        self.assertGreater(s[1], s[3])
+        time.sleep(0.25)
+        self.assertEqual(len(s), 0)
+        with self.assertRaises(KeyError):
+            s.first()
+        s.update([4, 5])
+        self.assertListEqual(list(s.since(s[4])), [4, 5])
+        with self.assertRaises(ValueError):
+            OrderedSet(ttl=0)
+        with self.assertRaises(ValueError):
+            OrderedSet(sweep_interval=1)
+
+    def test_ordered_set_max_size(self):
+        s = OrderedSet(range(10), max_size=5)
+        self.assertEqual(s.max_size, 5)
+        self.assertListEqual(list(s), [5, 6, 7, 8, 9])
+        s.add(10)
+        s.add(6)
+        self.assertListEqual(list(s), [6, 7, 8, 9, 10])
+        s[11] = datetime.now()
+        self.assertListEqual(list(s), [7, 8, 9, 10, 11])
+        with self.assertRaises(ValueError):
+            OrderedSet(max_size=-1)
+
+    def test_ordered_set_sweeper(self):
+        threads = threading.active_count()
+        s = OrderedSet(range(100), ttl=0.1, sweep_interval=0.05)
+        self.assertEqual(threading.active_count(), threads + 1)
+        self.assertIsNotNone(s.lock)
+        with s.lock:
+            self.assertEqual(len(s), 100)
+        time.sleep(0.3)
+        # Removed in background, without using the set
+        self.assertEqual(len(s._OrderedSet__times), 0)
+        s.close()
+        time.sleep(0.1)
+        self.assertEqual(threading.active_count(), threads)
+        # The thread also ends when the set is deleted
+        s = OrderedSet(ttl=0.1, sweep_interval=0.05)
+        del s
+        time.sleep(0.1)
+        self.assertEqual(threading.active_count(), threads)
+
+
+    def test_ordered_set_sweeper_stress(self):
+        s = OrderedSet(ttl=0.002, sweep_interval=0.0005)
+        errors = []
+
+        def use(start: int) -> None:
+            try:
+                for i in range(start, start + 20000):
+                    s.add(i % 500)
+                    s.update([i % 300, i % 700])
+                    if i % 3 in s:
+                        s.remove(i % 3)
+                    s.set_time(i % 50, datetime.now())
+                    if i % 10 == 0:
+                        try:
+                            s.pop()
+                        except KeyError:
+                            # All the elements have expired
+                            pass
+            except Exception as e:
+                errors.append(e)
+
+        # Switch the threads more often to interleave the operations with the sweeps
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=use, args=(i * 20000,)) for i in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+            s.close()
+        self.assertListEqual(errors, [])
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,15 +1,51 @@
+import gzip
 import json
+import re
 import shutil
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from io import BytesIO
+from random import shuffle
+from sys import getswitchinterval, setswitchinterval
 from mysutils import unittest
-from os import mkdir
-from os.path import exists, join
+from os import mkdir, urandom
+from os.path import exists, join, getsize, abspath
 
-from mysutils.file import save_json, remove_files, exist_files, load_json, mkdirs, touch
+from mysutils.file import save_json, remove_files, exist_files, load_json, mkdirs, touch, save_pickle
 from mysutils.tar import create_tar, detect_compress_method, list_tar, extract_tar_file, open_tar_file, load_tar_json, \
-    extract_tar_files, extract_tar, add_tar_files, add_compressed_tar_files, exist_tar_files
+    extract_tar_files, extract_tar, add_tar_files, add_compressed_tar_files, exist_tar_files, TarIndex, load_tar_pickle, \
+    tar_members, clear_tar_listings, TarWriter, load_tar_members
+from mysutils.yaml import save_yaml, load_tar_yaml
 from mysutils.tmp import removable_files
 
 
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """ A file server which supports HTTP Range requests and counts the number of downloaded bytes. """
+    downloaded = 0
+
+    def send_head(self):
+        match = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        if self.command != 'GET' or not match:
+            return super().send_head()
+        path = self.translate_path(self.path)
+        with open(path, 'rb') as file:
+            start, end = int(match.group(1)), min(int(match.group(2)), getsize(path) - 1)
+            file.seek(start)
+            data = file.read(end - start + 1)
+        RangeRequestHandler.downloaded += len(data)
+        self.send_response(206)
+        self.send_header('Content-Range', f'bytes {start}-{end}/{getsize(path)}')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        return BytesIO(data)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
 def create_files() -> dict:
     d = {
         'version': 1.0,
@@ -45,10 +81,130 @@ class MyTestCase(unittest.FileTestCase):
         exist_files('test.tar.gz', 'test.tar.bz2', 'test.tar.xz', 'test.tar')
         self.remove_files()
 
+    def test_create_parallel_tar(self) -> None:
+        with removable_files('test.bin', 'test.tar.gz', 'test.tar.bz2', 'test.tar.xz') as files:
+            with open('test.bin', 'wb') as file:
+                file.write(bytes(range(256)) * 4096)
+            for file in files[1:]:
+                create_tar(file, 'test.bin', workers=4, block_size=100000)
+                self.assertListEqual([m.path for m in list_tar(file)], ['test.bin'])
+                with open_tar_file(file, 'test.bin') as reader:
+                    self.assertEqual(reader.read(), bytes(range(256)) * 4096)
+            # Each block is an independent gzip member
+            with open('test.tar.gz', 'rb') as file:
+                self.assertGreater(file.read().count(b'\x1f\x8b\x08'), 10)
+
+    def test_zstd_lz4_tar(self) -> None:
+        d = create_files()
+        with removable_files('test.tar.zst', 'test.tar.lz4', 'test.tar.zst.idx', 'test.tar.lz4.idx', 'data') as files:
+            for file in files[:2]:
+                for workers in (1, 2):
+                    create_tar(file, 'test.json', workers=workers, compress_level=3)
+                    self.assertListEqual([m.path for m in list_tar(file)], ['test.json'])
+                    add_tar_files(file, 'test.json.gz')
+                    self.assertListEqual([m.path for m in list_tar(file)], ['test.json', 'test.json.gz'])
+                    self.assertTrue(exist_tar_files(file, 'test.json', 'test.json.gz'))
+                    self.assertDictEqual(load_tar_json(file, 'test.json.gz'), d)
+                    self.assertDictEqual(load_tar_json(file, 'test.json', index=TarIndex(file)), d)
+                    extract_tar(file, 'data', force=True)
+                    self.assertDictEqual(load_json('data/test.json.gz'), d)
+                    shutil.rmtree('data')
+            with open('test.tar.zst', 'rb') as file:
+                self.assertEqual(file.read(4), b'\x28\xb5\x2f\xfd')
+            with open('test.tar.lz4', 'rb') as file:
+                self.assertEqual(file.read(4), b'\x04\x22\x4d\x18')
+        self.remove_files()
+
+    def test_tar_writer(self) -> None:
+        d = {'version': 1.0, 'file_list': ['1.txt', '2.txt']}
+        with removable_files('test.tar', 'test.tar.gz', 'test.tar.xz', 'test.json') as files:
+            save_json(d, 'test.json')
+            for file in files[:3]:
+                with TarWriter(file, workers=2 if file.endswith('xz') else 1) as tar:
+                    tar.add('test.json')
+                    tar.add_json('data/test.json.gz', d)
+                    tar.add_pickle('data/test.pkl', d)
+                    tar.add_yaml('data/test.yaml', d)
+                    tar.add_bytes('data/test.bin', b'Hello world')
+                    tar.add_stream('data/seekable.bin', BytesIO(b'Hello world'))
+                    tar.add_stream('data/unknown.bin', gzip.open(BytesIO(gzip.compress(b'Hello world'))))
+                self.assertListEqual([m.path for m in list_tar(file)],
+                                     ['test.json', 'data/test.json.gz', 'data/test.pkl', 'data/test.yaml',
+                                      'data/test.bin', 'data/seekable.bin', 'data/unknown.bin'])
+                self.assertDictEqual(load_tar_json(file, 'test.json'), d)
+                self.assertDictEqual(load_tar_json(file, 'data/test.json.gz'), d)
+                self.assertDictEqual(load_tar_pickle(file, 'data/test.pkl'), d)
+                self.assertDictEqual(load_tar_yaml(file, 'data/test.yaml'), d)
+                for name in 'data/test.bin', 'data/seekable.bin', 'data/unknown.bin':
+                    with open_tar_file(file, name) as reader:
+                        self.assertEqual(reader.read(), b'Hello world')
+
+    def test_load_tar_members(self) -> None:
+        d = {'version': 1.0, 'file_list': ['1.txt', '2.txt']}
+        with removable_files('test.tar.gz', 'test.tar.gz.idx') as (file, _):
+            with TarWriter(file) as tar:
+                for i in range(10):
+                    tar.add_json(f'model/{i}.json', {'i': i})
+                tar.add_pickle('model/data.pkl.gz', d)
+                tar.add_yaml('model/config.yaml', d)
+                tar.add_bytes('model/README', b'Hello world')
+                tar.add_json('other/test.json', d)
+                tar.add_json('model/0.json', {'i': 10})
+            expected = {f'model/{i}.json': {'i': i} for i in range(1, 10)}
+            expected['model/0.json'] = {'i': 10}
+            for workers in (1, 4):
+                members = load_tar_members(file, 'model/*.json', workers=workers)
+                self.assertDictEqual(members, expected)
+                # The results keep the archive order and the repeated files only once
+                self.assertListEqual(list(members), [f'model/{i}.json' for i in range(1, 10)] + ['model/0.json'])
+                members = load_tar_members(file, ['model/data.*', 'model/config.yaml', 'model/README'],
+                                           workers=workers, index=TarIndex(file))
+                self.assertDictEqual(members, {'model/data.pkl.gz': d, 'model/config.yaml': d,
+                                               'model/README': b'Hello world'})
+            self.assertEqual(len(load_tar_members(file)), 14)
+            self.assertDictEqual(load_tar_members(file, 'nothing/*'), {})
+
+    def test_remote_tar(self) -> None:
+        server = ThreadingHTTPServer(('127.0.0.1', 0), partial(RangeRequestHandler, directory='.'))
+        Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}'
+        try:
+            with removable_files('test.tar', 'test.tar.gz', 'data', recursive=True) as (file, compressed_file,
+                                                                                       folder):
+                with TarWriter(file) as tar, TarWriter(compressed_file) as compressed_tar:
+                    for i in range(20):
+                        tar.add_bytes(f'data/{i}.bin', bytes([i]) * 1000000)
+                        compressed_tar.add_bytes(f'data/{i}.bin', bytes([i]) * 1000000)
+                    tar.add_json('test.json', {'i': 20})
+                    compressed_tar.add_json('test.json', {'i': 20})
+                RangeRequestHandler.downloaded = 0
+                self.assertEqual(len(list_tar(f'{url}/{file}')), 21)
+                self.assertTrue(exist_tar_files(f'{url}/{file}', 'data/3.bin', 'test.json'))
+                self.assertDictEqual(load_tar_json(f'{url}/{file}', 'test.json'), {'i': 20})
+                with open_tar_file(f'{url}/{file}', 'data/7.bin') as reader:
+                    self.assertEqual(reader.read(), bytes([7]) * 1000000)
+                # Only the headers and the read members are downloaded
+                self.assertLess(RangeRequestHandler.downloaded, getsize(file) / 5)
+                extract_tar_files(f'{url}/{file}', folder, 'data/1.bin', force=True)
+                with open(join(folder, 'data', '1.bin'), 'rb') as reader:
+                    self.assertEqual(reader.read(), bytes([1]) * 1000000)
+                # The compressed archives are also supported, reading them with an index
+                index = TarIndex(f'{url}/{compressed_file}')
+                self.assertIsNone(index.index_file)
+                self.assertDictEqual(load_tar_json(f'{url}/{compressed_file}', 'test.json', index=index), {'i': 20})
+                self.assertEqual(index.read('data/19.bin'), bytes([19]) * 1000000)
+        finally:
+            server.shutdown()
+            server.server_close()
+
     def test_detect_method(self) -> None:
         self.assertEqual('gz', detect_compress_method('test.tar.gz'))
         self.assertEqual('bz2', detect_compress_method('test.tar.bz2'))
         self.assertEqual('xz', detect_compress_method('test.tar.xz'))
+        self.assertEqual('zst', detect_compress_method('test.tar.zst'))
+        self.assertEqual('zst', detect_compress_method('test.tzst'))
+        self.assertEqual('lz4', detect_compress_method('test.tar.lz4'))
+        self.assertEqual('gz', detect_compress_method('https://example.com/test.tar.gz?version=1'))
         self.assertEqual('', detect_compress_method('test.tar'))
 
     def test_list_tar_files(self) -> None:
@@ -110,6 +266,10 @@ class MyTestCase(unittest.FileTestCase):
         extract_tar_files('test.tar.bz2', 'data', force=True)
         self.assertExists('data/test.json', 'data/test.json.gz')
         remove_files('data/test.json', 'data/test.json.gz', 'data')
+        with self.assertRaises(KeyError):
+            extract_tar_files('test.tar.gz', 'data/', 'test.json', 'other.json', force=True)
+        self.assertExists('data/test.json')
+        remove_files('data/test.json', 'data')
         self.remove_files()
 
     def test_extract_tar(self) -> None:
@@ -131,6 +291,167 @@ class MyTestCase(unittest.FileTestCase):
         self.assertExists('data/test.json', 'data/test.json.gz')
         remove_files('data/test.json', 'data/test.json.gz', 'data')
 
+    def test_extract_tar_single_pass(self) -> None:
+        with removable_files(*mkdirs('data', 'output'), 'test.tar.gz', recursive=True) as (folder, output, file):
+            mkdirs(join(folder, 'sub'))
+            for i in range(200):
+                save_json({'i': i}, join(folder, 'sub', f'{i}.json'))
+            create_tar(file, folder)
+            extract_tar(file, output, verbose=True)
+            for i in range(200):
+                self.assertDictEqual({'i': i}, load_json(join(output, folder, 'sub', f'{i}.json')))
+            # Extracting again in the same folder overwrites the files
+            extract_tar(file, output)
+            self.assertDictEqual({'i': 199}, load_json(join(output, folder, 'sub', '199.json')))
+
+    def test_extract_tar_workers(self) -> None:
+        with removable_files(*mkdirs('data', 'output'), 'test.tar.gz', recursive=True) as (folder, output, file):
+            mkdirs(join(folder, 'sub'))
+            for i in range(200):
+                save_json({'i': i}, join(folder, 'sub' if i % 2 else '', f'{i}.json'))
+            with open(join(folder, 'big.bin'), 'wb') as writer:
+                writer.write(bytes(range(256)) * 1024)
+            create_tar(file, folder)
+            # The big file does not fit in memory and it is written by the main thread
+            extract_tar(file, output, workers=4, max_in_flight=100000)
+            for i in range(200):
+                self.assertDictEqual({'i': i}, load_json(join(output, folder, 'sub' if i % 2 else '', f'{i}.json')))
+            with open(join(output, folder, 'big.bin'), 'rb') as reader:
+                self.assertEqual(reader.read(), bytes(range(256)) * 1024)
+            shutil.rmtree(output)
+            extract_tar_files(file, output, join(folder, 'sub', '1.json'), join(folder, '2.json'), force=True,
+                              workers=4)
+            self.assertDictEqual({'i': 1}, load_json(join(output, folder, 'sub', '1.json')))
+            self.assertDictEqual({'i': 2}, load_json(join(output, folder, '2.json')))
+            self.assertFalse(exists(join(output, folder, '4.json')))
+
+    def test_extract_duplicated_files(self) -> None:
+        with removable_files(*mkdirs('output'), '1.json', '2.json', 'test.tar', 'test.tar.gz', recursive=True) as \
+                (output, _, _, *files):
+            for file in files:
+                save_json({'i': 1}, '1.json')
+                save_json({'i': 2}, '2.json')
+                create_tar(file, '1.json', '2.json')
+                # The appended file is a newer copy of the same member
+                save_json({'i': 3}, '1.json')
+                add_tar_files(file, '1.json')
+                self.assertListEqual([m.path for m in list_tar(file)], ['1.json', '2.json', '1.json'])
+                self.assertDictEqual({'i': 3}, load_tar_json(file, '1.json'))
+                extract_tar_files(file, output, '1.json', '2.json')
+                self.assertDictEqual({'i': 3}, load_json(join(output, '1.json')))
+                self.assertDictEqual({'i': 2}, load_json(join(output, '2.json')))
+                with self.assertRaises(KeyError):
+                    extract_tar_files(file, output, '1.json', '3.json')
+                # Without a cached listing, the archive is read once to the end and the last copy remains
+                for workers in (1, 4):
+                    clear_tar_listings()
+                    remove_files(join(output, '1.json'), join(output, '2.json'))
+                    extract_tar_files(file, output, '1.json', '2.json', workers=workers)
+                    self.assertDictEqual({'i': 3}, load_json(join(output, '1.json')))
+                    self.assertDictEqual({'i': 2}, load_json(join(output, '2.json')))
+                clear_tar_listings()
+                with self.assertRaises(KeyError):
+                    extract_tar_files(file, output, '1.json', '3.json')
+
+    def test_extract_tar_workers_duplicated_files(self) -> None:
+        with removable_files(*mkdirs('output'), 'big.bin', 'test.tar', recursive=True) as (output, big, file):
+            for i in range(5):
+                # The first copies are bigger, so they take longer to be written than the last one
+                with open(big, 'wb') as writer:
+                    writer.write(bytes([i]) * (16 - i * 3) * 1024 * 1024)
+                add_tar_files(file, big) if i else create_tar(file, big)
+            self.assertListEqual([m.path for m in list_tar(file)], ['big.bin'] * 5)
+            for _ in range(3):
+                extract_tar(file, output, workers=4)
+                with open(join(output, 'big.bin'), 'rb') as reader:
+                    self.assertEqual(reader.read(), bytes([4]) * 4 * 1024 * 1024)
+
+    def test_extract_tar_outside(self) -> None:
+        with removable_files(*mkdirs('output', 'outside'), 'evil.tar', recursive=True) as (output, outside, file):
+            with tarfile.open(file, 'w') as tar:
+                link = tarfile.TarInfo('evil')
+                link.type, link.linkname = tarfile.SYMTYPE, abspath(outside)
+                tar.addfile(link)
+                info = tarfile.TarInfo('evil/pwn.txt')
+                info.size = 3
+                tar.addfile(info, BytesIO(b'pwn'))
+            for workers in (1, 4):
+                with self.assertRaises(ValueError):
+                    extract_tar(file, output, workers=workers)
+                self.assertFalse(exists(join(outside, 'pwn.txt')))
+            for name in ('../pwn.txt', abspath(join(outside, 'pwn.txt'))):
+                with tarfile.open(file, 'w') as tar:
+                    info = tarfile.TarInfo(name)
+                    info.size = 3
+                    tar.addfile(info, BytesIO(b'pwn'))
+                for workers in (1, 4):
+                    with self.assertRaises(ValueError):
+                        extract_tar(file, output, workers=workers)
+                    self.assertFalse(exists(join(outside, 'pwn.txt')))
+                    self.assertFalse(exists('pwn.txt'))
+
+    def test_tar_index(self) -> None:
+        with removable_files(*mkdirs('data'), recursive=True) as (folder,):
+            for i in range(100):
+                save_json({'i': i, 'data': list(range(1000))}, join(folder, f'{i}.json'))
+            save_yaml({'a': 1}, join(folder, 'test.yaml'))
+            save_pickle({'b': 2}, join(folder, 'test.pkl.gz'))
+            with removable_files('test.tar', 'test.tar.gz', 'test.tar.bz2', 'test.tar.xz') as files:
+                for file in files:
+                    create_tar(file, folder)
+                    with removable_files(f'{file}.idx', 'other.idx'):
+                        index = TarIndex(file, span=4096)
+                        self.assertExists(f'{file}.idx')
+                        self.assertEqual(len(index), 103)
+                        self.assertIn(f'{folder}/99.json', index)
+                        self.assertNotIn(f'{folder}/100.json', index)
+                        for i in reversed(range(100)):
+                            self.assertDictEqual({'i': i, 'data': list(range(1000))},
+                                                 load_tar_json(file, f'{folder}/{i}.json', index=index))
+                        self.assertDictEqual({'a': 1}, load_tar_yaml(file, f'{folder}/test.yaml', index=index))
+                        self.assertDictEqual({'b': 2}, load_tar_pickle(file, f'{folder}/test.pkl.gz', index=index))
+                        with self.assertRaises(FileNotFoundError):
+                            open_tar_file(file, f'{folder}/100.json', index=index)
+                        with self.assertRaises(IsADirectoryError):
+                            index.read(folder)
+                        # Load the index from the sidecar file
+                        index = TarIndex(file)
+                        self.assertDictEqual({'i': 50, 'data': list(range(1000))},
+                                             load_tar_json(file, f'{folder}/50.json', index=index))
+                        index = TarIndex(file, index_file='other.idx', sidecar=False)
+                        self.assertNotExists('other.idx')
+                        self.assertEqual(len(index.members()), 103)
+
+    def test_tar_index_concurrent_reads(self) -> None:
+        with removable_files(*mkdirs('data'), 'test.tar.gz', 'test.tar.gz.idx', recursive=True) as (folder, file, _):
+            contents = {}
+            for i in range(12):
+                # Random data cannot be compressed, so there are many checkpoints
+                # The files are added without their folder
+                contents[f'{i}.bin'] = urandom(100000 + i * 1000)
+                with open(join(folder, f'{i}.bin'), 'wb') as writer:
+                    writer.write(contents[f'{i}.bin'])
+                if i % 4 == 3:
+                    # Several gzip members
+                    files = [join(folder, f'{j}.bin') for j in range(i - 3, i + 1)]
+                    add_tar_files(file, *files) if exists(file) else create_tar(file, *files)
+            TarIndex(file, span=8192)
+            # Switch the threads more often to interleave the reads
+            interval = getswitchinterval()
+            setswitchinterval(1e-5)
+            try:
+                for _ in range(20):
+                    # Cold index loaded from the sidecar file, the checkpoints are added by the concurrent reads
+                    index = TarIndex(file, span=8192)
+                    names = list(contents) * 4
+                    shuffle(names)
+                    with ThreadPoolExecutor(8) as executor:
+                        results = list(executor.map(index.read, names))
+                    for name, data in zip(names, results):
+                        self.assertEqual(data, contents[name])
+            finally:
+                setswitchinterval(interval)
+
     def test_add_files(self) -> None:
         d = create_files()
         with removable_files('test.json', 'test.json.gz'):
@@ -162,6 +483,38 @@ class MyTestCase(unittest.FileTestCase):
                 self.assertDictEqual(d, load_tar_json(file, 'test.json.gz', compress_method='gz'))
                 self.assertDictEqual(d, load_tar_json(file, 'test.json', compress_method='gz'))
 
+    def test_append_compressed_files(self) -> None:
+        with removable_files('1.json', '2.json', '3.json', 'test.tar.gz', 'test.tar.xz'):
+            for i in range(1, 4):
+                save_json({'i': i}, f'{i}.json')
+            create_tar('test.tar.gz', '1.json')
+            for i in range(2, 4):
+                size = getsize('test.tar.gz')
+                add_tar_files('test.tar.gz', f'{i}.json')
+                self.assertListEqual([m.path for m in list_tar('test.tar.gz')], [f'{j}.json' for j in range(1, i + 1)])
+                self.assertDictEqual({'i': i}, load_tar_json('test.tar.gz', f'{i}.json'))
+            # The previous gzip members are not rewritten
+            with open('test.tar.gz', 'rb') as file:
+                self.assertEqual(len(gzip.decompress(file.read())) % 512, 0)
+            self.assertLess(getsize('test.tar.gz') - size, 512)
+            # The archive is not modified if a file cannot be added, also the first time it is recompressed
+            for created in False, True:
+                if created:
+                    create_tar('test.tar.gz', '1.json')
+                with open('test.tar.gz', 'rb') as file:
+                    content = file.read()
+                with self.assertRaises(FileNotFoundError):
+                    add_tar_files('test.tar.gz', '2.json', 'missing.json')
+                with open('test.tar.gz', 'rb') as file:
+                    self.assertEqual(file.read(), content)
+                self.assertNotExists('test.tar.gz.tmp')
+            # Other methods copy the members into a new archive replacing the files with the same name
+            create_tar('test.tar.xz', '1.json', '2.json')
+            save_json({'i': 4}, '2.json')
+            add_tar_files('test.tar.xz', '2.json', '3.json')
+            self.assertListEqual([m.path for m in list_tar('test.tar.xz')], ['1.json', '2.json', '3.json'])
+            self.assertDictEqual({'i': 4}, load_tar_json('test.tar.xz', '2.json'))
+
     def test_exist_tar_files(self) -> None:
         with removable_files(*mkdirs('data'), recursive=True) as (folder,):
             with removable_files('test.json', 'test.json.gz'):
@@ -175,6 +528,27 @@ class MyTestCase(unittest.FileTestCase):
                         self.assertFalse(exist_tar_files(file, 'test.json', 'test.json.gz',
                                                          f'{folder}/1.txt', f'{folder}/2.txt', f'{folder}/4.txt'))
 
+    def test_tar_listing_cache(self) -> None:
+        with removable_files('test.json', 'test.json.gz', 'test.tar.gz', 'test.tar'):
+            create_files()
+            for file in 'test.tar.gz', 'test.tar':
+                create_tar(file, 'test.json')
+                members = tar_members(file)
+                self.assertListEqual(list(members), ['test.json'])
+                self.assertEqual(members['test.json'].size, getsize('test.json'))
+                # The returned members are copies, modifying them does not change the cached listing
+                members['test.json'].name = 'other.json'
+                list_tar(file)[0].size = 0
+                self.assertListEqual([m.path for m in list_tar(file)], ['test.json'])
+                self.assertEqual(tar_members(file)['test.json'].size, getsize('test.json'))
+                self.assertDictEqual(load_tar_json(file, 'test.json'), load_json('test.json'))
+                self.assertFalse(exist_tar_files(file, 'test.json.gz'))
+                add_tar_files(file, 'test.json.gz')
+                self.assertTrue(exist_tar_files(file, 'test.json', 'test.json.gz'))
+                self.assertListEqual([m.path for m in list_tar(file)], ['test.json', 'test.json.gz'])
+                clear_tar_listings()
+                self.assertIsNot(list_tar(file)[0], members['test.json'])
+
 
 if __name__ == '__main__':
     unittest.main()
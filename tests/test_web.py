@@ -1,16 +1,22 @@
+import hashlib
 import multiprocessing
 import time
 import unittest
+from os import listdir, remove
+from os.path import exists, getsize, join
 
 import uvicorn
 from deprecation import deprecated
 from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from mysutils.request import retry_get, ServiceError
+from mysutils.tmp import removable_tmp
+from mysutils.web import download_many, DownloadError
 
 HOST = "127.0.0.1"
 PORT = 8000
 BASE_URL = f"http://{HOST}:{PORT}"
+CONTENT = b'0123456789' * 1000
 
 
 def create_test_app() -> FastAPI:
@@ -24,6 +30,14 @@ def create_test_app() -> FastAPI:
     async def fail():
         return JSONResponse(status_code=500, content={"error": "Internal Server Error"})
 
+    @app.get("/file/{num}")
+    async def file(num: int):
+        return Response(content=CONTENT[:num], media_type="application/octet-stream")
+
+    @app.head("/file/{num}")
+    async def file_head(num: int):
+        return Response(headers={"content-length": str(num)}, media_type="application/octet-stream")
+
     return app
 
 
@@ -58,6 +72,45 @@ class RequestsTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), {"message": "Todo bien"})
 
+    def test_download_many(self):
+        with removable_tmp(True) as folder:
+            urls = {f"{BASE_URL}/file/{i * 100}": join(folder, 'sub', f'{i}.bin') for i in range(1, 21)}
+            files = download_many(urls, max_workers=4, per_host_limit=2, verbose=False, wait_time=0.1)
+            self.assertEqual(len(files), 20)
+            for i in range(1, 21):
+                self.assertEqual(getsize(join(folder, 'sub', f'{i}.bin')), i * 100)
+            # Skip the files which already exist with the same size
+            self.assertListEqual(download_many(urls, verbose=False, wait_time=0.1), [])
+            # Download again the files with a different digest
+            url = f"{BASE_URL}/file/100"
+            digests = {url: hashlib.sha256(CONTENT[:100]).hexdigest()}
+            self.assertListEqual(download_many({url: urls[url]}, digests=digests, verbose=False), [])
+            # The downloaded files are also checked, and they are not saved if they are not the expected ones
+            remove(urls[url])
+            self.assertListEqual(download_many({url: urls[url]}, digests=digests, verbose=False), [urls[url]])
+            digests = {url: hashlib.sha256(b'other').hexdigest()}
+            other_url = f"{BASE_URL}/file/200"
+            with self.assertRaises(DownloadError) as context:
+                download_many({url: urls[url], other_url: urls[other_url]}, digests=digests, verbose=False)
+            self.assertListEqual(list(context.exception.errors), [url])
+            self.assertIsInstance(context.exception.errors[url], ValueError)
+            self.assertListEqual(context.exception.files, [])
+            with self.assertRaises(DownloadError) as context:
+                download_many({url: urls[url]}, sizes={url: 99}, verbose=False)
+            self.assertIsInstance(context.exception.errors[url], ValueError)
+            self.assertListEqual(sorted(listdir(join(folder, 'sub'))), sorted(f'{i}.bin' for i in range(1, 21)))
+            # The failed requests do not leave partial files
+            with self.assertRaises(DownloadError) as context:
+                download_many({f"{BASE_URL}/fail": join(folder, 'fail.bin'), other_url: join(folder, 'new.bin')},
+                              verbose=False, num_tries=1, wait_time=0.1)
+            self.assertListEqual(list(context.exception.errors), [f"{BASE_URL}/fail"])
+            self.assertListEqual(context.exception.files, [join(folder, 'new.bin')])
+            self.assertFalse(exists(join(folder, 'fail.bin.part')))
+            # Bytes paths
+            path = join(folder, 'bytes.bin').encode()
+            self.assertListEqual(download_many({url: path}, verbose=False), [path])
+            self.assertEqual(getsize(path), 100)
+
 
 if __name__ == '__main__':
     unittest.main()